@@ -4,6 +4,7 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     database_url: str = os.getenv("DATABASE_URL", "postgresql://user:password@db:5432/db_name")
     celery_broker_url: str = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
+    redis_url: str = os.getenv("REDIS_URL", os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0"))
     secret_key: str = os.getenv("SECRET_KEY", "secret-key-change-in-production")
     discord_client_id: str = os.getenv("DISCORD_CLIENT_ID", "")
     discord_client_secret: str = os.getenv("DISCORD_CLIENT_SECRET", "")
@@ -14,6 +15,44 @@ class Settings(BaseSettings):
     azuracast_api_key: str = os.getenv("AZURACAST_API_KEY", "")
     azuracast_station_id: str = os.getenv("AZURACAST_STATION_ID", "1")
     azuracast_stream_url: str = os.getenv("AZURACAST_STREAM_URL", "")
+    nowplaying_cache_ttl: float = float(os.getenv("NOWPLAYING_CACHE_TTL", "3"))
+    admin_stats_cache_ttl: float = float(os.getenv("ADMIN_STATS_CACHE_TTL", "5"))
+    preview_workers: int = int(os.getenv("PREVIEW_WORKERS", "4"))
+    preview_queue_size: int = int(os.getenv("PREVIEW_QUEUE_SIZE", "16"))
+    preview_timeout: float = float(os.getenv("PREVIEW_TIMEOUT", "25"))
+    preview_cache_size: int = int(os.getenv("PREVIEW_CACHE_SIZE", "512"))
+    preview_cache_ttl: float = float(os.getenv("PREVIEW_CACHE_TTL", "86400"))
+    preview_playlist_cache_ttl: float = float(os.getenv("PREVIEW_PLAYLIST_CACHE_TTL", "900"))
+    preview_negative_cache_ttl: float = float(os.getenv("PREVIEW_NEGATIVE_CACHE_TTL", "120"))
+    catalog_index_ttl: float = float(os.getenv("CATALOG_INDEX_TTL", "300"))
+    audio_temp_dir: str = os.getenv("AUDIO_TEMP_DIR", "audio_temp")
+    azuracast_upload_dir: str = os.getenv("AZURACAST_UPLOAD_DIR", "suggestions")
+    ingest_concurrency: int = int(os.getenv("INGEST_CONCURRENCY", "2"))
+    ingest_max_attempts: int = int(os.getenv("INGEST_MAX_ATTEMPTS", "4"))
+    ingest_retry_delay: float = float(os.getenv("INGEST_RETRY_DELAY", "60"))
+    ingest_stale_minutes: int = int(os.getenv("INGEST_STALE_MINUTES", "30"))
+    ingest_max_duration: int = int(os.getenv("INGEST_MAX_DURATION", "900"))
+    ingest_bitrate: str = os.getenv("INGEST_BITRATE", "192k")
+    ingest_upload_chunk_size: int = int(os.getenv("INGEST_UPLOAD_CHUNK_SIZE", str(2 * 1024 * 1024)))
+    ingest_upload_timeout: float = float(os.getenv("INGEST_UPLOAD_TIMEOUT", "60"))
+    ingest_normalize: bool = os.getenv("INGEST_NORMALIZE", "false").lower() in ("1", "true", "yes")
+    ingest_trim_silence: bool = os.getenv("INGEST_TRIM_SILENCE", "false").lower() in ("1", "true", "yes")
+    ingest_target_lufs: float = float(os.getenv("INGEST_TARGET_LUFS", "-14"))
+    ingest_max_true_peak: float = float(os.getenv("INGEST_MAX_TRUE_PEAK", "-1"))
+    ingest_silence_threshold_db: float = float(os.getenv("INGEST_SILENCE_THRESHOLD_DB", "-50"))
+    ingest_silence_min_duration: float = float(os.getenv("INGEST_SILENCE_MIN_DURATION", "0.5"))
+    fingerprint_index_ttl: float = float(os.getenv("FINGERPRINT_INDEX_TTL", "300"))
+    fingerprint_max_ber: float = float(os.getenv("FINGERPRINT_MAX_BER", "0.3"))
+    fingerprint_min_overlap: float = float(os.getenv("FINGERPRINT_MIN_OVERLAP", "10"))
+    fingerprint_backfill_batch: int = int(os.getenv("FINGERPRINT_BACKFILL_BATCH", "25"))
+    chart_cache_ttl: float = float(os.getenv("CHART_CACHE_TTL", "30"))
+    trending_half_life_hours: float = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+    trending_checkpoint_interval: int = int(os.getenv("TRENDING_CHECKPOINT_INTERVAL", "60"))
+    xp_compaction_age_hours: float = float(os.getenv("XP_COMPACTION_AGE_HOURS", "48"))
+    xp_compaction_batch_size: int = int(os.getenv("XP_COMPACTION_BATCH_SIZE", "5000"))
+    partition_months_ahead: int = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+    votes_retention_months: int = int(os.getenv("VOTES_RETENTION_MONTHS", "0"))
+    xp_awards_retention_months: int = int(os.getenv("XP_AWARDS_RETENTION_MONTHS", "0"))
 
 settings = Settings()
 
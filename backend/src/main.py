@@ -1,12 +1,12 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, Request, HTTPException
+from fastapi import FastAPI, Depends, Request, HTTPException, UploadFile, File
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
-from starlette.responses import RedirectResponse, StreamingResponse, JSONResponse
+from starlette.responses import RedirectResponse, StreamingResponse, JSONResponse, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, and_
+from sqlalchemy import select, func, desc, and_, or_, delete, literal, literal_column
 from pydantic import BaseModel
 from typing import Optional, List, Tuple, Dict
 from datetime import datetime, timedelta, timezone
@@ -17,8 +17,25 @@ from .database import engine, Base, get_db
 from . import models, auth, config
 from .services.azuracast import azuracast_client
 from .services.event_broadcaster import event_broadcaster
-from .services.xp_system import XP_PER_VOTE, XP_PER_MINUTE_LISTENING, get_rank
-from .services.youtube import preview_content
+from .services.xp_system import XP_PER_VOTE, XP_PER_MINUTE_LISTENING, get_rank, get_ranks, get_rank_table, set_rank_table, load_rank_table
+from .services.preview_cache import preview_cache
+from .services.youtube import is_youtube_url, is_playlist_url, iter_playlist_items
+from .services.preview_pool import preview_pool, run_preview, PreviewPoolBusy, PreviewTimeout
+from .services import charts, partitions
+from .services.trending import trending_engine, get_trending
+from .services.pagination import encode_cursor, decode_cursor, parse_datetime
+from .services.timeline import fetch_user_timeline
+from .services.xp_history import fetch_xp_history
+from .services.leaderboard import leaderboard, PERIODS as LEADERBOARD_PERIODS
+from .services.user_cards import badge_cache, featured_badge_of, resolve_user_cards
+from .services.activity_stream import activity_stream
+from .services.admin_stats import admin_stats
+from .services.moderation import MAX_BULK_IDS, issue_xp_reward, moderate_suggestions, moderate_issues
+from .services.suggestion_dedupe import find_duplicates, duplicate_key, insert_suggestions
+from .services.suggestion_queue import SUGGESTION_STATUSES, fetch_queue, fetch_changes, delta_cursor
+from .services.catalog_index import catalog_index
+from .services.ingestion import ACCEPTED_STATUSES, APPROVABLE_FROM, ingestion_stats
+from .services.fingerprint import fingerprint_file, fingerprint_index
 import logging
 
 logger = logging.getLogger(__name__)
@@ -110,6 +127,7 @@ async def background_xp_tracking():
                                     )
                                     db.add(xp_award)
                                     await db.commit()
+                                    await leaderboard.record_xp(user, xp_to_award)
                                     
                                     hour = now.hour
                                     if hour >= 2 and hour < 5:
@@ -127,6 +145,28 @@ async def background_xp_tracking():
             logger.error(f"Background XP tracking error: {e}", exc_info=True)
             await asyncio.sleep(60)
 
+TRENDING_PUSH_SIZE = 10
+
+async def background_trending():
+    """Background task do checkpointu trendów i wysyłania zmian w topce"""
+    from .database import AsyncSessionLocal
+    
+    last_checkpoint = asyncio.get_event_loop().time()
+    while True:
+        try:
+            await asyncio.sleep(15)
+            
+            if trending_engine.top_changed(TRENDING_PUSH_SIZE):
+                await event_broadcaster.broadcast("trending", {"songs": await get_trending(TRENDING_PUSH_SIZE)})
+            
+            now = asyncio.get_event_loop().time()
+            if now - last_checkpoint >= config.settings.trending_checkpoint_interval:
+                async with AsyncSessionLocal() as db:
+                    await trending_engine.checkpoint(db)
+                last_checkpoint = now
+        except Exception as e:
+            logger.error(f"Background trending error: {e}", exc_info=True)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
@@ -372,13 +412,115 @@ async def lifespan(app: FastAPI):
             await conn.execute(text("ALTER TABLE users ADD COLUMN email VARCHAR"))
             logger.info("Added email column to users table")
         
+        result = await conn.execute(text("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name='suggestions' AND column_name='updated_at'
+        """))
+        if result.scalar() is None:
+            await conn.execute(text("ALTER TABLE suggestions ADD COLUMN updated_at TIMESTAMPTZ"))
+            await conn.execute(text("UPDATE suggestions SET updated_at = COALESCE(created_at, now())"))
+            await conn.execute(text("ALTER TABLE suggestions ALTER COLUMN updated_at SET DEFAULT now()"))
+            logger.info("Added updated_at column to suggestions table")
+        
+        # Stan przetwarzania propozycji przez Workera (services/ingestion.py)
+        await conn.execute(text("""
+            ALTER TABLE suggestions
+                ADD COLUMN IF NOT EXISTS ingest_attempts INTEGER NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS ingest_progress INTEGER,
+                ADD COLUMN IF NOT EXISTS ingest_error TEXT,
+                ADD COLUMN IF NOT EXISTS azuracast_path VARCHAR,
+                ADD COLUMN IF NOT EXISTS loudness_lufs DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS true_peak_dbtp DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS leading_silence DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS trailing_silence DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS gain_db DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS analysis_ms INTEGER
+        """))
+        
+        # Początek sesji słuchania zwiniętej do jednego wiersza (services/xp_compaction.py)
+        await conn.execute(text("ALTER TABLE xp_awards ADD COLUMN IF NOT EXISTS started_at TIMESTAMPTZ"))
+        
+        # votes i xp_awards: partycje miesięczne po created_at (migracja jednorazowa, potem partycje na zapas)
+        for table in partitions.PARTITIONED_TABLES:
+            if not await partitions.is_partitioned(conn, table):
+                await partitions.convert_to_partitioned(conn, table)
+            else:
+                await partitions.ensure_partitions(conn, table)
+        
+        # Indeksy pod zapytania po użytkowniku w kolejności czasu (oś czasu profilu)
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_votes_user_created ON votes(user_id, created_at DESC, id DESC)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_suggestions_user_created ON suggestions(user_id, created_at DESC, id DESC)"))
+        # Wykrywanie duplikatów propozycji po youtube_id (services/suggestion_dedupe.py)
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_suggestions_user_youtube ON suggestions(user_id, youtube_id, created_at DESC)"))
+        # Kolejka moderacji (segmenty statusów) i tryb delty po updated_at
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_suggestions_status_created ON suggestions(status, created_at DESC, id DESC)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_suggestions_updated ON suggestions(updated_at, id)"))
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_xp_awards_user_created ON xp_awards(user_id, created_at DESC, id DESC)"))
+        # Częściowy indeks pod kompakcję nagród LISTENING i grupowanie sesji
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_xp_awards_listening ON xp_awards(user_id, created_at, id) WHERE award_type = 'LISTENING'"))
+        # Kompakcja skanuje tylko wiersze jeszcze niezwinięte
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_xp_awards_listening_pending ON xp_awards(user_id, created_at, id) WHERE award_type = 'LISTENING' AND started_at IS NULL"))
+        # Fallback rankingu XP, gdy Redis jest niedostępny
+        await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_leaderboard ON users(xp DESC, id) WHERE hide_activity = FALSE"))
+        
+        # Wyszukiwanie użytkowników w panelu admina (ILIKE po trigramach), bez pg_trgm zostaje seq scan
+        try:
+            async with conn.begin_nested():
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                await conn.execute(text("""
+                    CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin (
+                        (coalesce(username, '') || ' ' || coalesce(display_name, '') || ' ' || coalesce(email, '')) gin_trgm_ops
+                    )
+                """))
+        except Exception as e:
+            logger.warning(f"pg_trgm unavailable, admin user search will not be indexed: {e}")
+        
+        result = await conn.execute(text("SELECT 1 FROM song_vote_daily LIMIT 1"))
+        rollup_populated = result.scalar() is not None
+        
+        if not rollup_populated:
+            await charts.rebuild_vote_rollup(conn)
+            logger.info("Backfilled song_vote_daily rollup from votes")
+        
         await initialize_default_badges(conn)
     
+    from .database import AsyncSessionLocal
+    try:
+        async with AsyncSessionLocal() as db:
+            await trending_engine.load(db)
+    except Exception as e:
+        logger.error(f"Could not load trending checkpoint: {e}", exc_info=True)
+    
+    async with AsyncSessionLocal() as db:
+        await leaderboard.rebuild(db)
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            await load_rank_table(db)
+    except Exception as e:
+        logger.error(f"Could not load rank tiers, using defaults: {e}", exc_info=True)
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            await activity_stream.load(db)
+    except Exception as e:
+        logger.error(f"Could not load activity buffer: {e}", exc_info=True)
+    
     task1 = asyncio.create_task(background_polling())
     task2 = asyncio.create_task(background_xp_tracking())
+    task3 = asyncio.create_task(background_trending())
     yield
     task1.cancel()
     task2.cancel()
+    task3.cancel()
+    preview_pool.shutdown()
+    
+    try:
+        async with AsyncSessionLocal() as db:
+            await trending_engine.checkpoint(db)
+    except Exception as e:
+        logger.error(f"Could not checkpoint trending scores: {e}", exc_info=True)
 
 async def initialize_default_badges(conn):
     """Inicjalizuje domyślne odznaki w bazie danych"""
@@ -807,6 +949,7 @@ async def auth_callback(request: Request, db: AsyncSession = Depends(get_db)):
             await db.commit()
             await db.refresh(new_user)
             db_user = new_user
+            await leaderboard.sync_user(db, new_user)
     
     request.session['user'] = {**discord_user, 'provider': 'discord'}
     
@@ -956,6 +1099,7 @@ async def auth_callback_google(request: Request, db: AsyncSession = Depends(get_
             await db.commit()
             await db.refresh(new_user)
             db_user = new_user
+            await leaderboard.sync_user(db, new_user)
     
     request.session['user'] = {**google_user, 'id': google_id, 'provider': 'google'}
     
@@ -967,18 +1111,7 @@ async def read_users_me(request: Request, db: AsyncSession = Depends(get_db)):
     if user:
         xp = user.xp or 0
         rank_info = get_rank(xp)
-        
-        featured_badge = None
-        if user.featured_badge_id:
-            badge = await db.get(models.Badge, user.featured_badge_id)
-            if badge:
-                featured_badge = {
-                    "id": badge.id,
-                    "name": badge.name,
-                    "description": badge.description,
-                    "icon": badge.icon,
-                    "color": badge.color
-                }
+        featured_badge = await featured_badge_of(db, user)
         
         default_avatar_color = "#5865F2"
         if featured_badge and featured_badge.get("color"):
@@ -1261,6 +1394,8 @@ async def radio_update_webhook(request: Request):
     try:
         body = await request.json()
         event_type = body.get("type", "song_change")
+        # Webhook oznacza zmianę na stacji - snapshot z cache (NOWPLAYING_CACHE_TTL) może pokazywać poprzedni utwór
+        azuracast_client.invalidate_now_playing()
         
         if event_type == "song_change":
             now_playing = await azuracast_client.get_now_playing()
@@ -1320,6 +1455,8 @@ async def create_vote(vote: VoteRequest, request: Request, db: AsyncSession = De
         )
     )
     existing_vote = result.scalar_one_or_none()
+    previous_vote_type = existing_vote.vote_type if existing_vote else None
+    saved_vote = existing_vote
     
     should_award_xp = False
     
@@ -1333,6 +1470,10 @@ async def create_vote(vote: VoteRequest, request: Request, db: AsyncSession = De
     xp_already_awarded = xp_check.scalar_one_or_none() is not None
     
     if existing_vote:
+        if existing_vote.vote_type != vote.vote_type:
+            day = charts.vote_day(existing_vote.created_at)
+            await charts.apply_vote_delta(db, vote.song_id, day, **charts.vote_type_delta(existing_vote.vote_type, -1))
+            await charts.apply_vote_delta(db, vote.song_id, day, **charts.vote_type_delta(vote.vote_type))
         existing_vote.vote_type = vote.vote_type
         if not xp_already_awarded:
             should_award_xp = True
@@ -1345,6 +1486,8 @@ async def create_vote(vote: VoteRequest, request: Request, db: AsyncSession = De
             xp_awarded=not xp_already_awarded
         )
         db.add(new_vote)
+        saved_vote = new_vote
+        await charts.apply_vote_delta(db, vote.song_id, charts.vote_day(None), **charts.vote_type_delta(vote.vote_type))
         if not xp_already_awarded:
             should_award_xp = True
     
@@ -1359,7 +1502,16 @@ async def create_vote(vote: VoteRequest, request: Request, db: AsyncSession = De
         db.add(xp_award)
     
     await db.commit()
+    charts.chart_cache.bump()
+    trending_engine.record_vote(
+        vote.song_id, previous_vote_type, vote.vote_type,
+        existing_vote.created_at if existing_vote else None
+    )
     await db.refresh(user)
+    if should_award_xp:
+        await leaderboard.record_xp(user, XP_PER_VOTE)
+    if previous_vote_type != vote.vote_type:
+        await activity_stream.record_vote(db, user, saved_vote.id, vote.vote_type)
     
     if vote.vote_type == "LIKE":
         await _check_and_award_badges_internal(user.id, "LIKES", db)
@@ -1383,8 +1535,15 @@ async def delete_vote(song_id: str, request: Request, db: AsyncSession = Depends
     existing_vote = result.scalar_one_or_none()
     
     if existing_vote:
+        await charts.apply_vote_delta(
+            db, song_id, charts.vote_day(existing_vote.created_at),
+            **charts.vote_type_delta(existing_vote.vote_type, -1)
+        )
         await db.delete(existing_vote)
         await db.commit()
+        charts.chart_cache.bump()
+        trending_engine.record_vote(song_id, existing_vote.vote_type, None, existing_vote.created_at)
+        await activity_stream.remove(f"vote_{existing_vote.id}")
     
     return {"status": "success"}
 
@@ -1409,12 +1568,16 @@ class SuggestionBatchCreateRequest(BaseModel):
 class BulkUploadRequest(BaseModel):
     drive_link: str
 
+async def _existing_suggestions(db: AsyncSession, user_id: int, items: List[Dict]) -> Dict[str, Dict]:
+    """Istniejące propozycje użytkownika dla pozycji podglądu (klucz: youtube_id, a bez niego url)"""
+    return await find_duplicates(db, user_id, [(item.get('youtube_id'), item.get('url')) for item in items])
+
 @app.post("/api/suggestions/preview")
 async def preview_suggestion(preview: SuggestionPreviewRequest, request: Request, db: AsyncSession = Depends(get_db)):
     user = await auth.get_current_user(request, db)
     
     try:
-        result = preview_content(preview.input)
+        result = await run_preview(preview.input)
         
         if result.get('type') == 'error':
             raise HTTPException(status_code=400, detail=result.get('message', 'Błąd podczas pobierania informacji'))
@@ -1423,39 +1586,10 @@ async def preview_suggestion(preview: SuggestionPreviewRequest, request: Request
             """Sprawdza które propozycje już istnieją dla użytkownika"""
             if not user:
                 return {}
-            
-            existing_map = {}
-            now = datetime.now(timezone.utc)
-            cutoff = now - timedelta(days=30)
-            
-            for item in items:
-                youtube_id = item.get('youtube_id')
-                url = item.get('url', '')
-                
-                query = select(models.Suggestion).where(
-                    models.Suggestion.user_id == user.id,
-                    models.Suggestion.created_at >= cutoff
-                )
-                
-                if youtube_id:
-                    query = query.where(models.Suggestion.youtube_id == youtube_id)
-                elif url:
-                    query = query.where(models.Suggestion.raw_input == url)
-                else:
-                    continue
-                
-                result_db = await db.execute(query.order_by(desc(models.Suggestion.created_at)).limit(1))
-                existing = result_db.scalar_one_or_none()
-                
-                if existing:
-                    key = youtube_id or url
-                    existing_map[key] = {
-                        "id": existing.id,
-                        "status": existing.status,
-                        "created_at": existing.created_at.isoformat()
-                    }
-            
-            return existing_map
+            return await _existing_suggestions(db, user.id, items)
+        
+        # Dopasowania do biblioteki stacji i wszystkich propozycji (services/catalog_index.py)
+        await catalog_index.ensure(db)
         
         if result.get('type') == 'playlist':
             items = result.get('items', [])
@@ -1468,6 +1602,9 @@ async def preview_suggestion(preview: SuggestionPreviewRequest, request: Request
                 enriched_item = {**item}
                 if existing:
                     enriched_item['existing'] = existing
+                catalog = catalog_index.match(item.get('title'), item.get('artist'), item.get('youtube_id'))
+                if catalog:
+                    enriched_item['catalog'] = catalog
                 enriched_items.append(enriched_item)
             
             return {
@@ -1497,15 +1634,111 @@ async def preview_suggestion(preview: SuggestionPreviewRequest, request: Request
             if existing:
                 response['existing'] = existing
             
+            catalog = catalog_index.match(item.get('title'), item.get('artist'), item.get('youtube_id'))
+            if catalog:
+                response['catalog'] = catalog
+            
             return response
         else:
             raise HTTPException(status_code=400, detail="Nieznany typ wyniku")
     except HTTPException:
         raise
+    except PreviewPoolBusy:
+        raise HTTPException(status_code=503, detail="Zbyt wiele podglądów naraz, spróbuj ponownie za chwilę")
+    except PreviewTimeout:
+        raise HTTPException(status_code=504, detail="Pobieranie informacji trwało zbyt długo")
     except Exception as e:
         logger.error(f"Preview error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Błąd podczas przetwarzania: {str(e)}")
 
+# Ile pozycji playlisty najwyżej w jednej linii strumienia
+PREVIEW_STREAM_BATCH = 25
+
+@app.post("/api/suggestions/preview/stream")
+async def preview_suggestion_stream(preview: SuggestionPreviewRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Podgląd playlisty jako NDJSON: linie {"type": "items"} w miarę pobierania przez yt-dlp, na końcu "done" albo "error".
+    
+    Każda paczka jest od razu wzbogacana o istniejące propozycje (jedno zapytanie na paczkę)
+    i dopasowania z katalogu stacji.
+    Rozłączenie klienta zatrzymuje ekstrakcję przy następnej pozycji.
+    """
+    import json
+    from contextlib import aclosing
+    from .database import AsyncSessionLocal
+    
+    input_str = preview.input.strip()
+    if not (is_youtube_url(input_str) and is_playlist_url(input_str)):
+        raise HTTPException(status_code=400, detail="Podgląd strumieniowy obsługuje tylko playlisty YouTube")
+    
+    user = await auth.get_current_user(request, db)
+    user_id = user.id if user else None
+    
+    def line(payload: Dict) -> str:
+        return json.dumps(payload, ensure_ascii=False) + "\n"
+    
+    async def cached_batches(items: List[Dict]):
+        for start in range(0, len(items), PREVIEW_STREAM_BATCH):
+            yield items[start:start + PREVIEW_STREAM_BATCH]
+    
+    async def generate():
+        try:
+            cached = await preview_cache.lookup(input_str)
+            if cached and cached.get('type') == 'error':
+                yield line({"type": "error", "message": cached.get('message', 'Nie udało się pobrać playlisty')})
+                return
+            
+            if cached and cached.get('type') == 'playlist':
+                source = cached_batches(cached.get('items', []))
+            else:
+                source = preview_pool.stream(iter_playlist_items, input_str, max_batch=PREVIEW_STREAM_BATCH)
+            
+            collected = []
+            # Osobna sesja - zależność get_db może zostać zamknięta przed końcem strumienia
+            async with AsyncSessionLocal() as session, aclosing(source) as batches:
+                await catalog_index.ensure(session)
+                async for batch in batches:
+                    if await request.is_disconnected():
+                        return
+                    existing_map = await _existing_suggestions(session, user_id, batch) if user_id else {}
+                    items = []
+                    for item in batch:
+                        enriched = {**item}
+                        existing = existing_map.get(item.get('youtube_id') or item.get('url', ''))
+                        if existing:
+                            enriched['existing'] = existing
+                        catalog = catalog_index.match(item.get('title'), item.get('artist'), item.get('youtube_id'))
+                        if catalog:
+                            enriched['catalog'] = catalog
+                        items.append(enriched)
+                    collected.extend(batch)
+                    yield line({"type": "items", "items": items})
+            
+            if not collected:
+                error = {"type": "error", "message": "Nie udało się pobrać playlisty"}
+                await preview_cache.store(input_str, error)
+                yield line(error)
+                return
+            
+            if not cached:
+                await preview_cache.store(input_str, {"type": "playlist", "items": collected, "count": len(collected)})
+            yield line({"type": "done", "count": len(collected)})
+        except PreviewPoolBusy:
+            yield line({"type": "error", "message": "Zbyt wiele podglądów naraz, spróbuj ponownie za chwilę"})
+        except PreviewTimeout:
+            yield line({"type": "error", "message": "Pobieranie playlisty trwało zbyt długo"})
+        except Exception as e:
+            logger.error(f"Streaming preview error: {e}", exc_info=True)
+            yield line({"type": "error", "message": "Nie udało się pobrać playlisty"})
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 async def check_suggestion_rate_limit(user_id: int, db: AsyncSession) -> Tuple[bool, int]:
     """Sprawdza rate limiting dla propozycji. Zwraca (allowed, seconds_until_next)"""
     now = datetime.now(timezone.utc)
@@ -1537,24 +1770,6 @@ async def check_suggestion_rate_limit(user_id: int, db: AsyncSession) -> Tuple[b
                 return (False, int(60 - seconds_passed))
         return (True, 60)
 
-async def check_duplicate_suggestion(user_id: int, youtube_id: Optional[str], raw_input: str, db: AsyncSession) -> Optional[models.Suggestion]:
-    """Sprawdza czy propozycja już istnieje. Zwraca istniejącą propozycję lub None"""
-    now = datetime.now(timezone.utc)
-    cutoff = now - timedelta(days=30)
-    
-    query = select(models.Suggestion).where(
-        models.Suggestion.user_id == user_id,
-        models.Suggestion.created_at >= cutoff
-    )
-    
-    if youtube_id:
-        query = query.where(models.Suggestion.youtube_id == youtube_id)
-    else:
-        query = query.where(models.Suggestion.raw_input == raw_input)
-    
-    result = await db.execute(query.order_by(desc(models.Suggestion.created_at)).limit(1))
-    return result.scalar_one_or_none()
-
 @app.post("/api/suggestions")
 async def create_suggestion(suggestion: SuggestionCreateRequest, request: Request, db: AsyncSession = Depends(get_db)):
     user = await auth.get_current_user(request, db)
@@ -1568,21 +1783,21 @@ async def create_suggestion(suggestion: SuggestionCreateRequest, request: Reques
             detail=f"Zbyt wiele propozycji. Spróbuj ponownie za {wait_seconds} sekund."
         )
     
-    existing = await check_duplicate_suggestion(
-        user.id,
-        suggestion.youtube_id,
-        suggestion.input,
-        db
-    )
+    duplicates = await find_duplicates(db, user.id, [(suggestion.youtube_id, suggestion.input)])
+    existing = duplicates.get(duplicate_key(suggestion.youtube_id, suggestion.input))
     
     if existing:
         return {
             "status": "duplicate",
-            "id": existing.id,
+            "id": existing["id"],
             "message": "Ta propozycja została już wysłana",
-            "existing_status": existing.status
+            "existing_status": existing["status"]
         }
     
+    # Propozycja zostaje przyjęta - dopasowanie z katalogu to informacja dla użytkownika i moderatora
+    await catalog_index.ensure(db)
+    catalog = catalog_index.match(suggestion.title, suggestion.artist, suggestion.youtube_id)
+    
     new_suggestion = models.Suggestion(
         user_id=user.id,
         raw_input=suggestion.input,
@@ -1597,10 +1812,15 @@ async def create_suggestion(suggestion: SuggestionCreateRequest, request: Reques
     db.add(new_suggestion)
     await db.commit()
     await db.refresh(new_suggestion)
+    await activity_stream.record_suggestion(db, user, new_suggestion.id, new_suggestion.created_at)
+    catalog_index.add_suggestion(new_suggestion.id, user.id, suggestion.title, suggestion.artist, suggestion.youtube_id)
     
     await _check_and_award_badges_internal(user.id, "SUGGESTIONS", db)
     
-    return {"status": "success", "id": new_suggestion.id}
+    response = {"status": "success", "id": new_suggestion.id}
+    if catalog:
+        response["catalog"] = catalog
+    return response
 
 @app.post("/api/suggestions/batch")
 async def create_suggestions_batch(batch: SuggestionBatchCreateRequest, request: Request, db: AsyncSession = Depends(get_db)):
@@ -1621,90 +1841,138 @@ async def create_suggestions_batch(batch: SuggestionBatchCreateRequest, request:
             detail=f"Zbyt wiele propozycji. Spróbuj ponownie za {wait_seconds} sekund."
         )
     
-    created_ids = []
-    duplicate_ids = []
-    skipped_count = 0
+    entries = [
+        (item, item.get('input', item.get('url', '')), item.get('youtube_id'))
+        for item in batch.items
+    ]
+    duplicates = await find_duplicates(db, user.id, [(youtube_id, raw_input) for _, raw_input, youtube_id in entries])
     
-    for item in batch.items:
-        raw_input = item.get('input', item.get('url', ''))
-        youtube_id = item.get('youtube_id')
-        
-        existing = await check_duplicate_suggestion(user.id, youtube_id, raw_input, db)
-        
-        if existing:
+    rows = []
+    duplicate_ids = []
+    batch_keys = {}
+    for item, raw_input, youtube_id in entries:
+        key = duplicate_key(youtube_id, raw_input)
+        existing = duplicates.get(key) if key else None
+        if existing or (key and key in batch_keys):
             duplicate_ids.append({
                 "youtube_id": youtube_id,
                 "title": item.get('title'),
-                "existing_id": existing.id,
-                "existing_status": existing.status
+                "existing_id": existing["id"] if existing else None,
+                "existing_status": existing["status"] if existing else "PENDING",
+                "_batch_index": None if existing else batch_keys[key]
             })
-            skipped_count += 1
             continue
         
-        new_suggestion = models.Suggestion(
-            user_id=user.id,
-            raw_input=raw_input,
-            source_type=item.get('source_type', 'YOUTUBE'),
-            title=item.get('title'),
-            artist=item.get('artist'),
-            thumbnail_url=item.get('thumbnail_url') or item.get('thumbnail'),
-            duration_seconds=item.get('duration_seconds', 0),
-            youtube_id=youtube_id,
-            status="PENDING"
-        )
-        db.add(new_suggestion)
-        created_ids.append(new_suggestion)
+        if key:
+            batch_keys[key] = len(rows)
+        rows.append({
+            "user_id": user.id,
+            "raw_input": raw_input,
+            "source_type": item.get('source_type', 'YOUTUBE'),
+            "title": item.get('title'),
+            "artist": item.get('artist'),
+            "thumbnail_url": item.get('thumbnail_url') or item.get('thumbnail'),
+            "duration_seconds": item.get('duration_seconds', 0),
+            "youtube_id": youtube_id,
+            "status": "PENDING"
+        })
+    
+    # Dopasowania liczone przed dopisaniem paczki do indeksu, żeby pozycje nie trafiały same na siebie
+    await catalog_index.ensure(db)
+    catalog_matches = [catalog_index.match(row["title"], row["artist"], row["youtube_id"]) for row in rows]
     
+    created = await insert_suggestions(db, rows)
     await db.commit()
     
-    for suggestion in created_ids:
-        await db.refresh(suggestion)
+    # Powtórzenia w obrębie paczki wskazują na propozycję utworzoną przed chwilą
+    for duplicate in duplicate_ids:
+        batch_index = duplicate.pop("_batch_index")
+        if batch_index is not None:
+            duplicate["existing_id"] = created[batch_index][0]
     
-    if len(created_ids) > 0:
+    for row, (suggestion_id, created_at) in zip(rows, created):
+        await activity_stream.record_suggestion(db, user, suggestion_id, created_at)
+        catalog_index.add_suggestion(suggestion_id, user.id, row["title"], row["artist"], row["youtube_id"])
+    
+    if created:
         await _check_and_award_badges_internal(user.id, "SUGGESTIONS", db)
     
     return {
         "status": "success",
-        "count": len(created_ids),
-        "skipped": skipped_count,
-        "ids": [s.id for s in created_ids],
-        "duplicates": duplicate_ids
+        "count": len(created),
+        "skipped": len(duplicate_ids),
+        "ids": [suggestion_id for suggestion_id, _ in created],
+        "duplicates": duplicate_ids,
+        "catalog_matches": [
+            {"id": suggestion_id, "title": row["title"], "catalog": catalog}
+            for row, (suggestion_id, _), catalog in zip(rows, created, catalog_matches) if catalog
+        ]
     }
 
+async def _with_catalog(db: AsyncSession, items: List[Dict]) -> List[Dict]:
+    """Dopasowania z katalogu dla kolejki moderacji (bez trafienia propozycji w samą siebie)"""
+    await catalog_index.ensure(db)
+    for item in items:
+        item["catalog"] = catalog_index.match(item["title"], item["artist"], item["youtube_id"], exclude_suggestion_id=item["id"])
+    return items
+
+async def _suggestions_response(db: AsyncSession, user_id: Optional[int], pending_first: bool, status: Optional[str], limit: int, cursor: Optional[str], since: Optional[str], catalog: bool = False) -> JSONResponse:
+    """Wspólna obsługa listy propozycji: strona keyset (X-Next-Cursor) albo delta od tokena (since).
+    
+    Każda odpowiedź niesie X-Delta-Cursor - kolejne odpytanie z since zwraca tylko nowe lub zmienione wiersze
+    """
+    if since:
+        parts = decode_cursor(since)
+        since_at = parse_datetime(parts[0]) if parts and len(parts) == 2 else None
+        if not since_at or not isinstance(parts[1], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        items, token = await fetch_changes(db, (since_at, parts[1]), user_id, max(1, min(limit, 200)))
+        if catalog:
+            items = await _with_catalog(db, items)
+        return JSONResponse(content=items, headers={"X-Delta-Cursor": token})
+    
+    statuses = None
+    if status:
+        statuses = [value.strip().upper() for value in status.split(",") if value.strip()]
+        if not statuses or any(value not in SUGGESTION_STATUSES for value in statuses):
+            raise HTTPException(status_code=400, detail="Invalid status")
+    
+    before = None
+    if cursor:
+        parts = decode_cursor(cursor)
+        before_at = parse_datetime(parts[1]) if parts and len(parts) == 3 else None
+        if not before_at or not isinstance(parts[0], int) or not isinstance(parts[2], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before = (parts[0], before_at, parts[2])
+    
+    # Token delty przed odczytem strony - zmiany w trakcie odczytu trafią do następnej delty
+    token = await delta_cursor(db, user_id)
+    items, next_cursor = await fetch_queue(db, user_id, statuses, pending_first, max(1, min(limit, 200)), before)
+    if catalog:
+        items = await _with_catalog(db, items)
+    
+    headers = {"X-Delta-Cursor": token}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return JSONResponse(content=items, headers=headers)
+
 @app.get("/api/suggestions")
-async def get_suggestions(request: Request, db: AsyncSession = Depends(get_db)):
+async def get_suggestions(request: Request, limit: int = 50, cursor: Optional[str] = None, since: Optional[str] = None, status: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Propozycje zalogowanego użytkownika, najnowsze pierwsze (kolejka wszystkich: /api/admin/suggestions)"""
     user = await auth.get_current_user(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    if user.is_admin:
-        result = await db.execute(
-            select(models.Suggestion).order_by(desc(models.Suggestion.created_at))
-        )
-        suggestions = result.scalars().all()
-    else:
-        result = await db.execute(
-            select(models.Suggestion)
-            .where(models.Suggestion.user_id == user.id)
-            .order_by(desc(models.Suggestion.created_at))
-        )
-        suggestions = result.scalars().all()
+    return await _suggestions_response(db, user.id, False, status, limit, cursor, since)
+
+@app.get("/api/admin/suggestions")
+async def get_suggestion_queue(request: Request, limit: int = 50, cursor: Optional[str] = None, since: Optional[str] = None, status: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Kolejka moderacji: PENDING na początku, filtr statusów (np. status=PENDING,APPROVED), keyset i tryb delty"""
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
     
-    return [
-        {
-            "id": s.id,
-            "user_id": s.user_id,
-            "raw_input": s.raw_input,
-            "source_type": s.source_type,
-            "title": s.title,
-            "artist": s.artist,
-            "thumbnail_url": s.thumbnail_url,
-            "youtube_id": s.youtube_id,
-            "status": s.status,
-            "created_at": s.created_at.isoformat()
-        }
-        for s in suggestions
-    ]
+    return await _suggestions_response(db, None, True, status, limit, cursor, since, catalog=True)
 
 @app.post("/api/suggestions/{suggestion_id}/approve")
 async def approve_suggestion(suggestion_id: int, request: Request, db: AsyncSession = Depends(get_db)):
@@ -1712,10 +1980,14 @@ async def approve_suggestion(suggestion_id: int, request: Request, db: AsyncSess
     if not user or not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin only")
     
-    result = await db.execute(select(models.Suggestion).where(models.Suggestion.id == suggestion_id))
+    result = await db.execute(select(models.Suggestion).where(models.Suggestion.id == suggestion_id).with_for_update())
     suggestion = result.scalar_one_or_none()
     if not suggestion:
         raise HTTPException(status_code=404, detail="Suggestion not found")
+    if suggestion.status == "APPROVED":
+        return {"status": "success"}
+    if suggestion.status not in APPROVABLE_FROM:
+        raise HTTPException(status_code=409, detail=f"Cannot approve a suggestion in status {suggestion.status}")
     
     suggestion.status = "APPROVED"
     await db.commit()
@@ -1739,6 +2011,31 @@ async def reject_suggestion(suggestion_id: int, request: Request, db: AsyncSessi
     await db.commit()
     return {"status": "success"}
 
+class BulkModerationRequest(BaseModel):
+    ids: List[int]
+    action: str  # approve / reject
+
+BULK_MODERATION_STATUSES = {"approve": "APPROVED", "reject": "REJECTED"}
+
+def _bulk_moderation_status(bulk: BulkModerationRequest) -> str:
+    status = BULK_MODERATION_STATUSES.get(bulk.action)
+    if not status:
+        raise HTTPException(status_code=400, detail="Invalid action")
+    if not bulk.ids:
+        raise HTTPException(status_code=400, detail="No ids")
+    if len(bulk.ids) > MAX_BULK_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_BULK_IDS})")
+    return status
+
+@app.post("/api/admin/suggestions/bulk")
+async def bulk_moderate_suggestions(bulk: BulkModerationRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Zatwierdzenie/odrzucenie wielu propozycji jednym UPDATE, wynik dla każdego id"""
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await moderate_suggestions(db, bulk.ids, _bulk_moderation_status(bulk))
+
 def is_valid_google_drive_link(url: str) -> bool:
     """Sprawdza czy link jest do Google Drive"""
     if not url or not url.strip():
@@ -1779,6 +2076,7 @@ async def bulk_upload_suggestion(bulk: BulkUploadRequest, request: Request, db:
     db.add(new_suggestion)
     await db.commit()
     await db.refresh(new_suggestion)
+    await activity_stream.record_suggestion(db, user, new_suggestion.id, new_suggestion.created_at)
     
     await _check_and_award_badges_internal(user.id, "SUGGESTIONS", db)
     
@@ -1786,301 +2084,125 @@ async def bulk_upload_suggestion(bulk: BulkUploadRequest, request: Request, db:
 
 # --- CHARTS ---
 
+def _etag_response(request: Request, payload, etag: str):
+    """Zwraca 304 gdy klient ma aktualną wersję, w przeciwnym razie JSON z nagłówkiem ETag"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
 @app.get("/api/charts")
-async def get_charts(period: str = "week", limit: int = 10, db: AsyncSession = Depends(get_db)):
-    if period == "week":
-        since = datetime.utcnow() - timedelta(days=7)
-    elif period == "month":
-        since = datetime.utcnow() - timedelta(days=30)
-    else:
-        since = datetime.min
-    
-    result = await db.execute(
-        select(
-            models.Vote.song_id,
-            func.count(models.Vote.id).label("votes_count")
-        )
-        .where(
-            models.Vote.vote_type == "LIKE",
-            models.Vote.created_at >= since
-        )
-        .group_by(models.Vote.song_id)
-        .order_by(desc("votes_count"))
-        .limit(limit)
-    )
-    
-    charts = result.all()
-    
-    prev_since = None
-    prev_until = None
-    if period == "week":
-        prev_since = datetime.utcnow() - timedelta(days=14)
-        prev_until = datetime.utcnow() - timedelta(days=7)
-    elif period == "month":
-        prev_since = datetime.utcnow() - timedelta(days=60)
-        prev_until = datetime.utcnow() - timedelta(days=30)
-    
-    prev_positions = {}
-    if prev_since:
-        prev_result = await db.execute(
-            select(
-                models.Vote.song_id,
-                func.count(models.Vote.id).label("votes_count")
-            )
-            .where(
-                models.Vote.vote_type == "LIKE",
-                models.Vote.created_at >= prev_since,
-                models.Vote.created_at < prev_until
-            )
-            .group_by(models.Vote.song_id)
-            .order_by(desc("votes_count"))
-            .limit(limit * 2)
-        )
-        prev_charts = prev_result.all()
-        for prev_idx, prev_chart in enumerate(prev_charts):
-            prev_positions[prev_chart.song_id] = prev_idx + 1
-    
-    song_ids = [chart.song_id for chart in charts]
-    songs_info = await azuracast_client.get_songs_info_batch(song_ids)
-    
-    chart_list = []
-    for idx, chart in enumerate(charts):
-        song_info = songs_info.get(str(chart.song_id), {})
-        current_pos = idx + 1
-        prev_pos = prev_positions.get(chart.song_id)
-        is_new = prev_pos is None
-        
-        chart_list.append({
-            "position": current_pos,
-            "song_id": chart.song_id,
-            "title": song_info.get("title", ""),
-            "artist": song_info.get("artist", ""),
-            "thumbnail": song_info.get("thumbnail"),
-            "votes": chart.votes_count,
-            "previous_position": prev_pos,
-            "is_new": is_new
-        })
-    
-    return chart_list
+async def get_charts(request: Request, period: str = "week", limit: int = 10, mode: str = "likes", db: AsyncSession = Depends(get_db)):
+    lists, etags = await charts.get_charts_cached(db, period, limit, mode)
+    return _etag_response(request, lists["top"], etags["top"])
 
 @app.get("/api/charts/worst")
-async def get_worst_charts(period: str = "week", limit: int = 10, db: AsyncSession = Depends(get_db)):
-    if period == "week":
-        since = datetime.utcnow() - timedelta(days=7)
-    elif period == "month":
-        since = datetime.utcnow() - timedelta(days=30)
-    else:
-        since = datetime.min
-    
-    result = await db.execute(
-        select(
-            models.Vote.song_id,
-            func.count(models.Vote.id).label("votes_count")
-        )
-        .where(
-            models.Vote.vote_type == "DISLIKE",
-            models.Vote.created_at >= since
-        )
-        .group_by(models.Vote.song_id)
-        .order_by(desc("votes_count"))
-        .limit(limit)
+async def get_worst_charts(request: Request, period: str = "week", limit: int = 10, mode: str = "likes", db: AsyncSession = Depends(get_db)):
+    lists, etags = await charts.get_charts_cached(db, period, limit, mode)
+    return _etag_response(request, lists["worst"], etags["worst"])
+
+@app.get("/api/charts/combined")
+async def get_combined_charts(request: Request, period: str = "week", limit: int = 10, mode: str = "likes", db: AsyncSession = Depends(get_db)):
+    """Lista przebojów i antylista z jednego przeliczenia. Tryby: likes, net, wilson, controversy"""
+    lists, etags = await charts.get_charts_cached(db, period, limit, mode)
+    return _etag_response(request, lists, etags["*"])
+
+@app.get("/api/charts/trending")
+async def get_trending_charts(limit: int = 10):
+    """Utwory zyskujące najwięcej głosów w ostatnim czasie (wynik wygaszany wykładniczo)"""
+    return await get_trending(limit)
+
+@app.get("/api/charts/archive")
+async def get_chart_archive(period: str = "week", mode: str = "likes", limit: int = 20, before_id: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """Lista zamrożonych notowań (najnowsze pierwsze)"""
+    query = select(
+        models.ChartSnapshot.id,
+        models.ChartSnapshot.period,
+        models.ChartSnapshot.mode,
+        models.ChartSnapshot.period_start,
+        models.ChartSnapshot.period_end
+    ).where(
+        models.ChartSnapshot.period == period,
+        models.ChartSnapshot.mode == mode
     )
+    if before_id is not None:
+        query = query.where(models.ChartSnapshot.id < before_id)
     
-    charts = result.all()
-    
-    prev_since = None
-    prev_until = None
-    if period == "week":
-        prev_since = datetime.utcnow() - timedelta(days=14)
-        prev_until = datetime.utcnow() - timedelta(days=7)
-    elif period == "month":
-        prev_since = datetime.utcnow() - timedelta(days=60)
-        prev_until = datetime.utcnow() - timedelta(days=30)
-    
-    prev_positions = {}
-    if prev_since:
-        prev_result = await db.execute(
-            select(
-                models.Vote.song_id,
-                func.count(models.Vote.id).label("votes_count")
-            )
-            .where(
-                models.Vote.vote_type == "DISLIKE",
-                models.Vote.created_at >= prev_since,
-                models.Vote.created_at < prev_until
-            )
-            .group_by(models.Vote.song_id)
-            .order_by(desc("votes_count"))
-            .limit(limit * 2)
-        )
-        prev_charts = prev_result.all()
-        for prev_idx, prev_chart in enumerate(prev_charts):
-            prev_positions[prev_chart.song_id] = prev_idx + 1
-    
-    song_ids = [chart.song_id for chart in charts]
-    songs_info = await azuracast_client.get_songs_info_batch(song_ids)
-    
-    chart_list = []
-    for idx, chart in enumerate(charts):
-        song_info = songs_info.get(str(chart.song_id), {})
-        current_pos = idx + 1
-        prev_pos = prev_positions.get(chart.song_id)
-        is_new = prev_pos is None
-        
-        chart_list.append({
-            "position": current_pos,
-            "song_id": chart.song_id,
-            "title": song_info.get("title", ""),
-            "artist": song_info.get("artist", ""),
-            "thumbnail": song_info.get("thumbnail"),
-            "votes": chart.votes_count,
-            "previous_position": prev_pos,
-            "is_new": is_new
-        })
+    result = await db.execute(query.order_by(desc(models.ChartSnapshot.id)).limit(max(1, min(limit, 100))))
     
-    return chart_list
+    return [
+        {
+            "id": row.id,
+            "period": row.period,
+            "mode": row.mode,
+            "period_start": row.period_start.isoformat(),
+            "period_end": row.period_end.isoformat()
+        }
+        for row in result.all()
+    ]
+
+@app.get("/api/charts/archive/{snapshot_id}")
+async def get_chart_snapshot(snapshot_id: int, request: Request, limit: int = 10, db: AsyncSession = Depends(get_db)):
+    snapshot = await db.get(models.ChartSnapshot, snapshot_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    
+    lists = await charts.snapshot_charts(snapshot, limit)
+    payload = {
+        "id": snapshot.id,
+        "period": snapshot.period,
+        "mode": snapshot.mode,
+        "period_start": snapshot.period_start.isoformat(),
+        "period_end": snapshot.period_end.isoformat(),
+        **lists
+    }
+    return _etag_response(request, payload, charts.ChartCache.make_etag(payload))
 
 # --- USER PROFILE ---
 
 @app.get("/api/users/me/history")
-async def get_user_history(request: Request, db: AsyncSession = Depends(get_db)):
+async def get_user_history(request: Request, limit: int = 20, cursor: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Oś czasu użytkownika stronicowana kursorem (pole "cursor" ostatniego elementu lub nagłówek X-Next-Cursor)"""
     user = await auth.get_current_user(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    suggestions_result = await db.execute(
-        select(models.Suggestion)
-        .where(models.Suggestion.user_id == user.id)
-        .order_by(desc(models.Suggestion.created_at))
-        .limit(20)
-    )
-    suggestions = suggestions_result.scalars().all()
+    before = None
+    if cursor:
+        parts = decode_cursor(cursor)
+        before_at = parse_datetime(parts[0]) if parts and len(parts) == 3 else None
+        if not before_at or not isinstance(parts[2], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before = (before_at, str(parts[1]), parts[2])
     
-    votes_result = await db.execute(
-        select(models.Vote)
-        .where(models.Vote.user_id == user.id)
-        .order_by(desc(models.Vote.created_at))
-        .limit(20)
-    )
-    votes = votes_result.scalars().all()
-    
-    history = []
-    for s in suggestions:
-        history.append({
-            "id": s.id,
-            "type": "suggestion",
-            "title": s.title or "Unknown",
-            "artist": s.artist or "Unknown",
-            "status": s.status,
-            "created_at": s.created_at.isoformat()
-        })
-    
-    for v in votes:
-        song_info = await azuracast_client.get_song_info(v.song_id)
-        history.append({
-            "id": v.id,
-            "type": "vote",
-            "title": song_info.get("title", f"Song {v.song_id}") if song_info else f"Song {v.song_id}",
-            "artist": song_info.get("artist", "Unknown") if song_info else "Unknown",
-            "thumbnail": song_info.get("thumbnail") if song_info else None,
-            "vote_type": v.vote_type,
-            "created_at": v.created_at.isoformat()
-        })
+    items, next_cursor = await fetch_user_timeline(db, user.id, max(1, min(limit, 100)), before)
     
-    history.sort(key=lambda x: x["created_at"], reverse=True)
-    return history[:20]
+    response = JSONResponse(content=items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @app.get("/api/users/me/xp-history")
-async def get_user_xp_history(request: Request, db: AsyncSession = Depends(get_db)):
-    from datetime import timedelta
-    
+async def get_user_xp_history(request: Request, limit: int = 100, cursor: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Historia XP (głosy + sesje słuchania) stronicowana kursorem, sesje grupowane w Postgresie"""
     user = await auth.get_current_user(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
-    xp_history = []
-    
-    votes_result = await db.execute(
-        select(models.XpAward)
-        .where(
-            models.XpAward.user_id == user.id,
-            models.XpAward.award_type == "VOTE",
-            models.XpAward.song_id.isnot(None)
-        )
-        .order_by(desc(models.XpAward.created_at))
-        .limit(100)
-    )
-    votes = votes_result.scalars().all()
-    
-    for award in votes:
-        song_info = await azuracast_client.get_song_info(award.song_id)
-        xp_history.append({
-            "id": f"award_{award.id}",
-            "type": "vote",
-            "xp": award.xp_amount,
-            "description": "Głosowanie na utwór",
-            "title": song_info.get("title", f"Song {award.song_id}") if song_info else f"Song {award.song_id}",
-            "artist": song_info.get("artist", "Unknown") if song_info else "Unknown",
-            "created_at": award.created_at.isoformat()
-        })
-    
-    listening_result = await db.execute(
-        select(models.XpAward)
-        .where(
-            models.XpAward.user_id == user.id,
-            models.XpAward.award_type == "LISTENING"
-        )
-        .order_by(desc(models.XpAward.created_at))
-        .limit(500)
-    )
-    listening_awards = listening_result.scalars().all()
-    
-    if listening_awards:
-        grouped_sessions = []
-        current_group = []
-        
-        for award in listening_awards:
-            if not current_group:
-                current_group.append(award)
-            else:
-                last_award = current_group[-1]
-                time_diff = (last_award.created_at - award.created_at).total_seconds()
-                
-                if time_diff <= 300:
-                    current_group.append(award)
-                else:
-                    if current_group:
-                        total_xp = sum(a.xp_amount for a in current_group)
-                        minutes = total_xp
-                        grouped_sessions.append({
-                            "id": f"session_{current_group[0].id}",
-                            "type": "listening",
-                            "xp": total_xp,
-                            "description": f"Czas słuchania ({minutes} min)",
-                            "title": None,
-                            "artist": None,
-                            "created_at": current_group[0].created_at.isoformat()
-                        })
-                    current_group = [award]
-        
-        if current_group:
-            total_xp = sum(a.xp_amount for a in current_group)
-            minutes = total_xp
-            grouped_sessions.append({
-                "id": f"session_{current_group[0].id}",
-                "type": "listening",
-                "xp": total_xp,
-                "description": f"Czas słuchania ({minutes} min)",
-                "title": None,
-                "artist": None,
-                "created_at": current_group[0].created_at.isoformat()
-            })
-        
-        xp_history.extend(grouped_sessions)
+    before = None
+    if cursor:
+        parts = decode_cursor(cursor)
+        before_at = parse_datetime(parts[0]) if parts and len(parts) == 2 else None
+        if not before_at or not isinstance(parts[1], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        before = (before_at, parts[1])
     
-    xp_history.sort(key=lambda x: x["created_at"] if x["created_at"] else "", reverse=True)
+    items, next_cursor = await fetch_xp_history(db, user.id, max(1, min(limit, 100)), before)
     
-    return xp_history[:100]
+    response = JSONResponse(content=items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
 
 @app.get("/api/users/me/stats")
 async def get_user_stats(request: Request, db: AsyncSession = Depends(get_db)):
@@ -2102,33 +2224,60 @@ async def get_user_stats(request: Request, db: AsyncSession = Depends(get_db)):
         "reputation_score": user.reputation_score
     }
 
-@app.get("/api/leaderboard")
-async def get_leaderboard(limit: int = 100, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(models.User)
-        .where(models.User.hide_activity == False)
-        .order_by(desc(models.User.xp))
-        .limit(limit)
-    )
-    users = result.scalars().all()
-    
-    leaderboard = []
-    for idx, user in enumerate(users, 1):
+async def _leaderboard_entries(db: AsyncSession, ranked: List[tuple]) -> List[dict]:
+    """[(pozycja, user_id, wynik)] -> wpisy rankingu z danymi użytkowników (jedno zapytanie)"""
+    user_ids = [user_id for _, user_id, _ in ranked]
+    result = await db.execute(select(models.User).where(models.User.id.in_(user_ids))) if user_ids else None
+    users = {u.id: u for u in result.scalars().all()} if result else {}
+    await badge_cache.ensure(db)
+    rows = [(position, users[user_id], score) for position, user_id, score in ranked if user_id in users]
+    rank_infos = get_ranks(user.xp or 0 for _, user, _ in rows)
+    
+    entries = []
+    for (position, user, score), rank_info in zip(rows, rank_infos):
         xp = user.xp or 0
-        rank_info = get_rank(xp)
-        leaderboard.append({
-            "rank": idx,
+        entries.append({
+            "rank": position,
             "id": user.id,
             "username": user.username,
             "avatar_url": user.avatar_url,
             "xp": xp,
+            "score": score,
+            "featured_badge": badge_cache.featured(user.featured_badge_id),
             "rank_name": rank_info["name"],
             "progress": rank_info["progress"],
             "next_rank": rank_info["next_rank"],
             "next_rank_xp": rank_info["next_rank_xp"],
         })
+    return entries
+
+@app.get("/api/leaderboard")
+async def get_leaderboard(limit: int = 100, offset: int = 0, period: str = "all", db: AsyncSession = Depends(get_db)):
+    """Ranking XP: all (users.xp), week i month (XP zdobyte w bieżącym tygodniu/miesiącu)"""
+    if period not in LEADERBOARD_PERIODS:
+        raise HTTPException(status_code=400, detail="Invalid period")
+    limit = max(1, min(limit, 100))
+    offset = max(0, offset)
+    
+    top = await leaderboard.top(db, period, limit, offset)
+    ranked = [(offset + idx + 1, user_id, score) for idx, (user_id, score) in enumerate(top)]
+    return await _leaderboard_entries(db, ranked)
+
+@app.get("/api/leaderboard/me")
+async def get_my_leaderboard_position(request: Request, period: str = "all", radius: int = 5, db: AsyncSession = Depends(get_db)):
+    """Pozycja zalogowanego użytkownika w rankingu i jego sąsiedzi"""
+    user = await auth.get_current_user(request, db)
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if period not in LEADERBOARD_PERIODS:
+        raise HTTPException(status_code=400, detail="Invalid period")
     
-    return leaderboard
+    position, ranked = await leaderboard.around(db, user, period, max(0, min(radius, 25)))
+    return {
+        "period": period,
+        "rank": position,
+        "neighbours": await _leaderboard_entries(db, ranked),
+    }
 
 @app.get("/api/users/{user_id}/stats")
 async def get_user_stats_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
@@ -2146,18 +2295,7 @@ async def get_user_stats_by_id(user_id: int, db: AsyncSession = Depends(get_db))
     
     xp = user.xp or 0
     rank_info = get_rank(xp)
-    
-    featured_badge = None
-    if user.featured_badge_id:
-        badge = await db.get(models.Badge, user.featured_badge_id)
-        if badge:
-            featured_badge = {
-                "id": badge.id,
-                "name": badge.name,
-                "description": badge.description,
-                "icon": badge.icon,
-                "color": badge.color
-            }
+    featured_badge = await featured_badge_of(db, user)
     
     return {
         "user_id": user.id,
@@ -2215,83 +2353,9 @@ async def get_playlists():
 # --- ACTIVITY ---
 
 @app.get("/api/activity")
-async def get_activity(limit: int = 20, db: AsyncSession = Depends(get_db)):
-    """Pobiera ostatnią aktywność użytkowników"""
-    activities = []
-    
-    try:
-        # Ostatnie głosy
-        votes_result = await db.execute(
-            select(models.Vote, models.User)
-            .join(models.User, models.Vote.user_id == models.User.id)
-            .where(models.User.hide_activity_history == False)
-            .order_by(desc(models.Vote.created_at))
-            .limit(limit // 2)
-        )
-        
-        for vote, user in votes_result.all():
-            featured_badge = None
-            if user.featured_badge_id:
-                badge = await db.get(models.Badge, user.featured_badge_id)
-                if badge:
-                    featured_badge = {
-                        "id": badge.id,
-                        "name": badge.name,
-                        "description": badge.description,
-                        "icon": badge.icon,
-                        "color": badge.color
-                    }
-            activities.append({
-                "type": "vote",
-                "text": f"{user.username} {'polubił utwór' if vote.vote_type == 'LIKE' else 'nie polubił utworu'} ",
-                "timestamp": vote.created_at.isoformat() if vote.created_at else None,
-                "icon": "heart",
-                "user_id": user.id,
-                "username": user.username,
-                "avatar_url": user.avatar_url,
-                "vote_type": vote.vote_type,
-                "featured_badge": featured_badge
-            })
-        
-        # Ostatnie propozycje
-        suggestions_result = await db.execute(
-            select(models.Suggestion, models.User)
-            .join(models.User, models.Suggestion.user_id == models.User.id)
-            .where(models.User.hide_activity_history == False)
-            .order_by(desc(models.Suggestion.created_at))
-            .limit(limit // 2)
-        )
-        
-        for suggestion, user in suggestions_result.all():
-            featured_badge = None
-            if user.featured_badge_id:
-                badge = await db.get(models.Badge, user.featured_badge_id)
-                if badge:
-                    featured_badge = {
-                        "id": badge.id,
-                        "name": badge.name,
-                        "description": badge.description,
-                        "icon": badge.icon,
-                        "color": badge.color
-                    }
-            activities.append({
-                "type": "suggestion",
-                "text": f"{user.username} zaproponował utwór",
-                "timestamp": suggestion.created_at.isoformat() if suggestion.created_at else None,
-                "icon": "music",
-                "user_id": user.id,
-                "username": user.username,
-                "avatar_url": user.avatar_url,
-                "featured_badge": featured_badge
-            })
-        
-        # Sortuj po czasie i zwróć najnowsze
-        activities.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        return activities[:limit]
-        
-    except Exception as e:
-        logger.error(f"Error fetching activity: {e}", exc_info=True)
-        return []
+async def get_activity(limit: int = 20):
+    """Ostatnia aktywność użytkowników z bufora w pamięci (nowe wpisy przychodzą zdarzeniem SSE "activity")"""
+    return activity_stream.latest(max(1, min(limit, 100)))
 
 # --- ADMIN ---
 
@@ -2322,39 +2386,135 @@ async def promote_user(promote: PromoteUserRequest, request: Request, db: AsyncS
     await db.commit()
     return {"status": "success", "username": user.username, "is_admin": True}
 
+ADMIN_USERS_SORTS = ("created_at", "xp", "votes")
+ADMIN_USERS_EPOCH = literal(datetime(1970, 1, 1, tzinfo=timezone.utc))
+ADMIN_USERS_SEARCH = literal_column("(coalesce(users.username, '') || ' ' || coalesce(users.display_name, '') || ' ' || coalesce(users.email, ''))")
+
 @app.get("/api/admin/users")
-async def get_all_users(request: Request, db: AsyncSession = Depends(get_db)):
+async def get_all_users(request: Request, limit: int = 50, cursor: Optional[str] = None, sort: str = "created_at", q: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """Lista użytkowników dla admina: jedno zapytanie z agregatami, keyset (X-Next-Cursor), wyszukiwanie i sortowanie"""
     current_user = await auth.get_current_user(request, db)
     if not current_user or not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin only")
     
+    if sort not in ADMIN_USERS_SORTS:
+        raise HTTPException(status_code=400, detail="Invalid sort")
+    limit = max(1, min(limit, 200))
+    
+    suggestion_counts = (
+        select(models.Suggestion.user_id, func.count().label("suggestions_count"))
+        .group_by(models.Suggestion.user_id)
+        .subquery()
+    )
+    vote_counts = (
+        select(models.Vote.user_id, func.count().label("votes_count"))
+        .group_by(models.Vote.user_id)
+        .subquery()
+    )
+    suggestions_count = func.coalesce(suggestion_counts.c.suggestions_count, 0)
+    votes_count = func.coalesce(vote_counts.c.votes_count, 0)
+    sort_keys = {
+        "created_at": func.coalesce(models.User.created_at, ADMIN_USERS_EPOCH),
+        "xp": func.coalesce(models.User.xp, 0),
+        "votes": votes_count,
+    }
+    sort_key = sort_keys[sort]
+    
+    filters = []
+    if q and q.strip():
+        pattern = "%" + q.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        # To samo wyrażenie co indeks trigramowy ix_users_search_trgm
+        filters.append(ADMIN_USERS_SEARCH.ilike(pattern))
+    
+    total = await db.scalar(select(func.count(models.User.id)).where(*filters))
+    
+    if cursor:
+        parts = decode_cursor(cursor)
+        if not parts or len(parts) != 2 or not isinstance(parts[1], int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        value = parse_datetime(parts[0]) if sort == "created_at" else parts[0]
+        if value is None or (sort != "created_at" and not isinstance(value, int)):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        filters.append(or_(sort_key < value, and_(sort_key == value, models.User.id < parts[1])))
+    
     result = await db.execute(
-        select(models.User).order_by(desc(models.User.created_at))
+        select(models.User, suggestions_count.label("suggestions_count"), votes_count.label("votes_count"), sort_key.label("sort_value"))
+        .outerjoin(suggestion_counts, suggestion_counts.c.user_id == models.User.id)
+        .outerjoin(vote_counts, vote_counts.c.user_id == models.User.id)
+        .where(*filters)
+        .order_by(desc(sort_key), desc(models.User.id))
+        .limit(limit)
     )
-    users = result.scalars().all()
+    rows = result.all()
     
     users_list = []
-    for user in users:
-        suggestions_count = await db.scalar(
-            select(func.count(models.Suggestion.id)).where(models.Suggestion.user_id == user.id)
-        )
-        votes_count = await db.scalar(
-            select(func.count(models.Vote.id)).where(models.Vote.user_id == user.id)
-        )
-        
+    for user, user_suggestions, user_votes, sort_value in rows:
         users_list.append({
             "id": user.id,
             "discord_id": user.discord_id,
             "username": user.username,
+            "display_name": user.display_name,
+            "email": user.email,
             "avatar_url": user.avatar_url,
             "is_admin": user.is_admin,
             "reputation_score": user.reputation_score,
+            "xp": user.xp or 0,
             "created_at": user.created_at.isoformat() if user.created_at else None,
-            "suggestions_count": suggestions_count or 0,
-            "votes_count": votes_count or 0
+            "suggestions_count": user_suggestions,
+            "votes_count": user_votes,
+            "cursor": encode_cursor(sort_value, user.id)
         })
     
-    return users_list
+    headers = {"X-Total-Count": str(total or 0)}
+    if len(users_list) == limit:
+        headers["X-Next-Cursor"] = users_list[-1]["cursor"]
+    return JSONResponse(content=users_list, headers=headers)
+
+@app.get("/api/admin/preview-pool")
+async def get_preview_pool_metrics(request: Request, db: AsyncSession = Depends(get_db)):
+    """Metryki puli podglądów yt-dlp (zajęte wątki, kolejka, timeouty, średnie czasy) i cache podglądów"""
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return {**preview_pool.metrics(), "cache": preview_cache.metrics()}
+
+@app.get("/api/admin/ingestion")
+async def get_ingestion_metrics(request: Request, hours: int = 24, db: AsyncSession = Depends(get_db)):
+    """Propozycje w kolejnych etapach przetwarzania i czasy analizy audio (średnia, p95, maksimum)"""
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await ingestion_stats(db, max(1, min(hours, 24 * 30)))
+
+@app.post("/api/admin/fingerprints/check")
+async def check_audio_fingerprint(request: Request, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    """Czy przesłany plik (np. z paczki Google Drive) jest już w mediach stacji - odcisk audio, nie tytuł"""
+    import os
+    import shutil
+    import uuid
+    
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    directory = os.path.join(config.settings.audio_temp_dir, "fingerprints")
+    os.makedirs(directory, exist_ok=True)
+    local_path = os.path.join(directory, f"{uuid.uuid4().hex}{os.path.splitext(file.filename or '')[1]}")
+    try:
+        with open(local_path, "wb") as target:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, target, 1024 * 1024)
+        try:
+            words, seconds = await asyncio.to_thread(fingerprint_file, local_path)
+        except RuntimeError:
+            raise HTTPException(status_code=400, detail="Nie udało się zdekodować pliku audio")
+        match = await fingerprint_index.match(db, words)
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+    
+    return {"filename": file.filename, "seconds": seconds, "duplicate": match is not None, "match": match}
 
 @app.get("/api/admin/votes")
 async def get_all_votes(request: Request, db: AsyncSession = Depends(get_db), limit: int = 100):
@@ -2363,25 +2523,28 @@ async def get_all_votes(request: Request, db: AsyncSession = Depends(get_db), li
         raise HTTPException(status_code=403, detail="Admin only")
     
     result = await db.execute(
-        select(models.Vote, models.User)
-        .join(models.User, models.Vote.user_id == models.User.id)
+        select(models.Vote)
         .order_by(desc(models.Vote.created_at))
         .limit(limit)
     )
+    votes = result.scalars().all()
+    cards = await resolve_user_cards(db, [vote.user_id for vote in votes])
+    songs_info = await azuracast_client.get_songs_info_batch([vote.song_id for vote in votes]) if votes else {}
     
     votes_list = []
-    for vote, user in result.all():
-        song_info = await azuracast_client.get_song_info(vote.song_id)
+    for vote in votes:
+        card = cards.get(vote.user_id)
+        if not card:
+            continue
+        song_info = songs_info.get(str(vote.song_id))
         votes_list.append({
             "id": vote.id,
-            "user_id": vote.user_id,
-            "username": user.username,
-            "avatar_url": user.avatar_url,
             "song_id": vote.song_id,
             "song_title": song_info.get("title", f"Song {vote.song_id}") if song_info else f"Song {vote.song_id}",
             "song_artist": song_info.get("artist", "Unknown") if song_info else "Unknown",
             "vote_type": vote.vote_type,
-            "created_at": vote.created_at.isoformat() if vote.created_at else None
+            "created_at": vote.created_at.isoformat() if vote.created_at else None,
+            **card
         })
     
     return votes_list
@@ -2392,52 +2555,7 @@ async def get_full_radio_info(request: Request, db: AsyncSession = Depends(get_d
     if not current_user or not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin only")
     
-    station_info = await azuracast_client.get_station_info()
-    now_playing = await azuracast_client.get_now_playing()
-    
-    total_users = await db.scalar(select(func.count(models.User.id)))
-    total_votes = await db.scalar(select(func.count(models.Vote.id)))
-    total_suggestions = await db.scalar(select(func.count(models.Suggestion.id)))
-    total_likes = await db.scalar(
-        select(func.count(models.Vote.id)).where(models.Vote.vote_type == "LIKE")
-    )
-    total_dislikes = await db.scalar(
-        select(func.count(models.Vote.id)).where(models.Vote.vote_type == "DISLIKE")
-    )
-    
-    active_listeners = event_broadcaster.get_active_listeners()
-    total_active_listeners = len(active_listeners)
-    playing_listeners = [l for l in active_listeners if l.get("is_playing", False)]
-    total_playing_listeners = len(playing_listeners)
-    
-    authenticated_active = [l for l in active_listeners if not l.get("is_guest") and l.get("user_id")]
-    authenticated_playing = [l for l in playing_listeners if not l.get("is_guest") and l.get("user_id")]
-    guests_active = [l for l in active_listeners if l.get("is_guest")]
-    guests_playing = [l for l in playing_listeners if l.get("is_guest")]
-    
-    return {
-        "station": station_info or {},
-        "now_playing": now_playing or {},
-        "statistics": {
-            "total_users": total_users or 0,
-            "total_votes": total_votes or 0,
-            "total_suggestions": total_suggestions or 0,
-            "total_likes": total_likes or 0,
-            "total_dislikes": total_dislikes or 0,
-            "active_listeners": {
-                "total": total_active_listeners,
-                "playing": total_playing_listeners,
-                "users": {
-                    "active": len(authenticated_active),
-                    "playing": len(authenticated_playing)
-                },
-                "guests": {
-                    "active": len(guests_active),
-                    "playing": len(guests_playing)
-                }
-            }
-        }
-    }
+    return await admin_stats.get(db)
 
 # --- BADGES ---
 
@@ -2495,7 +2613,7 @@ async def _check_and_award_badges_internal(user_id: int, badge_type: str, db: As
             suggestions_count = await db.scalar(
                 select(func.count(models.Suggestion.id)).where(
                     models.Suggestion.user_id == user_id,
-                    models.Suggestion.status == "APPROVED"
+                    models.Suggestion.status.in_(ACCEPTED_STATUSES)
                 )
             )
             if suggestions_count and suggestions_count >= 1:
@@ -2589,6 +2707,7 @@ async def _check_and_award_badges_internal(user_id: int, badge_type: str, db: As
                 db.add(xp_award)
             
             await db.commit()
+            await leaderboard.record_xp(user, badge.xp_reward or 0)
 
 @app.get("/api/badges")
 async def get_all_badges(db: AsyncSession = Depends(get_db)):
@@ -2698,6 +2817,7 @@ async def update_user_settings(request: Request, settings_req: UserSettingsReque
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
+    visibility_changed = settings_req.hide_activity is not None and settings_req.hide_activity != user.hide_activity
     if settings_req.hide_activity is not None:
         user.hide_activity = settings_req.hide_activity
     
@@ -2705,6 +2825,10 @@ async def update_user_settings(request: Request, settings_req: UserSettingsReque
         user.hide_activity_history = settings_req.hide_activity_history
     
     await db.commit()
+    if visibility_changed:
+        await leaderboard.sync_user(db, user)
+    if user.hide_activity_history:
+        await activity_stream.forget_user(user.id)
     return {
         "status": "success",
         "hide_activity": user.hide_activity,
@@ -2764,10 +2888,9 @@ async def update_avatar(request: Request, avatar_req: UpdateAvatarRequest, db: A
         user.avatar_url = user.google_avatar_url
     else:
         default_color = "#5865F2"
-        if user.featured_badge_id:
-            badge = await db.get(models.Badge, user.featured_badge_id)
-            if badge and badge.color:
-                default_color = badge.color
+        featured_badge = await featured_badge_of(db, user)
+        if featured_badge and featured_badge.get("color"):
+            default_color = featured_badge["color"]
         user.avatar_url = f"{config.settings.app_base_url}/api/users/me/avatar/default?color={default_color.replace('#', '')}"
     
     await db.commit()
@@ -2780,10 +2903,9 @@ async def get_default_avatar(request: Request, color: str = "5865F2", db: AsyncS
     from fastapi.responses import Response
     
     user = await auth.get_current_user(request, db)
-    if user and user.featured_badge_id:
-        badge = await db.get(models.Badge, user.featured_badge_id)
-        if badge and badge.color:
-            color = badge.color.replace('#', '')
+    featured_badge = await featured_badge_of(db, user) if user else None
+    if featured_badge and featured_badge.get("color"):
+        color = featured_badge["color"].replace('#', '')
     
     svg_content = f'''<?xml version="1.0" encoding="UTF-8"?>
 <svg version="1.1" xmlns="http://www.w3.org/2000/svg" width="320" height="320" viewBox="0 0 320 320">
@@ -2982,6 +3104,10 @@ async def delete_account(request: Request, db: AsyncSession = Depends(get_db)):
         select(models.Vote).where(models.Vote.user_id == user_id)
     )).scalars().all()
     for vote in votes:
+        await charts.apply_vote_delta(
+            db, vote.song_id, charts.vote_day(vote.created_at),
+            **charts.vote_type_delta(vote.vote_type, -1)
+        )
         await db.delete(vote)
     
     xp_awards = (await db.execute(
@@ -3004,6 +3130,9 @@ async def delete_account(request: Request, db: AsyncSession = Depends(get_db)):
     
     await db.delete(current_user)
     await db.commit()
+    charts.chart_cache.bump()
+    await leaderboard.remove_user(user_id)
+    await activity_stream.forget_user(user_id)
     
     request.session.clear()
     
@@ -3064,6 +3193,7 @@ async def create_badge(create_req: CreateBadgeRequest, request: Request, db: Asy
     db.add(badge)
     await db.commit()
     await db.refresh(badge)
+    badge_cache.invalidate()
     
     return {
         "id": badge.id,
@@ -3075,6 +3205,38 @@ async def create_badge(create_req: CreateBadgeRequest, request: Request, db: Asy
         "created_at": badge.created_at.isoformat() if badge.created_at else None
     }
 
+class RankTierItem(BaseModel):
+    name: str
+    min_xp: int
+
+class RankTiersRequest(BaseModel):
+    tiers: List[RankTierItem]
+
+@app.get("/api/ranks")
+async def get_rank_tiers():
+    return get_rank_table().as_list()
+
+@app.put("/api/admin/rank-tiers")
+async def update_rank_tiers(tiers_req: RankTiersRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    current_user = await auth.get_current_user(request, db)
+    if not current_user or not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    tiers = sorted(tiers_req.tiers, key=lambda tier: tier.min_xp)
+    if not tiers or tiers[0].min_xp != 0:
+        raise HTTPException(status_code=400, detail="Lowest rank must start at 0 XP")
+    if len({tier.min_xp for tier in tiers}) != len(tiers):
+        raise HTTPException(status_code=400, detail="Rank thresholds must be unique")
+    if any(not tier.name.strip() for tier in tiers):
+        raise HTTPException(status_code=400, detail="Rank name cannot be empty")
+    
+    await db.execute(delete(models.RankTier))
+    db.add_all([models.RankTier(name=tier.name.strip(), min_xp=tier.min_xp) for tier in tiers])
+    await db.commit()
+    
+    set_rank_table([{"name": tier.name.strip(), "min_xp": tier.min_xp} for tier in tiers])
+    return get_rank_table().as_list()
+
 class AwardBadgeRequest(BaseModel):
     user_id: int
     badge_id: int
@@ -3120,6 +3282,7 @@ async def award_badge(award_req: AwardBadgeRequest, request: Request, db: AsyncS
         db.add(xp_award)
     
     await db.commit()
+    await leaderboard.record_xp(user, badge.xp_reward or 0)
     
     return {"status": "success", "user_id": award_req.user_id, "badge_id": award_req.badge_id}
 
@@ -3260,6 +3423,15 @@ async def get_issues(request: Request, db: AsyncSession = Depends(get_db)):
         for issue, user_obj in issues
     ]
 
+@app.post("/api/admin/issues/bulk")
+async def bulk_moderate_issues(bulk: BulkModerationRequest, request: Request, db: AsyncSession = Depends(get_db)):
+    """Zatwierdzenie/odrzucenie wielu zgłoszeń; XP i odznaki przyznawane zbiorczo"""
+    user = await auth.get_current_user(request, db)
+    if not user or not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await moderate_issues(db, bulk.ids, _bulk_moderation_status(bulk))
+
 @app.post("/api/admin/issues/{issue_id}/approve")
 async def approve_issue(issue_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     user = await auth.get_current_user(request, db)
@@ -3280,7 +3452,7 @@ async def approve_issue(issue_id: int, request: Request, db: AsyncSession = Depe
         badge_type = "BUG_REPORTS" if issue.issue_type == "BUG" else "FEATURE_REQUESTS"
         await _check_and_award_badges_internal(issue.user_id, badge_type, db)
         
-        xp_reward = 50 if issue.issue_type == "BUG" else 75
+        xp_reward = issue_xp_reward(issue.issue_type)
         user_obj = await db.get(models.User, issue.user_id)
         if user_obj:
             user_obj.xp = (user_obj.xp or 0) + xp_reward
@@ -3292,6 +3464,7 @@ async def approve_issue(issue_id: int, request: Request, db: AsyncSession = Depe
             )
             db.add(xp_award)
             await db.commit()
+            await leaderboard.record_xp(user_obj, xp_reward)
     
     return {"status": "success"}
 
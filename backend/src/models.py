@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Float, ForeignKey, Text, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -43,11 +43,42 @@ class Suggestion(Base):
     duration_seconds = Column(Integer, nullable=True)
     
     # Status: PENDING, APPROVED, REJECTED, PROCESSED (Wgrane do Azury)
+    # oraz etapy przetwarzania przez Workera: QUEUED, DOWNLOADING, ANALYZING, TRANSCODING, UPLOADING, FAILED, DUPLICATE
     status = Column(String, default="PENDING") 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Znacznik zmian dla trybu delty kolejki (services/suggestion_queue.py)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    # Przetwarzanie przez Workera (services/ingestion.py)
+    ingest_attempts = Column(Integer, nullable=False, server_default="0", default=0)
+    ingest_progress = Column(Integer, nullable=True)  # 0-100
+    ingest_error = Column(Text, nullable=True)
+    azuracast_path = Column(String, nullable=True)  # Ścieżka wgranego pliku w mediach stacji
+    
+    # Analiza audio przed transkodowaniem (services/audio_analysis.py)
+    loudness_lufs = Column(Float, nullable=True)  # Integrated loudness (EBU R128)
+    true_peak_dbtp = Column(Float, nullable=True)
+    leading_silence = Column(Float, nullable=True)  # Sekundy ciszy na początku
+    trailing_silence = Column(Float, nullable=True)  # Sekundy ciszy na końcu
+    gain_db = Column(Float, nullable=True)  # Zastosowana korekta głośności (INGEST_NORMALIZE)
+    analysis_ms = Column(Integer, nullable=True)  # Czas analizy pliku
+
+class AudioFingerprint(Base):
+    __tablename__ = "audio_fingerprints"
+
+    # Odciski plików z mediów stacji (services/fingerprint.py) - wykrywanie duplikatów przed wysyłką
+    id = Column(Integer, primary_key=True, index=True)
+    azuracast_path = Column(String, nullable=False, unique=True)
+    suggestion_id = Column(Integer, ForeignKey("suggestions.id"), nullable=True)  # NULL dla plików spoza propozycji
+    title = Column(String, nullable=True)
+    artist = Column(String, nullable=True)
+    seconds = Column(Float, nullable=False)  # Długość zdekodowanego fragmentu
+    fingerprint = Column(LargeBinary, nullable=False)  # uint32 little-endian, jedno słowo na ramkę
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Vote(Base):
     __tablename__ = "votes"
+    # Tabela partycjonowana miesięcznie po created_at (services/partitions.py), PK w bazie: (id, created_at)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -56,6 +87,47 @@ class Vote(Base):
     xp_awarded = Column(Boolean, default=False)  # Czy XP zostało już przyznane za ten głos
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class SongVoteDaily(Base):
+    __tablename__ = "song_vote_daily"
+
+    # Dzienny rollup głosów - utrzymywany przyrostowo przy każdym zapisie głosu
+    song_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)  # Dzień (UTC) z votes.created_at
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+
+class ChartSnapshot(Base):
+    __tablename__ = "chart_snapshots"
+    __table_args__ = (
+        UniqueConstraint("period", "mode", "period_start", name="uq_chart_snapshots_period_mode_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period = Column(String, nullable=False)  # week, month
+    mode = Column(String, nullable=False, default="likes")  # Tryb rankingu (likes, net, wilson, controversy)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)  # Włącznie
+    # Zamrożone listy: [[song_id, likes, dislikes, score, previous_position], ...]
+    top = Column(JSON, nullable=False)
+    worst = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TrendingScore(Base):
+    __tablename__ = "trending_scores"
+
+    # Checkpoint silnika trendów - wynik wygaszony do chwili updated_at
+    song_id = Column(String, primary_key=True)
+    score = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+
+class RankTier(Base):
+    __tablename__ = "rank_tiers"
+
+    # Progi rang XP edytowalne z panelu admina (domyślnie services/xp_system.RANKS)
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    min_xp = Column(Integer, nullable=False, unique=True)
+
 class ListeningSession(Base):
     __tablename__ = "listening_sessions"
 
@@ -68,6 +140,7 @@ class ListeningSession(Base):
 
 class XpAward(Base):
     __tablename__ = "xp_awards"
+    # Tabela partycjonowana miesięcznie po created_at (services/partitions.py), PK w bazie: (id, created_at)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -75,6 +148,8 @@ class XpAward(Base):
     xp_amount = Column(Integer, nullable=False)
     award_type = Column(String)  # VOTE, LISTENING
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Początek sesji zwiniętej przez kompakcję (created_at = koniec sesji); NULL = wiersz niezwinięty
+    started_at = Column(DateTime(timezone=True), nullable=True)
 
 class Badge(Base):
     __tablename__ = "badges"
@@ -0,0 +1,114 @@
+from collections import deque
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Deque, List, Optional
+import logging
+
+from sqlalchemy import select, desc
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .event_broadcaster import event_broadcaster
+from .user_cards import badge_cache, user_card
+
+logger = logging.getLogger(__name__)
+
+# Ile ostatnich zdarzeń trzymamy w pamięci (feed pokazuje ich kilkanaście)
+ACTIVITY_BUFFER_SIZE = 200
+
+def _vote_record(vote_id: int, vote_type: str, user: models.User, timestamp: datetime) -> dict:
+    return {
+        "id": f"vote_{vote_id}",
+        "type": "vote",
+        "text": f"{user.username} {'polubił utwór' if vote_type == 'LIKE' else 'nie polubił utworu'} ",
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "icon": "heart",
+        "vote_type": vote_type,
+        **user_card(user)
+    }
+
+def _suggestion_record(suggestion_id: int, user: models.User, timestamp: datetime) -> dict:
+    return {
+        "id": f"suggestion_{suggestion_id}",
+        "type": "suggestion",
+        "text": f"{user.username} zaproponował utwór",
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "icon": "music",
+        **user_card(user)
+    }
+
+class ActivityStream:
+    """Bufor cykliczny ostatniej aktywności (głosy, propozycje), najnowsze na początku.
+
+    Zapisy dopisują rekord i rozsyłają go zdarzeniem SSE "activity", więc /api/activity
+    nie odpytuje bazy. Użytkownicy z hide_activity_history nie trafiają do bufora.
+    """
+
+    def __init__(self, size: int = ACTIVITY_BUFFER_SIZE):
+        self._items: Deque[dict] = deque(maxlen=size)
+
+    async def load(self, db: AsyncSession):
+        """Wypełnia bufor z bazy przy starcie aplikacji"""
+        await badge_cache.ensure(db)
+        size = self._items.maxlen
+        votes = await db.execute(
+            select(models.Vote, models.User)
+            .join(models.User, models.Vote.user_id == models.User.id)
+            .where(models.User.hide_activity_history == False)
+            .order_by(desc(models.Vote.created_at))
+            .limit(size)
+        )
+        suggestions = await db.execute(
+            select(models.Suggestion, models.User)
+            .join(models.User, models.Suggestion.user_id == models.User.id)
+            .where(models.User.hide_activity_history == False)
+            .order_by(desc(models.Suggestion.created_at))
+            .limit(size)
+        )
+        records = [_vote_record(vote.id, vote.vote_type, user, vote.created_at) for vote, user in votes.all()]
+        records += [_suggestion_record(suggestion.id, user, suggestion.created_at) for suggestion, user in suggestions.all()]
+        records.sort(key=lambda record: record["timestamp"] or "", reverse=True)
+
+        self._items.clear()
+        self._items.extend(records[:size])
+        logger.info(f"Activity buffer loaded: {len(self._items)} items")
+
+    def latest(self, limit: int = 20) -> List[dict]:
+        return list(islice(self._items, max(0, limit)))
+
+    async def _push(self, record: dict):
+        self._discard(record["id"])
+        self._items.appendleft(record)
+        await event_broadcaster.broadcast("activity", record)
+
+    def _discard(self, record_id: str) -> bool:
+        for record in self._items:
+            if record["id"] == record_id:
+                self._items.remove(record)
+                return True
+        return False
+
+    async def record_vote(self, db: AsyncSession, user: models.User, vote_id: int, vote_type: str):
+        if user.hide_activity_history:
+            return
+        await badge_cache.ensure(db)
+        await self._push(_vote_record(vote_id, vote_type, user, datetime.now(timezone.utc)))
+
+    async def record_suggestion(self, db: AsyncSession, user: models.User, suggestion_id: int, created_at: Optional[datetime] = None):
+        if user.hide_activity_history:
+            return
+        await badge_cache.ensure(db)
+        await self._push(_suggestion_record(suggestion_id, user, created_at or datetime.now(timezone.utc)))
+
+    async def remove(self, record_id: str):
+        """Usuwa rekord (np. cofnięty głos) i informuje klientów"""
+        if self._discard(record_id):
+            await event_broadcaster.broadcast("activity_removed", {"id": record_id})
+
+    async def forget_user(self, user_id: int):
+        """Usuwa wszystkie rekordy użytkownika (ukrycie historii, usunięcie konta)"""
+        removed = [record["id"] for record in self._items if record["user_id"] == user_id]
+        for record_id in removed:
+            await self.remove(record_id)
+
+activity_stream = ActivityStream()
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import config
+from .azuracast import azuracast_client
+from .event_broadcaster import event_broadcaster
+
+logger = logging.getLogger(__name__)
+
+# Wszystkie liczniki panelu w jednym zapytaniu (jeden przebieg po votes z FILTER)
+_COUNTS_SQL = text("""
+    SELECT
+        (SELECT COUNT(*) FROM users) AS total_users,
+        (SELECT COUNT(*) FROM suggestions) AS total_suggestions,
+        COUNT(*) AS total_votes,
+        COUNT(*) FILTER (WHERE vote_type = 'LIKE') AS total_likes,
+        COUNT(*) FILTER (WHERE vote_type = 'DISLIKE') AS total_dislikes
+    FROM votes
+""")
+
+def listener_counts() -> Dict[str, Any]:
+    """Liczniki aktywnych słuchaczy w jednym przebiegu po liście"""
+    counts = {"total": 0, "playing": 0, "users": {"active": 0, "playing": 0}, "guests": {"active": 0, "playing": 0}}
+    for listener in event_broadcaster.get_active_listeners():
+        playing = listener.get("is_playing", False)
+        if listener.get("is_guest"):
+            group = counts["guests"]
+        elif listener.get("user_id"):
+            group = counts["users"]
+        else:
+            group = None
+
+        counts["total"] += 1
+        counts["playing"] += 1 if playing else 0
+        if group is not None:
+            group["active"] += 1
+            group["playing"] += 1 if playing else 0
+    return counts
+
+class AdminStats:
+    """Dane zakładki "Radio" panelu admina, cache'owane na kilka sekund"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._payload: Optional[Dict[str, Any]] = None
+        self._computed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _compute(self, db: AsyncSession) -> Dict[str, Any]:
+        # Oba wywołania korzystają ze wspólnego snapshotu /api/nowplaying - jedno zapytanie do AzuraCast
+        station_info, now_playing, counts = await asyncio.gather(
+            azuracast_client.get_station_info(),
+            azuracast_client.get_now_playing(),
+            db.execute(_COUNTS_SQL),
+        )
+        row = counts.mappings().one()
+
+        return {
+            "station": station_info or {},
+            "now_playing": now_playing or {},
+            "statistics": {
+                "total_users": row["total_users"] or 0,
+                "total_votes": row["total_votes"] or 0,
+                "total_suggestions": row["total_suggestions"] or 0,
+                "total_likes": row["total_likes"] or 0,
+                "total_dislikes": row["total_dislikes"] or 0,
+                "active_listeners": listener_counts(),
+            }
+        }
+
+    async def get(self, db: AsyncSession) -> Dict[str, Any]:
+        if self._payload is not None and time.monotonic() - self._computed_at < self.ttl:
+            return self._payload
+        async with self._lock:
+            if self._payload is None or time.monotonic() - self._computed_at >= self.ttl:
+                self._payload = await self._compute(db)
+                self._computed_at = time.monotonic()
+        return self._payload
+
+admin_stats = AdminStats(ttl=config.settings.admin_stats_cache_ttl)
@@ -0,0 +1,140 @@
+import logging
+import math
+import re
+import subprocess
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_TIMEOUT = 600
+
+# Cisza na brzegach bliżej niż tyle sekund od początku/końca liczy się jako "od brzegu"
+EDGE_TOLERANCE = 0.05
+# Zostawiany margines ciszy przy przycinaniu (łagodne wejście/wyjście zamiast cięcia na styk)
+TRIM_MARGIN = 0.2
+# Mniejsze korekty głośności są pomijane
+MIN_GAIN_DB = 0.1
+
+_INTEGRATED = re.compile(r"Integrated loudness:\s*I:\s*(-?(?:[\d.]+|inf))\s*LUFS")
+_RANGE = re.compile(r"Loudness range:\s*LRA:\s*(-?(?:[\d.]+|inf))\s*LU")
+_TRUE_PEAK = re.compile(r"True peak:\s*Peak:\s*(-?(?:[\d.]+|inf))\s*dBFS")
+_SILENCE = re.compile(r"silence_(start|end):\s*(-?[\d.]+)")
+_TIME = re.compile(r"time=(\d+):(\d+):(\d+(?:\.\d+)?)")
+_DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def _number(match: Optional[re.Match]) -> Optional[float]:
+    if not match:
+        return None
+    value = float(match.group(1))
+    return round(value, 2) if math.isfinite(value) else None
+
+def _seconds(match: re.Match) -> float:
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _duration(log: str) -> Optional[float]:
+    # Ostatni wskaźnik postępu to faktycznie zdekodowana długość; nagłówek bywa szacunkiem
+    times = list(_TIME.finditer(log))
+    if times:
+        return _seconds(times[-1])
+    header = _DURATION.search(log)
+    return _seconds(header) if header else None
+
+def _silences(log: str) -> List[Tuple[float, Optional[float]]]:
+    """Przedziały ciszy [(start, end)] z silencedetect; end None - cisza trwa do końca pliku"""
+    intervals: List[Tuple[float, Optional[float]]] = []
+    for kind, value in _SILENCE.findall(log):
+        if kind == "start":
+            intervals.append((max(float(value), 0.0), None))
+        elif intervals and intervals[-1][1] is None:
+            intervals[-1] = (intervals[-1][0], float(value))
+    return intervals
+
+def _edge_silence(intervals: List[Tuple[float, Optional[float]]], duration: Optional[float]) -> Tuple[float, float]:
+    leading = trailing = 0.0
+    if not intervals or not duration:
+        return leading, trailing
+
+    start, end = intervals[0]
+    if start <= EDGE_TOLERANCE:
+        leading = (end if end is not None else duration) - start
+    start, end = intervals[-1]
+    if end is None or end >= duration - EDGE_TOLERANCE:
+        trailing = duration - start
+    # Cały plik cichy - jeden przedział liczony tylko raz
+    if leading >= duration - EDGE_TOLERANCE:
+        trailing = 0.0
+    return round(leading, 2), round(trailing, 2)
+
+def analyze_file(path: str, noise_db: float = -50.0, min_silence: float = 0.5) -> Dict[str, Any]:
+    """Głośność (EBU R128: integrated, LRA, true peak) i cisza na początku/końcu - jedno przejście ffmpeg.
+
+    Blokujące: ffmpeg działa jako osobny proces (jeden wątek dekodowania), więc analizy kilku plików
+    uruchomione równolegle rozkładają się na rdzenie. Zwraca też czas analizy (elapsed_ms).
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-threads", "1",
+        "-i", path, "-vn",
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence},ebur128=peak=true:framelog=verbose",
+        "-f", "null", "-",
+    ]
+    started = time.perf_counter()
+    try:
+        process = subprocess.run(command, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors="replace").strip()[-500:] if e.stderr else ""
+        raise RuntimeError(f"ffmpeg analysis exited with {e.returncode}: {stderr}") from e
+    elapsed = time.perf_counter() - started
+
+    log = process.stderr.decode(errors="replace")
+    summary = log[log.rfind("Summary:"):] if "Summary:" in log else ""
+    duration = _duration(log)
+    leading, trailing = _edge_silence(_silences(log), duration)
+
+    return {
+        "integrated_lufs": _number(_INTEGRATED.search(summary)),
+        "loudness_range": _number(_RANGE.search(summary)),
+        "true_peak_dbtp": _number(_TRUE_PEAK.search(summary)),
+        "duration": round(duration, 2) if duration else None,
+        "leading_silence": leading,
+        "trailing_silence": trailing,
+        "elapsed_ms": round(elapsed * 1000),
+        # Ile sekund audio na sekundę analizy
+        "realtime_factor": round(duration / elapsed, 1) if duration and elapsed > 0 else None,
+    }
+
+def processing_filters(
+    analysis: Dict[str, Any],
+    normalize: bool,
+    target_lufs: float,
+    max_true_peak: float,
+    trim: bool,
+) -> Tuple[List[str], Optional[float]]:
+    """Filtry ffmpeg dla transkodowania na podstawie analizy. Zwraca (filtry, zastosowane wzmocnienie dB).
+
+    Normalizacja to stałe wzmocnienie do target_lufs (bez kompresji dynamiki), ograniczone tak,
+    żeby true peak nie przekroczył max_true_peak.
+    """
+    filters: List[str] = []
+    gain = None
+
+    duration = analysis.get("duration")
+    if trim and duration:
+        start = max(analysis["leading_silence"] - TRIM_MARGIN, 0.0)
+        end = duration - max(analysis["trailing_silence"] - TRIM_MARGIN, 0.0)
+        if (start > 0 or end < duration) and end - start > 1.0:
+            filters += [f"atrim=start={start:.2f}:end={end:.2f}", "asetpts=PTS-STARTPTS"]
+
+    lufs = analysis.get("integrated_lufs")
+    if normalize and lufs is not None:
+        gain = target_lufs - lufs
+        if analysis.get("true_peak_dbtp") is not None:
+            gain = min(gain, max_true_peak - analysis["true_peak_dbtp"])
+        gain = round(gain, 2)
+        if abs(gain) >= MIN_GAIN_DB:
+            filters.append(f"volume={gain}dB")
+        else:
+            gain = None
+
+    return filters, gain
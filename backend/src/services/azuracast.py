@@ -1,6 +1,10 @@
+import asyncio
 import httpx
 import logging
-from typing import Optional, Dict, Any, List
+import math
+import os
+import time
+from typing import Awaitable, Callable, Optional, Dict, Any, List
 from .. import config
 
 logger = logging.getLogger(__name__)
@@ -17,6 +21,19 @@ class AzuraCastClient:
         self._schedules_cache = None
         self._schedules_cache_timestamp = None
         self._schedules_cache_ttl = 3600  # 1 godzina
+        # Wspólny snapshot /api/nowplaying dla now-playing, station-info, historii i kolejki
+        self._nowplaying_cache = None
+        self._nowplaying_timestamp = 0.0
+        self._nowplaying_ttl = config.settings.nowplaying_cache_ttl
+        self._nowplaying_lock = asyncio.Lock()
+        # Zwiększane przez invalidate_now_playing - snapshot pobrany wcześniej nie jest już aktualny
+        self._nowplaying_generation = 0
+        self._nowplaying_cache_generation = 0
+        # Transport HTTP (None = domyślny); testy podstawiają atrapę AzuraCast (httpx.ASGITransport)
+        self.transport: Optional[httpx.AsyncBaseTransport] = None
+
+    def _client(self, timeout: float) -> httpx.AsyncClient:
+        return httpx.AsyncClient(timeout=timeout, transport=self.transport)
 
     def _get_headers(self) -> Dict[str, str]:
         headers = {"Accept": "application/json"}
@@ -24,6 +41,45 @@ class AzuraCastClient:
             headers["X-API-Key"] = self.api_key
         return headers
 
+    def invalidate_now_playing(self):
+        """Wymusza pobranie świeżego /api/nowplaying (np. webhook zmiany utworu w trakcie TTL)"""
+        self._nowplaying_generation += 1
+
+    def _station_cached(self) -> bool:
+        return (
+            self._nowplaying_cache is not None
+            and self._nowplaying_cache_generation == self._nowplaying_generation
+            and time.monotonic() - self._nowplaying_timestamp < self._nowplaying_ttl
+        )
+
+    async def _get_station(self) -> Dict[str, Any]:
+        """Dane stacji z /api/nowplaying - jedno zapytanie na TTL, współbieżni wywołujący czekają na ten sam wynik"""
+        if self._station_cached():
+            return self._nowplaying_cache
+        
+        async with self._nowplaying_lock:
+            if self._station_cached():
+                return self._nowplaying_cache
+            
+            # Unieważnienie w trakcie pobierania - wynik trafi do cache jako już nieaktualny
+            generation = self._nowplaying_generation
+            async with self._client(self.timeout) as client:
+                url = f"{self.base_url}/api/nowplaying/{self.station_id}"
+                logger.debug(f"Fetching now playing snapshot from: {url}")
+                response = await client.get(url, headers=self._get_headers())
+                response.raise_for_status()
+                data = response.json()
+            
+            if isinstance(data, list) and len(data) > 0:
+                station = data[0]
+            else:
+                station = data
+            
+            self._nowplaying_cache = station
+            self._nowplaying_cache_generation = generation
+            self._nowplaying_timestamp = time.monotonic()
+            return station
+
     async def get_now_playing(self) -> Optional[Dict[str, Any]]:
         """Pobiera aktualnie grający utwór z AzuraCast"""
         if not self.base_url:
@@ -31,58 +87,48 @@ class AzuraCastClient:
             return None
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                url = f"{self.base_url}/api/nowplaying/{self.station_id}"
-                logger.debug(f"Fetching now playing from: {url}")
-                response = await client.get(url, headers=self._get_headers())
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list) and len(data) > 0:
-                    station = data[0]
-                else:
-                    station = data
-                
-                now_playing = station.get("now_playing", {})
-                song = now_playing.get("song", {})
-                
-                # Pobieranie stream URL z różnych możliwych miejsc
-                stream_url = None
-                
-                # Sprawdź mounts (najczęściej tam jest stream URL)
-                mount_points = station.get("mounts", [])
-                if mount_points and len(mount_points) > 0:
-                    mount = mount_points[0]
-                    stream_url = mount.get("url")
-                    # Jeśli nie ma URL, spróbuj zbudować z path
-                    if not stream_url and mount.get("path"):
-                        stream_url = f"{self.base_url}{mount.get('path')}"
-                
-                # Jeśli nie ma, sprawdź listeners.url
-                if not stream_url:
-                    listeners = station.get("listeners", {})
-                    if isinstance(listeners, dict):
-                        stream_url = listeners.get("url")
-                
-                # Jeśli nadal nie ma, sprawdź public_player_url
-                if not stream_url:
-                    stream_url = station.get("public_player_url")
-                
-                # Jeśli nadal nie ma, sprawdź konfigurację bezpośredniego stream URL
-                if not stream_url:
-                    stream_url = config.settings.azuracast_stream_url
-                
-                # Ostatnia opcja - użyj proxy endpoint z naszego backendu
-                if not stream_url:
-                    stream_url = f"{config.settings.app_base_url}/api/radio/stream"
-                
-                return {
-                    "title": song.get("title", "Unknown"),
-                    "artist": song.get("artist", "Unknown"),
-                    "thumbnail": song.get("art", None),
-                    "songId": str(song.get("id", now_playing.get("sh_id", ""))),
-                    "streamUrl": stream_url
-                }
+            station = await self._get_station()
+            
+            now_playing = station.get("now_playing", {})
+            song = now_playing.get("song", {})
+            
+            # Pobieranie stream URL z różnych możliwych miejsc
+            stream_url = None
+            
+            # Sprawdź mounts (najczęściej tam jest stream URL)
+            mount_points = station.get("mounts", [])
+            if mount_points and len(mount_points) > 0:
+                mount = mount_points[0]
+                stream_url = mount.get("url")
+                # Jeśli nie ma URL, spróbuj zbudować z path
+                if not stream_url and mount.get("path"):
+                    stream_url = f"{self.base_url}{mount.get('path')}"
+            
+            # Jeśli nie ma, sprawdź listeners.url
+            if not stream_url:
+                listeners = station.get("listeners", {})
+                if isinstance(listeners, dict):
+                    stream_url = listeners.get("url")
+            
+            # Jeśli nadal nie ma, sprawdź public_player_url
+            if not stream_url:
+                stream_url = station.get("public_player_url")
+            
+            # Jeśli nadal nie ma, sprawdź konfigurację bezpośredniego stream URL
+            if not stream_url:
+                stream_url = config.settings.azuracast_stream_url
+            
+            # Ostatnia opcja - użyj proxy endpoint z naszego backendu
+            if not stream_url:
+                stream_url = f"{config.settings.app_base_url}/api/radio/stream"
+            
+            return {
+                "title": song.get("title", "Unknown"),
+                "artist": song.get("artist", "Unknown"),
+                "thumbnail": song.get("art", None),
+                "songId": str(song.get("id", now_playing.get("sh_id", ""))),
+                "streamUrl": stream_url
+            }
         except httpx.HTTPStatusError as e:
             logger.error(f"AzuraCast API HTTP error (now-playing): {e.response.status_code} - {e.response.text}")
             return None
@@ -97,39 +143,29 @@ class AzuraCastClient:
             return None
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                url = f"{self.base_url}/api/nowplaying/{self.station_id}"
-                logger.debug(f"Fetching station info from: {url}")
-                response = await client.get(url, headers=self._get_headers())
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list) and len(data) > 0:
-                    station = data[0]
-                else:
-                    station = data
-                
-                listeners = station.get("listeners", {})
-                song_history = station.get("song_history", [])
-                
-                # Liczba utworów w bazie - spróbuj z różnych miejsc
-                songs_count = 0
-                if "media" in station:
-                    media = station["media"]
-                    if isinstance(media, dict):
-                        songs_count = media.get("unique", 0)
-                    elif isinstance(media, int):
-                        songs_count = media
-                
-                # Jeśli nie znaleziono, użyj długości historii jako przybliżenia
-                if songs_count == 0:
-                    songs_count = len(song_history) if isinstance(song_history, list) else 0
-                
-                return {
-                    "listeners_online": listeners.get("total", 0) or listeners.get("current", 0),
-                    "songs_in_database": songs_count,
-                    "songs_played_today": len(song_history) if isinstance(song_history, list) else 0
-                }
+            station = await self._get_station()
+            
+            listeners = station.get("listeners", {})
+            song_history = station.get("song_history", [])
+            
+            # Liczba utworów w bazie - spróbuj z różnych miejsc
+            songs_count = 0
+            if "media" in station:
+                media = station["media"]
+                if isinstance(media, dict):
+                    songs_count = media.get("unique", 0)
+                elif isinstance(media, int):
+                    songs_count = media
+            
+            # Jeśli nie znaleziono, użyj długości historii jako przybliżenia
+            if songs_count == 0:
+                songs_count = len(song_history) if isinstance(song_history, list) else 0
+            
+            return {
+                "listeners_online": listeners.get("total", 0) or listeners.get("current", 0),
+                "songs_in_database": songs_count,
+                "songs_played_today": len(song_history) if isinstance(song_history, list) else 0
+            }
         except httpx.HTTPStatusError as e:
             logger.error(f"AzuraCast API HTTP error (station-info): {e.response.status_code} - {e.response.text}")
             return None
@@ -149,7 +185,7 @@ class AzuraCastClient:
             return
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with self._client(self.timeout) as client:
                 url = f"{self.base_url}/api/station/{self.station_id}/files"
                 logger.debug(f"Refreshing files cache from: {url}")
                 response = await client.get(url, headers=self._get_headers())
@@ -203,6 +239,99 @@ class AzuraCastClient:
         except Exception as e:
             logger.error(f"AzuraCast API error (refresh-cache): {e}", exc_info=True)
 
+    async def get_library(self) -> Dict[str, Dict[str, Any]]:
+        """Wszystkie pliki stacji {song_id: {title, artist, album, thumbnail}} z cache"""
+        await self._refresh_files_cache()
+        return dict(self._files_cache)
+
+    async def file_exists(self, path: str) -> bool:
+        """Czy plik o ścieżce path (względem katalogu mediów stacji) już istnieje.
+        
+        Błędy HTTP są propagowane - wywołujący (worker) decyduje o ponowieniu.
+        """
+        directory, _, _ = path.rpartition("/")
+        async with self._client(self.timeout) as client:
+            url = f"{self.base_url}/api/station/{self.station_id}/files/list"
+            response = await client.get(url, headers=self._get_headers(), params={"currentDirectory": directory})
+            response.raise_for_status()
+            listing = response.json()
+        return isinstance(listing, list) and any(
+            isinstance(item, dict) and item.get("path") == path for item in listing
+        )
+
+    async def upload_file(
+        self,
+        local_path: str,
+        path: str,
+        identifier: str,
+        chunk_size: int,
+        timeout: float,
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """Wysyła plik kawałkami przez uploader Flow.js AzuraCast (/files/upload).
+        
+        Kawałki są czytane z dysku po kolei, więc plik nie trafia w całości do pamięci. identifier
+        (flowIdentifier) ma być stały dla tej samej treści - ponowiona próba nadpisuje te same
+        kawałki zamiast składać nowy plik. Błędy HTTP są propagowane.
+        """
+        total_size = os.path.getsize(local_path)
+        total_chunks = max(1, math.ceil(total_size / chunk_size))
+        directory, _, filename = path.rpartition("/")
+        url = f"{self.base_url}/api/station/{self.station_id}/files/upload"
+        
+        result: Dict[str, Any] = {}
+        async with self._client(timeout) as client:
+            with open(local_path, "rb") as source:
+                for number in range(1, total_chunks + 1):
+                    chunk = source.read(chunk_size)
+                    data = {
+                        "currentDirectory": directory,
+                        "flowChunkNumber": str(number),
+                        "flowChunkSize": str(chunk_size),
+                        "flowCurrentChunkSize": str(len(chunk)),
+                        "flowTotalSize": str(total_size),
+                        "flowTotalChunks": str(total_chunks),
+                        "flowIdentifier": identifier,
+                        "flowFilename": filename,
+                        "flowRelativePath": filename,
+                    }
+                    response = await client.post(
+                        url,
+                        headers=self._get_headers(),
+                        data=data,
+                        files={"file": (filename, chunk, "application/octet-stream")}
+                    )
+                    response.raise_for_status()
+                    if on_progress:
+                        await on_progress(source.tell(), total_size)
+                    try:
+                        result = response.json()
+                    except ValueError:
+                        result = {}
+        
+        # Nowy plik ma się pojawić w katalogu przy najbliższym odczycie
+        self._cache_timestamp = None
+        return result
+
+    async def list_files(self) -> List[Dict[str, Any]]:
+        """Surowa lista plików stacji (path, title, artist, length...) z /files, bez cache. Błędy HTTP są propagowane"""
+        async with self._client(max(self.timeout, 60.0)) as client:
+            url = f"{self.base_url}/api/station/{self.station_id}/files"
+            response = await client.get(url, headers=self._get_headers())
+            response.raise_for_status()
+            files = response.json()
+        return [item for item in files if isinstance(item, dict) and item.get("path")] if isinstance(files, list) else []
+
+    async def download_file(self, path: str, local_path: str, timeout: float):
+        """Pobiera plik z mediów stacji strumieniowo na dysk. Błędy HTTP są propagowane"""
+        async with self._client(timeout) as client:
+            url = f"{self.base_url}/api/station/{self.station_id}/files/download"
+            async with client.stream("GET", url, headers=self._get_headers(), params={"file": path}) as response:
+                response.raise_for_status()
+                with open(local_path, "wb") as target:
+                    async for chunk in response.aiter_bytes(1024 * 1024):
+                        target.write(chunk)
+
     async def get_song_info(self, song_id: str) -> Optional[Dict[str, Any]]:
         """Pobiera informacje o utworze po ID z cache"""
         await self._refresh_files_cache()
@@ -225,65 +354,55 @@ class AzuraCastClient:
             return None
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                url = f"{self.base_url}/api/nowplaying/{self.station_id}"
-                logger.debug(f"Fetching recent songs from: {url}")
-                response = await client.get(url, headers=self._get_headers())
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list) and len(data) > 0:
-                    station = data[0]
-                else:
-                    station = data
-                
-                logger.debug(f"Station data keys: {station.keys() if isinstance(station, dict) else 'not a dict'}")
-                
-                # AzuraCast używa klucza "song_history" zamiast "recent_songs"
-                recent_songs = station.get("song_history", [])
-                if not recent_songs:
-                    recent_songs = station.get("recent_songs", [])
-                if not recent_songs:
-                    recent_songs = station.get("history", [])
+            station = await self._get_station()
+            
+            logger.debug(f"Station data keys: {station.keys() if isinstance(station, dict) else 'not a dict'}")
+            
+            # AzuraCast używa klucza "song_history" zamiast "recent_songs"
+            recent_songs = station.get("song_history", [])
+            if not recent_songs:
+                recent_songs = station.get("recent_songs", [])
+            if not recent_songs:
+                recent_songs = station.get("history", [])
+            
+            logger.debug(f"Recent songs found: {len(recent_songs) if isinstance(recent_songs, list) else 0}")
+            
+            if not isinstance(recent_songs, list):
+                logger.warning(f"Recent songs is not a list: {type(recent_songs)}")
+                return []
+            
+            songs = []
+            for history_item in recent_songs[:limit]:
+                if not isinstance(history_item, dict):
+                    continue
                 
-                logger.debug(f"Recent songs found: {len(recent_songs) if isinstance(recent_songs, list) else 0}")
+                # AzuraCast zwraca strukturę z "song" wewnątrz history_item
+                song_data = history_item.get("song", {})
+                if not song_data:
+                    continue
                 
-                if not isinstance(recent_songs, list):
-                    logger.warning(f"Recent songs is not a list: {type(recent_songs)}")
-                    return []
+                # Pobierz tytuł i artystę
+                title = song_data.get("title", "")
+                artist = song_data.get("artist", "")
                 
-                songs = []
-                for history_item in recent_songs[:limit]:
-                    if not isinstance(history_item, dict):
-                        continue
-                    
-                    # AzuraCast zwraca strukturę z "song" wewnątrz history_item
-                    song_data = history_item.get("song", {})
-                    if not song_data:
-                        continue
-                    
-                    # Pobierz tytuł i artystę
-                    title = song_data.get("title", "")
-                    artist = song_data.get("artist", "")
-                    
-                    # Jeśli brak title/artist, spróbuj z "text"
-                    if not title and not artist:
-                        text = song_data.get("text", "")
-                        if text and " - " in text:
-                            parts = text.split(" - ", 1)
-                            artist = parts[0].strip()
-                            title = parts[1].strip()
-                        elif text:
-                            title = text
-                    
-                    songs.append({
-                        "title": title or "Unknown",
-                        "artist": artist or "Unknown",
-                        "thumbnail": song_data.get("art") or None,
-                        "played_at": history_item.get("played_at")
-                    })
+                # Jeśli brak title/artist, spróbuj z "text"
+                if not title and not artist:
+                    text = song_data.get("text", "")
+                    if text and " - " in text:
+                        parts = text.split(" - ", 1)
+                        artist = parts[0].strip()
+                        title = parts[1].strip()
+                    elif text:
+                        title = text
                 
-                return songs
+                songs.append({
+                    "title": title or "Unknown",
+                    "artist": artist or "Unknown",
+                    "thumbnail": song_data.get("art") or None,
+                    "played_at": history_item.get("played_at")
+                })
+            
+            return songs
         except httpx.HTTPStatusError as e:
             logger.error(f"AzuraCast API HTTP error (recent-songs): {e.response.status_code} - {e.response.text}")
             return None
@@ -298,45 +417,35 @@ class AzuraCastClient:
             return None
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                url = f"{self.base_url}/api/nowplaying/{self.station_id}"
-                logger.debug(f"Fetching next song from: {url}")
-                response = await client.get(url, headers=self._get_headers())
-                response.raise_for_status()
-                data = response.json()
-                
-                if isinstance(data, list) and len(data) > 0:
-                    station = data[0]
-                else:
-                    station = data
-                
-                playing_next = station.get("playing_next", {})
-                if not playing_next or not isinstance(playing_next, dict):
-                    return None
-                
-                song = playing_next.get("song", {})
-                if not song or not isinstance(song, dict):
-                    return None
-                
-                # Pobierz tytuł i artystę
-                title = song.get("title", "")
-                artist = song.get("artist", "")
-                
-                # Jeśli brak, spróbuj z "text"
-                if not title and not artist:
-                    text = song.get("text", "")
-                    if text and " - " in text:
-                        parts = text.split(" - ", 1)
-                        artist = parts[0].strip()
-                        title = parts[1].strip()
-                    elif text:
-                        title = text
-                
-                return {
-                    "title": title or "Unknown",
-                    "artist": artist or "Unknown",
-                    "thumbnail": song.get("art") or None
-                }
+            station = await self._get_station()
+            
+            playing_next = station.get("playing_next", {})
+            if not playing_next or not isinstance(playing_next, dict):
+                return None
+            
+            song = playing_next.get("song", {})
+            if not song or not isinstance(song, dict):
+                return None
+            
+            # Pobierz tytuł i artystę
+            title = song.get("title", "")
+            artist = song.get("artist", "")
+            
+            # Jeśli brak, spróbuj z "text"
+            if not title and not artist:
+                text = song.get("text", "")
+                if text and " - " in text:
+                    parts = text.split(" - ", 1)
+                    artist = parts[0].strip()
+                    title = parts[1].strip()
+                elif text:
+                    title = text
+            
+            return {
+                "title": title or "Unknown",
+                "artist": artist or "Unknown",
+                "thumbnail": song.get("art") or None
+            }
         except httpx.HTTPStatusError as e:
             logger.error(f"AzuraCast API HTTP error (next-song): {e.response.status_code} - {e.response.text}")
             return None
@@ -370,7 +479,7 @@ class AzuraCastClient:
             
             # Pobierz każdy dzień osobno
             all_schedule_items = []
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with self._client(self.timeout) as client:
                 for day_offset in range(7):
                     # Dla każdego dnia użyj daty poprzedniego dnia 23:59
                     target_day = monday + timedelta(days=day_offset)
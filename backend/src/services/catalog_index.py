@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+from .azuracast import azuracast_client
+
+logger = logging.getLogger(__name__)
+
+# Minimalne podobieństwo zbiorów tokenów (Jaccard) i liczba wspólnych tokenów dla dopasowania przybliżonego
+SIMILARITY_THRESHOLD = 0.75
+MIN_COMMON_TOKENS = 2
+
+# Ile najrzadszych tokenów zapytania wybiera kandydatów z indeksu odwróconego
+CANDIDATE_TOKENS = 3
+
+# Dopiski z YouTube bez znaczenia dla identyfikacji utworu
+NOISE_WORDS = {
+    "official", "video", "audio", "music", "lyric", "lyrics", "hd", "hq", "4k", "mv",
+    "visualizer", "teledysk", "oficjalny", "clip", "remastered", "remaster", "topic", "vevo",
+}
+_BRACKETED = re.compile(r"[\(\[\{]([^\)\]\}]*)[\)\]\}]")
+_FEATURING = re.compile(r"\s(?:feat\.?|ft\.?|featuring)\s.*$")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_CHANNEL_SUFFIX = re.compile(r"(?:vevo|\s+-\s+topic|\s+official)$", re.IGNORECASE)
+_POLISH = str.maketrans({"ł": "l", "Ł": "L"})
+
+def normalize(value: Optional[str]) -> str:
+    """Małe litery bez diakrytyków, bez dopisków typu "(Official Video)" i "feat. ...", sama treść słów"""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value.translate(_POLISH))
+    value = "".join(char for char in value if not unicodedata.combining(char)).lower()
+    value = _BRACKETED.sub(lambda match: " " if set(_NON_WORD.split(match.group(1))) & NOISE_WORDS else f" {match.group(1)} ", value)
+    value = _FEATURING.sub("", value)
+    return " ".join(word for word in _NON_WORD.split(value) if word)
+
+def split_artist_title(title: Optional[str], artist: Optional[str]) -> tuple:
+    """Tytuły z YouTube mają często postać "Wykonawca - Tytuł", a jako artystę kanał ("XVEVO", "X - Topic")"""
+    if title and " - " in title:
+        artist_part, title_part = title.split(" - ", 1)
+        return artist_part, title_part
+    if artist:
+        artist = _CHANNEL_SUFFIX.sub("", artist)
+    return artist, title
+
+def _tokens(artist: str, title: str) -> FrozenSet[str]:
+    return frozenset(word for word in f"{artist} {title}".split() if word not in NOISE_WORDS)
+
+class CatalogEntry(NamedTuple):
+    kind: str  # library / suggestion
+    ref: Any  # song_id z AzuraCast albo id propozycji
+    title: str
+    artist: str
+    status: Optional[str]
+    user_id: Optional[int]
+    tokens: FrozenSet[str]
+
+class CatalogIndex:
+    """Indeks dopasowań propozycji do biblioteki AzuraCast i wszystkich dotychczasowych propozycji.
+
+    - youtube_id -> propozycja: słownik, O(1)
+    - znormalizowany klucz "wykonawca|tytuł": słownik, O(1)
+    - podobieństwo zbiorów tokenów: kandydaci z list najrzadszych tokenów (indeks odwrócony),
+      więc koszt zależy od długości tych list, a nie od wielkości katalogu
+
+    Przebudowa z bazy i cache plików AzuraCast po TTL; nowe propozycje dopisywane od razu.
+    Biblioteka ma pierwszeństwo przed propozycjami.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: List[CatalogEntry] = []
+        self._by_key: Dict[str, int] = {}
+        self._by_youtube_id: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._built_at = 0.0
+
+    async def ensure(self, db: AsyncSession):
+        if time.monotonic() - self._built_at < self.ttl:
+            return
+        async with self._lock:
+            if time.monotonic() - self._built_at < self.ttl:
+                return
+            try:
+                await self._rebuild(db)
+            except Exception as e:
+                logger.error(f"Catalog index rebuild failed: {e}", exc_info=True)
+            # Także po błędzie - kolejna próba dopiero po TTL, do tego czasu stary indeks
+            self._built_at = time.monotonic()
+
+    async def _rebuild(self, db: AsyncSession):
+        library = await azuracast_client.get_library()
+        result = await db.execute(
+            select(
+                models.Suggestion.id, models.Suggestion.user_id, models.Suggestion.title,
+                models.Suggestion.artist, models.Suggestion.youtube_id, models.Suggestion.status
+            ).order_by(models.Suggestion.id)
+        )
+        suggestions = result.all()
+
+        self._entries = []
+        self._by_key = {}
+        self._by_youtube_id = {}
+        self._postings = defaultdict(list)
+        for song_id, info in library.items():
+            self._add("library", song_id, info.get("title"), info.get("artist"), None, None, None)
+        for row in suggestions:
+            self._add("suggestion", row.id, row.title, row.artist, row.youtube_id, row.status, row.user_id)
+        logger.info(f"Catalog index built: {len(library)} library files, {len(suggestions)} suggestions")
+
+    def _add(self, kind: str, ref: Any, title: Optional[str], artist: Optional[str], youtube_id: Optional[str], status: Optional[str], user_id: Optional[int]):
+        # Tagi plików stacji są już rozdzielone - tytuł z " - " (remiks, wersja) zostaje bez zmian
+        if kind != "library":
+            artist, title = split_artist_title(title, artist)
+        artist, title = normalize(artist), normalize(title)
+        index = len(self._entries)
+        entry = CatalogEntry(kind, ref, title, artist, status, user_id, _tokens(artist, title))
+        self._entries.append(entry)
+
+        if youtube_id:
+            self._by_youtube_id.setdefault(youtube_id, index)
+        if title:
+            self._by_key.setdefault(f"{artist}|{title}", index)
+        for token in entry.tokens:
+            self._postings[token].append(index)
+
+    def add_suggestion(self, suggestion_id: int, user_id: Optional[int], title: Optional[str], artist: Optional[str], youtube_id: Optional[str], status: str = "PENDING"):
+        """Dopisuje świeżo utworzoną propozycję bez czekania na przebudowę"""
+        if self._built_at:
+            self._add("suggestion", suggestion_id, title, artist, youtube_id, status, user_id)
+
+    def _describe(self, entry: CatalogEntry, match: str, score: float) -> Dict[str, Any]:
+        described = {"kind": entry.kind, "match": match, "score": round(score, 2), "title": entry.title, "artist": entry.artist}
+        if entry.kind == "library":
+            described["song_id"] = entry.ref
+        else:
+            described.update({"suggestion_id": entry.ref, "status": entry.status, "user_id": entry.user_id})
+        return described
+
+    def _similar(self, tokens: FrozenSet[str], exclude: Set[Any]) -> Optional[tuple]:
+        present = sorted((token for token in tokens if token in self._postings), key=lambda token: len(self._postings[token]))
+        candidates = set()
+        for token in present[:CANDIDATE_TOKENS]:
+            candidates.update(self._postings[token])
+
+        best = None
+        for index in candidates:
+            entry = self._entries[index]
+            if (entry.kind, entry.ref) in exclude:
+                continue
+            common = len(tokens & entry.tokens)
+            if common < MIN_COMMON_TOKENS:
+                continue
+            score = common / len(tokens | entry.tokens)
+            # Przy remisie wygrywa biblioteka, potem starsza propozycja
+            rank = (score, entry.kind == "library", -index)
+            if score >= SIMILARITY_THRESHOLD and (best is None or rank > best[0]):
+                best = (rank, entry)
+        return best
+
+    def match(self, title: Optional[str], artist: Optional[str], youtube_id: Optional[str] = None, exclude_suggestion_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Najlepsze dopasowanie: {"kind": "library" | "suggestion", "match": "youtube_id" | "exact" | "similar", ...} albo None"""
+        exclude = {("suggestion", exclude_suggestion_id)} if exclude_suggestion_id else set()
+        artist, title = split_artist_title(title, artist)
+        artist, title = normalize(artist), normalize(title)
+        key = f"{artist}|{title}"
+
+        # Kolejność: ten sam plik w bibliotece, ten sam film YouTube, ten sam znormalizowany klucz, podobieństwo
+        exact = self._by_key.get(key) if title else None
+        if exact is not None and self._entries[exact].kind == "library":
+            return self._describe(self._entries[exact], "exact", 1.0)
+
+        tokens = _tokens(artist, title)
+        similar = self._similar(tokens, exclude) if tokens else None
+        if similar and similar[1].kind == "library":
+            return self._describe(similar[1], "similar", similar[0][0])
+
+        by_youtube = self._by_youtube_id.get(youtube_id) if youtube_id else None
+        if by_youtube is not None and ("suggestion", self._entries[by_youtube].ref) not in exclude:
+            return self._describe(self._entries[by_youtube], "youtube_id", 1.0)
+        if exact is not None and ("suggestion", self._entries[exact].ref) not in exclude:
+            return self._describe(self._entries[exact], "exact", 1.0)
+        if similar:
+            return self._describe(similar[1], "similar", similar[0][0])
+        return None
+
+    def match_items(self, items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        return [self.match(item.get("title"), item.get("artist"), item.get("youtube_id")) for item in items]
+
+catalog_index = CatalogIndex(ttl=config.settings.catalog_index_ttl)
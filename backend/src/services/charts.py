@@ -0,0 +1,425 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional, Tuple, List, Dict, Any, Callable, Awaitable
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+from sqlalchemy import select, func, desc, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+from .azuracast import azuracast_client
+
+logger = logging.getLogger(__name__)
+
+PERIOD_DAYS = {
+    "week": 7,
+    "month": 30,
+}
+
+MAX_CHART_LIMIT = 100
+
+def normalize_chart_params(period: str, limit: int) -> Tuple[str, int]:
+    """Sprowadza parametry do skończonego zbioru kluczy (każdy nieznany okres = all)"""
+    period = period if period in PERIOD_DAYS else "all"
+    limit = max(1, min(limit, MAX_CHART_LIMIT))
+    return period, limit
+
+def vote_day(created_at: Optional[datetime]) -> date:
+    """Zwraca dzień (UTC), do którego głos trafia w rollupie"""
+    if created_at is None:
+        return datetime.now(timezone.utc).date()
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.astimezone(timezone.utc).date()
+
+async def apply_vote_delta(db: AsyncSession, song_id: str, day: date, likes: int = 0, dislikes: int = 0):
+    """Aktualizuje rollup song_vote_daily w bieżącej transakcji (upsert z inkrementacją)"""
+    if not likes and not dislikes:
+        return
+
+    stmt = pg_insert(models.SongVoteDaily).values(
+        song_id=song_id,
+        day=day,
+        likes=likes,
+        dislikes=dislikes
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.SongVoteDaily.song_id, models.SongVoteDaily.day],
+        set_={
+            "likes": models.SongVoteDaily.likes + stmt.excluded.likes,
+            "dislikes": models.SongVoteDaily.dislikes + stmt.excluded.dislikes,
+        }
+    )
+    await db.execute(stmt)
+
+def vote_type_delta(vote_type: Optional[str], sign: int = 1) -> Dict[str, int]:
+    """Zamienia typ głosu na przyrost kolumn rollupu"""
+    if vote_type == "LIKE":
+        return {"likes": sign}
+    if vote_type == "DISLIKE":
+        return {"dislikes": sign}
+    return {}
+
+async def rebuild_vote_rollup(conn):
+    """Przelicza cały rollup z tabeli votes (używane przy migracji i naprawie)"""
+    await conn.execute(text("DELETE FROM song_vote_daily"))
+    await conn.execute(text("""
+        INSERT INTO song_vote_daily (song_id, day, likes, dislikes)
+        SELECT
+            song_id,
+            (created_at AT TIME ZONE 'UTC')::date AS day,
+            COUNT(*) FILTER (WHERE vote_type = 'LIKE') AS likes,
+            COUNT(*) FILTER (WHERE vote_type = 'DISLIKE') AS dislikes
+        FROM votes
+        WHERE song_id IS NOT NULL AND created_at IS NOT NULL
+        GROUP BY song_id, (created_at AT TIME ZONE 'UTC')::date
+    """))
+
+def chart_windows(period: str, today: Optional[date] = None) -> Tuple[Optional[date], Optional[date], Optional[date]]:
+    """Zwraca (since, prev_since, prev_until) w dniach dla danego okresu. None = bez ograniczenia"""
+    today = today or datetime.now(timezone.utc).date()
+    days = PERIOD_DAYS.get(period)
+    if not days:
+        return None, None, None
+
+    since = today - timedelta(days=days - 1)
+    prev_since = since - timedelta(days=days)
+    return since, prev_since, since
+
+# Dolna granica przedziału ufności Wilsona (z = 1.96) dla odsetka głosów {positive} wśród wszystkich
+_WILSON_SQL = """CASE WHEN likes + dislikes > 0 THEN (
+    ({positive}::float / (likes + dislikes) + 3.8416 / (2 * (likes + dislikes)))
+    - 1.96 * sqrt(
+        ({positive}::float / (likes + dislikes)) * (1 - {positive}::float / (likes + dislikes)) / (likes + dislikes)
+        + 3.8416 / (4.0 * (likes + dislikes) * (likes + dislikes))
+    )
+) / (1 + 3.8416 / (likes + dislikes)) ELSE 0 END"""
+
+# Duża liczba głosów podzielonych mniej więcej po równo = wysoka kontrowersyjność
+_CONTROVERSY_SQL = """CASE WHEN likes > 0 AND dislikes > 0
+    THEN power(likes + dislikes, LEAST(likes, dislikes)::float / GREATEST(likes, dislikes))
+    ELSE 0 END"""
+
+# Tryb -> (ocena SQL dla listy przebojów, ocena SQL dla antylisty). None = tryb bez antylisty.
+# Wyrażenia operują na kolumnach likes/dislikes zagregowanego okna; na listę trafiają tylko utwory z oceną > 0.
+RANKING_MODES: Dict[str, Tuple[str, Optional[str]]] = {
+    "likes": ("likes", "dislikes"),
+    "net": ("likes - dislikes", "dislikes - likes"),
+    "wilson": (_WILSON_SQL.format(positive="likes"), _WILSON_SQL.format(positive="dislikes")),
+    "controversy": (_CONTROVERSY_SQL, None),
+}
+
+# Jeden skan rollupu dla okna i (opcjonalnie) okna poprzedniego: is_current rozdziela sumy obu okien,
+# ROW_NUMBER numeruje obie kolejności (lista i antylista) w obrębie okna, tylko wśród ocen > 0.
+# Kolejność przy remisie: więcej głosów, potem song_id - stabilna między przeliczeniami
+_RANKED_SQL = """
+    WITH window_totals AS (
+        SELECT song_id, {current} AS is_current, SUM(likes)::bigint AS likes, SUM(dislikes)::bigint AS dislikes
+        FROM song_vote_daily
+        {where}
+        GROUP BY song_id, is_current
+    ), scored AS (
+        SELECT song_id, is_current, likes, dislikes, ({top})::float AS top_score, ({worst})::float AS worst_score
+        FROM window_totals
+    ), ranked AS (
+        SELECT *,
+            CASE WHEN top_score > 0 THEN ROW_NUMBER() OVER (
+                PARTITION BY is_current, top_score > 0 ORDER BY top_score DESC, likes + dislikes DESC, song_id
+            ) END AS top_position,
+            CASE WHEN worst_score > 0 THEN ROW_NUMBER() OVER (
+                PARTITION BY is_current, worst_score > 0 ORDER BY worst_score DESC, likes + dislikes DESC, song_id
+            ) END AS worst_position
+        FROM scored
+    )
+    SELECT cur.song_id, cur.likes, cur.dislikes, cur.top_score, cur.worst_score,
+        CASE WHEN cur.top_position <= :limit THEN cur.top_position END AS top_position,
+        CASE WHEN cur.worst_position <= :limit THEN cur.worst_position END AS worst_position,
+        CASE WHEN prev.top_position <= :prev_limit THEN prev.top_position END AS prev_top_position,
+        CASE WHEN prev.worst_position <= :prev_limit THEN prev.worst_position END AS prev_worst_position
+    FROM ranked cur
+    LEFT JOIN ranked prev ON prev.song_id = cur.song_id AND NOT prev.is_current
+    WHERE cur.is_current AND (cur.top_position <= :limit OR cur.worst_position <= :limit)
+"""
+
+RankedEntry = Tuple[str, int, int, float]
+
+async def _rank_window(
+    db: AsyncSession, mode: str, since: Optional[date], until: Optional[date], limit: int,
+    prev_since: Optional[date] = None,
+) -> Tuple[Dict[str, List[RankedEntry]], Dict[str, Dict[str, int]]]:
+    """Lista i antylista okna [since, until) jednym zapytaniem - sortowanie i LIMIT po stronie Postgresa.
+
+    Z prev_since liczy też pozycje tych utworów w oknie [prev_since, since) (w obrębie pierwszych 2 * limit).
+    Zwraca ({"top": [(song_id, likes, dislikes, score)], "worst": [...]}, {"top": {song_id: pozycja}, "worst": {...}}).
+    """
+    top_sql, worst_sql = RANKING_MODES[mode]
+    conditions, params = [], {"limit": limit, "prev_limit": limit * 2}
+    if prev_since is not None:
+        conditions.append("day >= :prev_since")
+        params["prev_since"], params["since"] = prev_since, since
+        current = "day >= :since"
+    else:
+        if since is not None:
+            conditions.append("day >= :since")
+            params["since"] = since
+        current = "TRUE"
+    if until is not None:
+        conditions.append("day < :until")
+        params["until"] = until
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    result = await db.execute(
+        text(_RANKED_SQL.format(current=current, where=where, top=top_sql, worst=worst_sql or "0")),
+        params
+    )
+    rows = result.all()
+
+    ranked: Dict[str, List[RankedEntry]] = {}
+    prev_positions: Dict[str, Dict[str, int]] = {}
+    for kind in ("top", "worst"):
+        entries = sorted((row for row in rows if getattr(row, f"{kind}_position") is not None), key=lambda row: getattr(row, f"{kind}_position"))
+        ranked[kind] = [(row.song_id, int(row.likes), int(row.dislikes), float(getattr(row, f"{kind}_score"))) for row in entries]
+        prev_positions[kind] = {
+            row.song_id: int(getattr(row, f"prev_{kind}_position"))
+            for row in entries if getattr(row, f"prev_{kind}_position") is not None
+        }
+    return ranked, prev_positions
+
+async def compute_charts(db: AsyncSession, period: str = "week", limit: int = 10, mode: str = "likes") -> Dict[str, List[Dict[str, Any]]]:
+    """Liczy listę przebojów i antylistę - jedno zapytanie, z bazy wraca tylko top-N obu list"""
+    mode = mode if mode in RANKING_MODES else "likes"
+    since, prev_since, prev_until = chart_windows(period)
+
+    # Poprzednie pozycje z zamrożonego notowania tylko gdy pokrywa dokładnie poprzednie okno
+    # (notowania są kalendarzowe, okna kroczące - zwykle liczymy pozycje z poprzedniego okna w tym samym zapytaniu)
+    snapshot = await window_snapshot(db, period, mode, prev_since, prev_until) if prev_since else None
+    ranked, prev_positions = await _rank_window(db, mode, since, None, limit, prev_since=None if snapshot else prev_since)
+    if snapshot:
+        prev_positions = {
+            "top": snapshot_positions(snapshot.top, limit * 2),
+            "worst": snapshot_positions(snapshot.worst, limit * 2),
+        }
+
+    song_ids = {entry[0] for entries in ranked.values() for entry in entries}
+    songs_info = await azuracast_client.get_songs_info_batch(list(song_ids))
+
+    lists = {}
+    for kind, entries in ranked.items():
+        chart_list = []
+        for idx, (song_id, likes, dislikes, score) in enumerate(entries):
+            song_info = songs_info.get(str(song_id), {})
+            prev_pos = prev_positions[kind].get(song_id)
+
+            chart_list.append({
+                "position": idx + 1,
+                "song_id": song_id,
+                "title": song_info.get("title", ""),
+                "artist": song_info.get("artist", ""),
+                "thumbnail": song_info.get("thumbnail"),
+                "votes": likes if kind == "top" else dislikes,
+                "likes": likes,
+                "dislikes": dislikes,
+                "score": round(score, 4),
+                "previous_position": prev_pos,
+                "is_new": prev_pos is None
+            })
+        lists[kind] = chart_list
+
+    return lists
+
+# --- NOTOWANIA ARCHIWALNE ---
+
+SNAPSHOT_SIZE = MAX_CHART_LIMIT * 2
+
+def completed_period(period: str, today: Optional[date] = None) -> Tuple[date, date]:
+    """Zwraca (start, koniec włącznie) ostatniego zakończonego tygodnia kalendarzowego lub miesiąca"""
+    today = today or datetime.now(timezone.utc).date()
+    if period == "week":
+        this_monday = today - timedelta(days=today.weekday())
+        return this_monday - timedelta(days=7), this_monday - timedelta(days=1)
+    end = today.replace(day=1) - timedelta(days=1)
+    return end.replace(day=1), end
+
+def snapshot_positions(entries: List[list], limit: int) -> Dict[str, int]:
+    return {entry[0]: idx + 1 for idx, entry in enumerate(entries[:limit])}
+
+async def latest_snapshot(db: AsyncSession, period: str, mode: str, before: Optional[date] = None) -> Optional[models.ChartSnapshot]:
+    query = select(models.ChartSnapshot).where(
+        models.ChartSnapshot.period == period,
+        models.ChartSnapshot.mode == mode
+    )
+    if before is not None:
+        query = query.where(models.ChartSnapshot.period_start < before)
+    result = await db.execute(query.order_by(desc(models.ChartSnapshot.period_start)).limit(1))
+    return result.scalar_one_or_none()
+
+async def window_snapshot(db: AsyncSession, period: str, mode: str, since: date, until: date) -> Optional[models.ChartSnapshot]:
+    """Notowanie obejmujące dokładnie dni [since, until) albo None"""
+    result = await db.execute(
+        select(models.ChartSnapshot).where(
+            models.ChartSnapshot.period == period,
+            models.ChartSnapshot.mode == mode,
+            models.ChartSnapshot.period_start == since,
+            models.ChartSnapshot.period_end == until - timedelta(days=1)
+        )
+    )
+    return result.scalar_one_or_none()
+
+def _freeze(ranked: List[RankedEntry], prev_positions: Dict[str, int]) -> List[list]:
+    return [
+        [song_id, likes, dislikes, round(score, 4), prev_positions.get(song_id)]
+        for song_id, likes, dislikes, score in ranked
+    ]
+
+def period_bounds(period: str, start: date) -> Tuple[date, date]:
+    """Zwraca (start, koniec włącznie) tygodnia kalendarzowego lub miesiąca zaczynającego się w start"""
+    if period == "week":
+        return start, start + timedelta(days=6)
+    next_start = (start + timedelta(days=32)).replace(day=1)
+    return start, next_start - timedelta(days=1)
+
+async def _freeze_period(db: AsyncSession, period: str, start: date, end: date) -> int:
+    result = await db.execute(
+        select(models.ChartSnapshot.mode).where(
+            models.ChartSnapshot.period == period,
+            models.ChartSnapshot.period_start == start
+        )
+    )
+    existing_modes = set(result.scalars().all())
+    until = end + timedelta(days=1)
+
+    created = 0
+    for mode in RANKING_MODES:
+        if mode in existing_modes:
+            continue
+        previous = await latest_snapshot(db, period, mode, before=start)
+        ranked, _ = await _rank_window(db, mode, start, until, SNAPSHOT_SIZE)
+
+        db.add(models.ChartSnapshot(
+            period=period,
+            mode=mode,
+            period_start=start,
+            period_end=end,
+            top=_freeze(ranked["top"], snapshot_positions(previous.top, SNAPSHOT_SIZE) if previous else {}),
+            worst=_freeze(ranked["worst"], snapshot_positions(previous.worst, SNAPSHOT_SIZE) if previous else {}),
+        ))
+        # Kolejne okresy biorą poprzednie pozycje z właśnie dodanego notowania
+        await db.flush()
+        created += 1
+    return created
+
+async def freeze_snapshots(db: AsyncSession, today: Optional[date] = None) -> int:
+    """Zamraża wszystkie brakujące notowania od ostatniego istniejącego do ostatniego zakończonego
+    tygodnia i miesiąca (idempotentne). Zwraca liczbę nowych notowań"""
+    created = 0
+    for period in PERIOD_DAYS:
+        last_start, _ = completed_period(period, today)
+
+        # Od ostatniego notowania włącznie - uzupełnia też tryby brakujące w tym okresie
+        result = await db.execute(
+            select(func.max(models.ChartSnapshot.period_start)).where(models.ChartSnapshot.period == period)
+        )
+        start = min(result.scalar() or last_start, last_start)
+
+        while start <= last_start:
+            start, end = period_bounds(period, start)
+            created += await _freeze_period(db, period, start, end)
+            await db.commit()
+            start = end + timedelta(days=1)
+
+    if created:
+        logger.info(f"Frozen {created} chart snapshots")
+    return created
+
+async def snapshot_charts(snapshot: models.ChartSnapshot, limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Odtwarza listy z zamrożonego notowania - O(limit), bez dostępu do tabeli głosów"""
+    limit = max(1, min(limit, SNAPSHOT_SIZE))
+    parts = {"top": snapshot.top[:limit], "worst": snapshot.worst[:limit]}
+
+    song_ids = {entry[0] for entries in parts.values() for entry in entries}
+    songs_info = await azuracast_client.get_songs_info_batch(list(song_ids))
+
+    lists = {}
+    for kind, entries in parts.items():
+        lists[kind] = []
+        for idx, (song_id, likes, dislikes, score, prev_pos) in enumerate(entries):
+            song_info = songs_info.get(str(song_id), {})
+            lists[kind].append({
+                "position": idx + 1,
+                "song_id": song_id,
+                "title": song_info.get("title", ""),
+                "artist": song_info.get("artist", ""),
+                "thumbnail": song_info.get("thumbnail"),
+                "votes": likes if kind == "top" else dislikes,
+                "likes": likes,
+                "dislikes": dislikes,
+                "score": score,
+                "previous_position": prev_pos,
+                "is_new": prev_pos is None
+            })
+    return lists
+
+class ChartCache:
+    """Cache wyników list przebojów z jednokrotnym przeliczaniem (single-flight).
+
+    Wpis jest ważny dopóki nie minie TTL i nie zmieni się wersja - wersję
+    podbija każdy zapis głosu (bump), więc kolejny odczyt przelicza listę.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._entries: Dict[tuple, Tuple[int, float, Any, str]] = {}
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+
+    def bump(self):
+        self.version += 1
+
+    def _fresh(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry and entry[0] == self.version and entry[1] > time.monotonic():
+            return entry
+        return None
+
+    @staticmethod
+    def make_etag(payload: Any) -> str:
+        body = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    async def get(self, key: tuple, compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Zwraca (payload, etags) - ETag dla każdej części payloadu oraz całości ("*").
+
+        Równoległe żądania o ten sam klucz czekają na jedno przeliczenie.
+        """
+        entry = self._fresh(key)
+        if entry:
+            return entry[2], entry[3]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._fresh(key)
+            if entry:
+                return entry[2], entry[3]
+
+            # Wersja sprzed obliczeń - jeśli w trakcie przyjdzie głos, wpis od razu będzie nieaktualny
+            version = self.version
+            payload = await compute()
+            etags = {part: self.make_etag(value) for part, value in payload.items()}
+            etags["*"] = self.make_etag(payload)
+            self._entries[key] = (version, time.monotonic() + self.ttl, payload, etags)
+            return payload, etags
+
+chart_cache = ChartCache(ttl=config.settings.chart_cache_ttl)
+
+async def get_charts_cached(db: AsyncSession, period: str = "week", limit: int = 10, mode: str = "likes") -> Tuple[Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    """Zwraca ({"top": [...], "worst": [...]}, etags) - obie listy dzielą jeden wpis w cache"""
+    period, limit = normalize_chart_params(period, limit)
+    mode = mode if mode in RANKING_MODES else "likes"
+    return await chart_cache.get(
+        (period, limit, mode),
+        lambda: compute_charts(db, period, limit, mode)
+    )
@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+from .azuracast import azuracast_client
+
+logger = logging.getLogger(__name__)
+
+# Dekodowanie do mono 5512 Hz (pasmo do ~2,7 kHz wystarcza dla pasm odcisku), najwyżej MAX_SECONDS audio
+SAMPLE_RATE = 5512
+MAX_SECONDS = 120
+FFMPEG_TIMEOUT = 300
+
+# Ramki 2048 próbek (~0,37 s) co 256 próbek (~46 ms); 33 pasma logarytmiczne 300-2000 Hz -> 32 bity na ramkę
+FRAME_SIZE = 2048
+HOP_SIZE = 256
+FRAMES_PER_SECOND = SAMPLE_RATE / HOP_SIZE
+_EDGES = np.geomspace(300.0, 2000.0, 34)
+_WINDOW = np.hanning(FRAME_SIZE).astype(np.float32)
+_BAND_OF_BIN = np.digitize(np.fft.rfftfreq(FRAME_SIZE, 1.0 / SAMPLE_RATE), _EDGES) - 1
+_BANDS = np.zeros((FRAME_SIZE // 2 + 1, len(_EDGES) - 1), dtype=np.float32)
+_IN_RANGE = (_BAND_OF_BIN >= 0) & (_BAND_OF_BIN < len(_EDGES) - 1)
+_BANDS[np.nonzero(_IN_RANGE)[0], _BAND_OF_BIN[_IN_RANGE]] = 1.0
+
+# Indeks wyszukiwania trzyma co INDEX_STRIDE-tą ramkę biblioteki; zapytanie sprawdza wszystkie swoje ramki,
+# więc każde przesunięcie nadal ma trafienia, a indeks jest INDEX_STRIDE razy mniejszy
+INDEX_STRIDE = 4
+# Słowa występujące częściej (cisza, stałe tony) nie niosą informacji o utworze
+MAX_HITS_PER_WORD = 64
+# Ile najlepiej głosowanych (plik, przesunięcie) weryfikować pełnym porównaniem
+CANDIDATES = 5
+
+_POPCOUNT16 = np.array([bin(value).count("1") for value in range(1 << 16)], dtype=np.uint8)
+
+def decode_pcm(path: str, max_seconds: int = MAX_SECONDS) -> np.ndarray:
+    """Próbki mono float32 z początku pliku (ffmpeg jako osobny proces)"""
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-threads", "1",
+        "-i", path, "-vn", "-t", str(max_seconds),
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+    ]
+    try:
+        process = subprocess.run(command, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors="replace").strip()[-500:] if e.stderr else ""
+        raise RuntimeError(f"ffmpeg decode exited with {e.returncode}: {stderr}") from e
+    return np.frombuffer(process.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+def compute_fingerprint(samples: np.ndarray) -> np.ndarray:
+    """Odcisk w stylu Haitsma-Kalker: bit = znak zmiany różnicy energii sąsiednich pasm między ramkami.
+
+    Całość wektorowo: okna przez sliding_window_view, jedno rfft na macierzy ramek, pasma mnożeniem macierzy.
+    """
+    if len(samples) < FRAME_SIZE + HOP_SIZE:
+        return np.empty(0, dtype=np.uint32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * _WINDOW, axis=1)) ** 2
+    energy = spectrum.astype(np.float32) @ _BANDS
+    band_diff = energy[:, :-1] - energy[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    return np.packbits(bits, axis=1).view(">u4").ravel().astype(np.uint32)
+
+def fingerprint_file(path: str) -> Tuple[np.ndarray, float]:
+    """(odcisk, sekundy zdekodowanego audio) - blokujące, do uruchomienia w wątku"""
+    samples = decode_pcm(path)
+    return compute_fingerprint(samples), round(len(samples) / SAMPLE_RATE, 2)
+
+def to_bytes(words: np.ndarray) -> bytes:
+    return words.astype("<u4").tobytes()
+
+def from_bytes(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype="<u4").astype(np.uint32)
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    return _POPCOUNT16[values & 0xFFFF] + _POPCOUNT16[values >> 16]
+
+def bit_error_rate(query: np.ndarray, reference: np.ndarray, shift: int) -> Tuple[float, int]:
+    """Odsetek różnych bitów między query[i] a reference[i + shift] na części wspólnej. Zwraca (BER, liczba ramek)"""
+    start = max(0, -shift)
+    end = min(len(query), len(reference) - shift)
+    if end <= start:
+        return 1.0, 0
+    errors = int(_popcount(query[start:end] ^ reference[start + shift:end + shift]).sum(dtype=np.int64))
+    return errors / (32 * (end - start)), end - start
+
+class FingerprintIndex:
+    """Indeks odcisków audio_fingerprints do wykrywania tych samych nagrań pod innymi tytułami.
+
+    Wyszukiwanie: posortowana tablica słów (co INDEX_STRIDE-ta ramka każdego pliku) i searchsorted dla
+    wszystkich ramek zapytania naraz; trafienia głosują na (plik, przesunięcie), a kilku najlepszych
+    kandydatów jest weryfikowanych odległością Hamminga na całej wspólnej części (odciski z bazy).
+    Nowe wiersze doczytywane przyrostowo (id > ostatnie wczytane) po TTL albo po invalidate(). Wiersz zatwierdzony
+    poza kolejnością id (równoległe wstawienia z kilku procesów) wychodzi w porównaniu liczby wierszy poniżej
+    znacznika z liczbą wczytanych - wtedy indeks jest budowany od nowa.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._words = np.empty(0, dtype=np.uint32)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._offsets = np.empty(0, dtype=np.int32)
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._last_id = 0
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._built_at = 0.0
+
+    async def ensure(self, db: AsyncSession):
+        if time.monotonic() - self._built_at < self.ttl:
+            return
+        async with self._lock:
+            if time.monotonic() - self._built_at < self.ttl:
+                return
+            await self._load(db)
+            self._built_at = time.monotonic()
+
+    async def _load(self, db: AsyncSession):
+        # Wiersz wstawiony poniżej znacznika (zatwierdzony po nowszych) albo usunięty - pełna przebudowa
+        rebuild = False
+        if self._last_id:
+            below = await db.scalar(
+                select(func.count(models.AudioFingerprint.id)).where(models.AudioFingerprint.id <= self._last_id)
+            )
+            rebuild = below != len(self._entries)
+
+        # Przebudowa zaczyna od pustego indeksu; bieżący zostaje podmieniony dopiero na końcu
+        if rebuild:
+            words, owners, offsets = [], [], []
+            entries: Dict[int, Dict[str, Any]] = {}
+            last_id = 0
+        else:
+            words, owners, offsets = [self._words], [self._owners], [self._offsets]
+            entries, last_id = self._entries, self._last_id
+
+        result = await db.stream(
+            select(
+                models.AudioFingerprint.id, models.AudioFingerprint.suggestion_id, models.AudioFingerprint.azuracast_path,
+                models.AudioFingerprint.title, models.AudioFingerprint.artist, models.AudioFingerprint.fingerprint,
+            )
+            .where(models.AudioFingerprint.id > last_id)
+            .order_by(models.AudioFingerprint.id)
+            .execution_options(yield_per=500)
+        )
+        added = 0
+        async for row in result:
+            sparse = from_bytes(row.fingerprint)[::INDEX_STRIDE]
+            words.append(sparse)
+            owners.append(np.full(len(sparse), row.id, dtype=np.int32))
+            offsets.append(np.arange(0, len(sparse) * INDEX_STRIDE, INDEX_STRIDE, dtype=np.int32))
+            entries[row.id] = {
+                "fingerprint_id": row.id,
+                "suggestion_id": row.suggestion_id,
+                "azuracast_path": row.azuracast_path,
+                "title": row.title,
+                "artist": row.artist,
+            }
+            last_id = row.id
+            added += 1
+        if not added and not rebuild:
+            return
+
+        words = np.concatenate(words) if words else np.empty(0, dtype=np.uint32)
+        order = np.argsort(words, kind="stable")
+        self._words = words[order]
+        self._owners = np.concatenate(owners)[order] if owners else np.empty(0, dtype=np.int32)
+        self._offsets = np.concatenate(offsets)[order] if offsets else np.empty(0, dtype=np.int32)
+        self._entries, self._last_id = entries, last_id
+        logger.info(f"Fingerprint index: +{added} files, {len(self._entries)} files, {len(self._words)} indexed frames")
+
+    def _candidates(self, words: np.ndarray, exclude_suggestion_id: Optional[int]) -> list:
+        left = np.searchsorted(self._words, words, side="left")
+        counts = np.searchsorted(self._words, words, side="right") - left
+        useful = (counts > 0) & (counts <= MAX_HITS_PER_WORD)
+        if not useful.any():
+            return []
+
+        # Wszystkie trafienia naraz: pozycje w tablicy indeksu i odpowiadające im pozycje zapytania
+        counts = counts[useful]
+        starts = np.repeat(left[useful], counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        hits = starts + within
+        query_positions = np.repeat(np.nonzero(useful)[0], counts)
+
+        pairs = np.stack([self._owners[hits], self._offsets[hits] - query_positions], axis=1)
+        pairs, votes = np.unique(pairs, axis=0, return_counts=True)
+        candidates = []
+        for index in np.argsort(-votes, kind="stable"):
+            owner, shift = int(pairs[index][0]), int(pairs[index][1])
+            if exclude_suggestion_id and self._entries[owner]["suggestion_id"] == exclude_suggestion_id:
+                continue
+            candidates.append((owner, shift, int(votes[index])))
+            if len(candidates) >= CANDIDATES:
+                break
+        return candidates
+
+    async def match(
+        self,
+        db: AsyncSession,
+        words: np.ndarray,
+        exclude_suggestion_id: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Najbliższy plik z indeksu o BER <= FINGERPRINT_MAX_BER na co najmniej FINGERPRINT_MIN_OVERLAP sekund, albo None"""
+        await self.ensure(db)
+        if len(words) == 0 or len(self._words) == 0:
+            return None
+        candidates = self._candidates(words, exclude_suggestion_id)
+        if not candidates:
+            return None
+
+        result = await db.execute(
+            select(models.AudioFingerprint.id, models.AudioFingerprint.fingerprint)
+            .where(models.AudioFingerprint.id.in_(list({owner for owner, _, _ in candidates})))
+        )
+        references = {row.id: from_bytes(row.fingerprint) for row in result.all()}
+        min_overlap = min(config.settings.fingerprint_min_overlap * FRAMES_PER_SECOND, 0.8 * len(words))
+
+        best = None
+        for owner, shift, votes in candidates:
+            if owner not in references:
+                continue
+            ber, overlap = bit_error_rate(words, references[owner], shift)
+            if overlap >= min_overlap and ber <= config.settings.fingerprint_max_ber and (best is None or ber < best[0]):
+                best = (ber, overlap, owner, shift, votes)
+        if best is None:
+            return None
+
+        ber, overlap, owner, shift, votes = best
+        return {
+            **self._entries[owner],
+            "bit_error_rate": round(ber, 3),
+            "offset_seconds": round(shift / FRAMES_PER_SECOND, 2),
+            "overlap_seconds": round(overlap / FRAMES_PER_SECOND, 1),
+            "votes": votes,
+        }
+
+fingerprint_index = FingerprintIndex(ttl=config.settings.fingerprint_index_ttl)
+
+async def store_fingerprint(
+    db: AsyncSession,
+    words: np.ndarray,
+    seconds: float,
+    azuracast_path: str,
+    suggestion_id: Optional[int] = None,
+    title: Optional[str] = None,
+    artist: Optional[str] = None,
+):
+    """Zapisuje odcisk pliku z mediów stacji (ponowny zapis tej samej ścieżki jest pomijany)"""
+    if len(words) == 0:
+        return
+    await db.execute(
+        pg_insert(models.AudioFingerprint)
+        .values(
+            suggestion_id=suggestion_id,
+            azuracast_path=azuracast_path,
+            title=title,
+            artist=artist,
+            seconds=seconds,
+            fingerprint=to_bytes(words),
+        )
+        .on_conflict_do_nothing(index_elements=["azuracast_path"])
+    )
+    await db.commit()
+    fingerprint_index.invalidate()
+
+async def backfill_library(db: AsyncSession, limit: Optional[int] = None) -> Dict[str, int]:
+    """Odciski plików stacji, których jeszcze nie ma w indeksie (np. wgranych ręcznie), najwyżej limit na wywołanie.
+
+    Pliki pobierane pojedynczo do audio_temp i usuwane zaraz po obliczeniu odcisku.
+    """
+    limit = limit or config.settings.fingerprint_backfill_batch
+    files = await azuracast_client.list_files()
+    known = set((await db.scalars(select(models.AudioFingerprint.azuracast_path))).all())
+    missing = [item for item in files if item["path"] not in known]
+    # Losowa próbka - pliki, które stale się nie dekodują, nie blokują reszty
+    batch = random.sample(missing, min(limit, len(missing)))
+
+    directory = os.path.join(config.settings.audio_temp_dir, "fingerprints")
+    os.makedirs(directory, exist_ok=True)
+    stored = failed = 0
+    for item in batch:
+        local_path = os.path.join(directory, f"{uuid.uuid4().hex}{os.path.splitext(item['path'])[1]}")
+        try:
+            await azuracast_client.download_file(item["path"], local_path, timeout=config.settings.ingest_upload_timeout)
+            words, seconds = await asyncio.to_thread(fingerprint_file, local_path)
+            await store_fingerprint(db, words, seconds, item["path"], title=item.get("title"), artist=item.get("artist"))
+            stored += 1
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Fingerprint backfill failed for {item['path']}: {e}")
+            failed += 1
+        finally:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    return {"stored": stored, "failed": failed, "remaining": len(missing) - stored}
@@ -0,0 +1,393 @@
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import select, update, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+from .audio_analysis import analyze_file, processing_filters
+from .azuracast import azuracast_client
+from .catalog_index import normalize, split_artist_title
+from .fingerprint import FRAMES_PER_SECOND, fingerprint_file, fingerprint_index, store_fingerprint, to_bytes, from_bytes
+from .youtube import download_audio, is_youtube_url, is_playlist_url
+
+logger = logging.getLogger(__name__)
+
+# Maszyna stanów Suggestion.status po akceptacji:
+# APPROVED -> QUEUED -> DOWNLOADING -> ANALYZING -> TRANSCODING -> UPLOADING -> PROCESSED
+# Błąd przejściowy wraca do QUEUED (ponowienie z opóźnieniem), trwały albo po wyczerpaniu prób - FAILED.
+# Nagranie już obecne w mediach stacji (odcisk audio) kończy się stanem DUPLICATE przed wysyłką.
+# Zmiana statusu przez moderatora w trakcie (np. REJECTED) przerywa przetwarzanie przy najbliższym przejściu.
+IN_PROGRESS = ("QUEUED", "DOWNLOADING", "ANALYZING", "TRANSCODING", "UPLOADING")
+FINISHED = ("PROCESSED", "FAILED", "DUPLICATE")
+
+# Propozycja zaakceptowana przez moderatora, na dowolnym etapie przetwarzania (np. odznaka PLAYLIST_CONTRIBUTOR)
+ACCEPTED_STATUSES = ("APPROVED",) + IN_PROGRESS + FINISHED
+
+# Akceptacja uruchamia przetwarzanie - dozwolona tylko przed nim. FAILED: ponowienie przez ponowną akceptację
+# (dispatcher zeruje licznik prób). Stany w toku, PROCESSED i DUPLICATE pobrałyby i wysłały plik drugi raz.
+APPROVABLE_FROM = ("PENDING", "REJECTED", "FAILED")
+
+# Postęp (ingest_progress) na początku kolejnych etapów
+PROGRESS = {"DOWNLOADING": 0, "ANALYZING": 35, "TRANSCODING": 45, "UPLOADING": 60, "PROCESSED": 100}
+
+FFMPEG_TIMEOUT = 600
+
+# Odcisk audio źródła zapisany przy analizie, trafia do indeksu po udanej wysyłce
+FINGERPRINT_FILE = "fingerprint.bin"
+
+class IngestCancelled(Exception):
+    """Status propozycji zmienił się poza Workerem - przetwarzanie przerwane bez błędu"""
+
+class IngestFailed(Exception):
+    """Błąd trwały - ponowienie nic nie zmieni"""
+
+class IngestDuplicate(Exception):
+    """To samo nagranie jest już w mediach stacji"""
+
+    def __init__(self, match: Dict[str, Any]):
+        super().__init__(
+            f"Duplikat: {match.get('artist') or '?'} - {match.get('title') or '?'} "
+            f"({match['azuracast_path']}, BER {match['bit_error_rate']})"
+        )
+        self.match = match
+
+_REQUEUE_STALE_SQL = text("""
+    UPDATE suggestions SET status = 'QUEUED', updated_at = now()
+    WHERE status = ANY(:states) AND updated_at < now() - make_interval(mins => :minutes)
+    RETURNING id
+""")
+
+# Najstarsze zaakceptowane propozycje; SKIP LOCKED - równoległy dispatcher nie bierze tych samych wierszy.
+# Paczki z Google Drive przetwarza administrator (POST /api/admin/fingerprints/check przed wgraniem)
+_CLAIM_SQL = text("""
+    UPDATE suggestions SET status = 'QUEUED', ingest_attempts = 0, ingest_progress = NULL,
+        ingest_error = NULL, updated_at = now()
+    WHERE id IN (
+        SELECT id FROM suggestions WHERE status = 'APPROVED' AND source_type IS DISTINCT FROM 'GOOGLE_DRIVE'
+        ORDER BY created_at, id
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id
+""")
+
+async def claim_batch(db: AsyncSession, concurrency: Optional[int] = None) -> List[int]:
+    """Propozycje do przetworzenia: zawieszone (Worker padł w trakcie) i nowe zaakceptowane.
+
+    W toku jest najwyżej concurrency propozycji naraz (INGEST_CONCURRENCY), niezależnie od liczby Workerów.
+    """
+    concurrency = concurrency or config.settings.ingest_concurrency
+    result = await db.execute(_REQUEUE_STALE_SQL, {
+        "states": list(IN_PROGRESS),
+        "minutes": config.settings.ingest_stale_minutes,
+    })
+    stale = [row.id for row in result.all()]
+
+    active = await db.scalar(select(func.count(models.Suggestion.id)).where(models.Suggestion.status.in_(IN_PROGRESS)))
+    claimed = []
+    slots = concurrency - (active or 0)
+    if slots > 0:
+        result = await db.execute(_CLAIM_SQL, {"limit": slots})
+        claimed = [row.id for row in result.all()]
+    await db.commit()
+
+    if stale:
+        logger.warning(f"Requeued stale suggestions: {stale}")
+    return stale + claimed
+
+async def _transition(db: AsyncSession, suggestion_id: int, from_states: Sequence[str], status: str, **values) -> int:
+    """Warunkowa zmiana statusu (tylko z from_states) z commitem. Zwraca licznik prób"""
+    result = await db.execute(
+        update(models.Suggestion)
+        .where(models.Suggestion.id == suggestion_id, models.Suggestion.status.in_(from_states))
+        .values(status=status, **values)
+        .returning(models.Suggestion.ingest_attempts)
+        .execution_options(synchronize_session=False)
+    )
+    attempts = result.scalar_one_or_none()
+    await db.commit()
+    if attempts is None:
+        raise IngestCancelled()
+    return attempts
+
+async def _set_progress(db: AsyncSession, suggestion_id: int, status: str, progress: int):
+    result = await db.execute(
+        update(models.Suggestion)
+        .where(models.Suggestion.id == suggestion_id, models.Suggestion.status == status)
+        .values(ingest_progress=progress)
+        .returning(models.Suggestion.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = result.scalar_one_or_none()
+    await db.commit()
+    if updated is None:
+        raise IngestCancelled()
+
+def _source(suggestion: models.Suggestion) -> str:
+    """Co pobrać: film po youtube_id, wklejony link do filmu, a w pozostałych przypadkach wyszukiwanie"""
+    if suggestion.youtube_id:
+        return f"https://www.youtube.com/watch?v={suggestion.youtube_id}"
+    raw_input = (suggestion.raw_input or "").strip()
+    if is_youtube_url(raw_input) and not is_playlist_url(raw_input):
+        return raw_input
+    query = " - ".join(part for part in (suggestion.artist, suggestion.title) if part) or raw_input
+    if not query:
+        raise IngestFailed("Brak źródła do pobrania")
+    return f"ytsearch1:{query}"
+
+def _tags(suggestion: models.Suggestion) -> Dict[str, str]:
+    artist, title = split_artist_title(suggestion.title, suggestion.artist)
+    return {
+        "title": (title or suggestion.raw_input or "").strip(),
+        "artist": (artist or "").strip(),
+        "comment": f"OnlyYes suggestion #{suggestion.id}",
+    }
+
+def _file_name(suggestion_id: int, tags: Dict[str, str]) -> str:
+    slug = normalize(f"{tags['artist']} {tags['title']}").replace(" ", "-")[:80].strip("-")
+    return f"{suggestion_id}-{slug or 'audio'}.mp3"
+
+def _downloaded(work_dir: str) -> Optional[str]:
+    """Źródło pobrane w poprzedniej próbie (bez niedokończonych .part)"""
+    for path in glob.glob(os.path.join(work_dir, "source.*")):
+        if not path.endswith((".part", ".ytdl")):
+            return path
+    return None
+
+def transcode(source: str, target: str, tags: Dict[str, str], bitrate: str, filters: Optional[List[str]] = None):
+    """MP3 stereo 44,1 kHz z tagami ID3 (i filtrami audio); zapis do pliku tymczasowego i atomowa podmiana"""
+    partial = f"{target}.partial"
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", source,
+        "-vn", "-map_metadata", "-1",
+    ]
+    if filters:
+        command += ["-af", ",".join(filters)]
+    command += [
+        "-ac", "2", "-ar", "44100",
+        "-c:a", "libmp3lame", "-b:a", bitrate,
+        "-id3v2_version", "3",
+    ]
+    for key, value in tags.items():
+        if value:
+            command += ["-metadata", f"{key}={value}"]
+    command += ["-f", "mp3", partial]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors="replace").strip()[-500:] if e.stderr else ""
+        raise RuntimeError(f"ffmpeg exited with {e.returncode}: {stderr}") from e
+    os.replace(partial, target)
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def retry_delay(attempts: int) -> float:
+    """Wykładnicze opóźnienie kolejnej próby: INGEST_RETRY_DELAY, x2, x4..."""
+    return config.settings.ingest_retry_delay * 2 ** max(attempts - 1, 0)
+
+async def _run_pipeline(db: AsyncSession, suggestion: models.Suggestion, work_dir: str) -> str:
+    settings = config.settings
+    suggestion_id = suggestion.id
+    tags = _tags(suggestion)
+    target = os.path.join(work_dir, _file_name(suggestion_id, tags))
+    remote_path = f"{settings.azuracast_upload_dir.strip('/')}/{os.path.basename(target)}"
+
+    # Pliki z poprzedniej próby zostają w audio_temp - ponowienie zaczyna od brakującego etapu
+    if not os.path.exists(target):
+        source = _downloaded(work_dir)
+        if source is None:
+            if suggestion.duration_seconds and suggestion.duration_seconds > settings.ingest_max_duration:
+                raise IngestFailed(f"Utwór dłuższy niż {settings.ingest_max_duration} s")
+            try:
+                downloaded = await asyncio.to_thread(download_audio, _source(suggestion), work_dir, settings.ingest_max_duration)
+            except ValueError as e:
+                raise IngestFailed(str(e)) from e
+            source = downloaded["path"]
+
+        await _transition(db, suggestion_id, ("DOWNLOADING",), "ANALYZING", ingest_progress=PROGRESS["ANALYZING"])
+        try:
+            # Analiza źródła, a normalizacja i przycięcie w tym samym kodowaniu co transkodowanie.
+            # Odcisk audio równolegle - osobny proces ffmpeg na drugim rdzeniu
+            analysis, (words, _) = await asyncio.gather(
+                asyncio.to_thread(analyze_file, source, settings.ingest_silence_threshold_db, settings.ingest_silence_min_duration),
+                asyncio.to_thread(fingerprint_file, source),
+            )
+            duplicate = await fingerprint_index.match(db, words, exclude_suggestion_id=suggestion_id)
+            if duplicate:
+                raise IngestDuplicate(duplicate)
+            with open(os.path.join(work_dir, FINGERPRINT_FILE), "wb") as fingerprint:
+                fingerprint.write(to_bytes(words))
+            filters, gain = processing_filters(
+                analysis,
+                normalize=settings.ingest_normalize,
+                target_lufs=settings.ingest_target_lufs,
+                max_true_peak=settings.ingest_max_true_peak,
+                trim=settings.ingest_trim_silence,
+            )
+            logger.info(
+                f"Suggestion {suggestion_id} analysis: {analysis['integrated_lufs']} LUFS, "
+                f"peak {analysis['true_peak_dbtp']} dBTP, silence {analysis['leading_silence']}s/{analysis['trailing_silence']}s, "
+                f"{analysis['elapsed_ms']} ms ({analysis['realtime_factor']}x realtime)"
+            )
+            await _transition(
+                db, suggestion_id, ("ANALYZING",), "TRANSCODING",
+                ingest_progress=PROGRESS["TRANSCODING"],
+                loudness_lufs=analysis["integrated_lufs"],
+                true_peak_dbtp=analysis["true_peak_dbtp"],
+                leading_silence=analysis["leading_silence"],
+                trailing_silence=analysis["trailing_silence"],
+                gain_db=gain,
+                analysis_ms=analysis["elapsed_ms"],
+            )
+            await asyncio.to_thread(transcode, source, target, tags, settings.ingest_bitrate, filters)
+        except (IngestCancelled, IngestDuplicate):
+            raise
+        except Exception:
+            # Uszkodzone źródło - następna próba pobierze je od nowa
+            os.remove(source)
+            raise
+        from_state = "TRANSCODING"
+    else:
+        from_state = "DOWNLOADING"
+
+    await _transition(db, suggestion_id, (from_state,), "UPLOADING", ingest_progress=PROGRESS["UPLOADING"])
+
+    # Idempotencja: ścieżka zawiera id propozycji, a flowIdentifier skrót treści - ponowienie po
+    # udanym wysłaniu nie tworzy duplikatu, a po przerwanym nadpisuje te same kawałki
+    if await azuracast_client.file_exists(remote_path):
+        logger.info(f"Suggestion {suggestion_id}: {remote_path} already uploaded")
+        return remote_path
+
+    digest = await asyncio.to_thread(file_digest, target)
+
+    async def on_progress(sent: int, total: int):
+        span = PROGRESS["PROCESSED"] - PROGRESS["UPLOADING"]
+        await _set_progress(db, suggestion_id, "UPLOADING", PROGRESS["UPLOADING"] + span * sent // max(total, 1))
+
+    await azuracast_client.upload_file(
+        target,
+        remote_path,
+        identifier=f"suggestion-{suggestion_id}-{digest[:16]}",
+        chunk_size=settings.ingest_upload_chunk_size,
+        timeout=settings.ingest_upload_timeout,
+        on_progress=on_progress,
+    )
+    return remote_path
+
+async def _index_fingerprint(db: AsyncSession, suggestion: models.Suggestion, work_dir: str, remote_path: str):
+    """Odcisk wgranego pliku do indeksu duplikatów; błąd nie cofa już zakończonej wysyłki"""
+    path = os.path.join(work_dir, FINGERPRINT_FILE)
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "rb") as fingerprint:
+            words = from_bytes(fingerprint.read())
+        tags = _tags(suggestion)
+        await store_fingerprint(
+            db, words, round(len(words) / FRAMES_PER_SECOND, 2), remote_path,
+            suggestion_id=suggestion.id, title=tags["title"], artist=tags["artist"],
+        )
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Suggestion {suggestion.id}: storing fingerprint failed: {e}", exc_info=True)
+
+async def ingest_suggestion(db: AsyncSession, suggestion_id: int) -> Dict[str, Any]:
+    """Przetwarza jedną propozycję w stanie QUEUED: pobranie (yt-dlp), analiza głośności i ciszy, transkodowanie i tagi (ffmpeg), wysyłka do AzuraCast.
+
+    Zwraca {"status": "processed" | "retry" | "failed" | "duplicate" | "cancelled" | "skipped", ...};
+    przy "retry" także "delay" - po ilu sekundach ponowić.
+    """
+    settings = config.settings
+    suggestion = await db.get(models.Suggestion, suggestion_id)
+    if suggestion is None or suggestion.status != "QUEUED":
+        return {"status": "skipped", "id": suggestion_id}
+
+    work_dir = os.path.join(settings.audio_temp_dir, "suggestions", str(suggestion_id))
+    os.makedirs(work_dir, exist_ok=True)
+
+    attempts = 0
+    try:
+        attempts = await _transition(
+            db, suggestion_id, ("QUEUED",), "DOWNLOADING",
+            ingest_attempts=models.Suggestion.ingest_attempts + 1,
+            ingest_progress=PROGRESS["DOWNLOADING"],
+        )
+        remote_path = await _run_pipeline(db, suggestion, work_dir)
+        await _transition(
+            db, suggestion_id, ("UPLOADING",), "PROCESSED",
+            ingest_progress=PROGRESS["PROCESSED"], ingest_error=None, azuracast_path=remote_path,
+        )
+    except IngestCancelled:
+        logger.info(f"Suggestion {suggestion_id}: status changed during ingestion, stopping")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return {"status": "cancelled", "id": suggestion_id}
+    except IngestDuplicate as e:
+        logger.info(f"Suggestion {suggestion_id}: {e}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+        try:
+            await _transition(db, suggestion_id, IN_PROGRESS, "DUPLICATE", ingest_progress=None, ingest_error=str(e))
+        except IngestCancelled:
+            return {"status": "cancelled", "id": suggestion_id}
+        return {"status": "duplicate", "id": suggestion_id, "match": e.match}
+    except Exception as e:
+        await db.rollback()
+        permanent = isinstance(e, IngestFailed) or attempts >= settings.ingest_max_attempts
+        status = "FAILED" if permanent else "QUEUED"
+        logger.error(f"Suggestion {suggestion_id} ingestion error (attempt {attempts}, -> {status}): {e}", exc_info=not isinstance(e, IngestFailed))
+        try:
+            await _transition(db, suggestion_id, IN_PROGRESS, status, ingest_error=str(e)[:1000])
+        except IngestCancelled:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return {"status": "cancelled", "id": suggestion_id}
+        if permanent:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return {"status": "failed", "id": suggestion_id, "error": str(e)}
+        return {"status": "retry", "id": suggestion_id, "delay": retry_delay(attempts)}
+
+    await _index_fingerprint(db, suggestion, work_dir, remote_path)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    logger.info(f"Suggestion {suggestion_id} ingested as {remote_path} (attempt {attempts})")
+    return {"status": "processed", "id": suggestion_id, "path": remote_path}
+
+async def ingestion_stats(db: AsyncSession, hours: int = 24) -> Dict[str, Any]:
+    """Liczby propozycji w kolejnych stanach i czasy analizy audio z ostatnich hours godzin"""
+    result = await db.execute(
+        select(models.Suggestion.status, func.count(models.Suggestion.id))
+        .where(models.Suggestion.status.in_(IN_PROGRESS + FINISHED))
+        .group_by(models.Suggestion.status)
+    )
+    counts = {status: count for status, count in result.all()}
+
+    analyzed = models.Suggestion.analysis_ms.isnot(None)
+    timing = (await db.execute(
+        select(
+            func.count(models.Suggestion.id),
+            func.avg(models.Suggestion.analysis_ms),
+            func.max(models.Suggestion.analysis_ms),
+            func.percentile_cont(0.95).within_group(models.Suggestion.analysis_ms),
+        ).where(analyzed, models.Suggestion.updated_at >= func.now() - func.make_interval(0, 0, 0, 0, hours))
+    )).one()
+    return {
+        "counts": {status: counts.get(status, 0) for status in IN_PROGRESS + FINISHED},
+        "concurrency": config.settings.ingest_concurrency,
+        "analysis": {
+            "files": timing[0],
+            "avg_ms": round(float(timing[1]), 1) if timing[1] is not None else None,
+            "max_ms": timing[2],
+            "p95_ms": round(float(timing[3]), 1) if timing[3] is not None else None,
+            "hours": hours,
+        },
+    }
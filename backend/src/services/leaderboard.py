@@ -0,0 +1,276 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+import redis.asyncio as aioredis
+from sqlalchemy import select, func, desc, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("all", "week", "month")
+
+# Po nieudanej odbudowie kolejna próba nie wcześniej niż po tylu sekundach (w tym czasie fallback SQL)
+REBUILD_RETRY_SECONDS = 30
+
+KEY_PREFIX = "leaderboard:xp"
+
+# Klucze tygodniowe/miesięczne wygasają same po zakończeniu okresu (z zapasem)
+PERIOD_TTL = {
+    "week": 14 * 24 * 3600,
+    "month": 62 * 24 * 3600,
+}
+
+# Wynik w zbiorze = punkty * ID_SPACE + rozstrzygnięcie remisu (niższe id wyżej), tak jak ORDER BY score DESC, id
+# w fallbacku SQL - bez tego ZREVRANGE porządkuje remisy malejąco po napisie członka. Dokładne w double
+# dla id < 2^24 i wyników < 2^29.
+ID_SPACE = 2 ** 24
+
+def encode_score(score: int, user_id: int) -> int:
+    return score * ID_SPACE + (ID_SPACE - 1 - user_id % ID_SPACE)
+
+def decode_score(raw: float) -> int:
+    return int(raw) // ID_SPACE
+
+def period_start(period: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Początek bieżącego tygodnia (ISO, poniedziałek) lub miesiąca w UTC; None dla all"""
+    now = now or datetime.now(timezone.utc)
+    if period == "week":
+        monday = now.date() - timedelta(days=now.weekday())
+        return datetime(monday.year, monday.month, monday.day, tzinfo=timezone.utc)
+    if period == "month":
+        return datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    return None
+
+def period_key(period: str, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    if period == "week":
+        year, week, _ = now.isocalendar()
+        return f"{KEY_PREFIX}:week:{year}-W{week:02d}"
+    if period == "month":
+        return f"{KEY_PREFIX}:month:{now.year}-{now.month:02d}"
+    return KEY_PREFIX
+
+class Leaderboard:
+    """Ranking XP w sorted setach Redisa (all-time + bieżący tydzień i miesiąc).
+
+    Źródłem prawdy pozostaje Postgres (users.xp, xp_awards) - zbiory są odbudowywane
+    przy starcie i po każdej awarii Redisa, a do tego czasu odpowiada fallback SQL.
+    Użytkownicy z hide_activity nie trafiają do zbiorów.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._redis = None
+        self.dirty = True
+        self._retry_at = 0.0
+        self._rebuild_lock = asyncio.Lock()
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    async def rebuild(self, db: AsyncSession) -> bool:
+        """Odbudowuje wszystkie zbiory z Postgresa (podmiana atomowa przez RENAME)"""
+        try:
+            for period in PERIODS:
+                scores = await self._scores_from_db(db, period)
+                key = period_key(period)
+                tmp_key = f"{key}:rebuild"
+                pipe = self.redis.pipeline(transaction=True)
+                pipe.delete(tmp_key)
+                if scores:
+                    pipe.zadd(tmp_key, {str(user_id): encode_score(score, user_id) for user_id, score in scores})
+                    pipe.rename(tmp_key, key)
+                    if period in PERIOD_TTL:
+                        pipe.expire(key, PERIOD_TTL[period])
+                else:
+                    pipe.delete(key)
+                await pipe.execute()
+            self.dirty = False
+            logger.info("Leaderboard rebuilt from database")
+            return True
+        except Exception as e:
+            self.dirty = True
+            self._retry_at = time.monotonic() + REBUILD_RETRY_SECONDS
+            logger.error(f"Leaderboard rebuild failed, using SQL fallback: {e}")
+            return False
+
+    async def record_xp(self, user: models.User, amount: int, now: Optional[datetime] = None):
+        """Wywoływane po commicie zmiany XP użytkownika"""
+        if self.dirty or not amount or user.hide_activity:
+            return
+        now = now or datetime.now(timezone.utc)
+        member = str(user.id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.zadd(KEY_PREFIX, {member: encode_score(user.xp or 0, user.id)})
+            for period, ttl in PERIOD_TTL.items():
+                key = period_key(period, now)
+                # Nowy członek zaczyna od samego rozstrzygnięcia remisu, dalej tylko przyrosty punktów
+                pipe.zadd(key, {member: encode_score(0, user.id)}, nx=True)
+                pipe.zincrby(key, amount * ID_SPACE, member)
+                pipe.expire(key, ttl)
+            await pipe.execute()
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Leaderboard update failed for user {user.id}: {e}")
+
+    async def sync_user(self, db: AsyncSession, user: models.User):
+        """Ponowne wyliczenie wpisów użytkownika (np. po zmianie hide_activity)"""
+        if self.dirty:
+            return
+        member = str(user.id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            for period in PERIODS:
+                key = period_key(period)
+                if user.hide_activity:
+                    pipe.zrem(key, member)
+                    continue
+                score = user.xp or 0
+                if period != "all":
+                    score = await db.scalar(
+                        select(func.coalesce(func.sum(models.XpAward.xp_amount), 0)).where(
+                            models.XpAward.user_id == user.id,
+                            models.XpAward.created_at >= period_start(period)
+                        )
+                    )
+                # Ranking ogólny trzyma też użytkowników z 0 XP
+                if score or period == "all":
+                    pipe.zadd(key, {member: encode_score(score, user.id)})
+                else:
+                    pipe.zrem(key, member)
+            await pipe.execute()
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Leaderboard sync failed for user {user.id}: {e}")
+
+    async def remove_user(self, user_id: int):
+        if self.dirty:
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            for period in PERIODS:
+                pipe.zrem(period_key(period), str(user_id))
+            await pipe.execute()
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Leaderboard remove failed for user {user_id}: {e}")
+
+    async def _ready(self, db: AsyncSession) -> bool:
+        if not self.dirty:
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        async with self._rebuild_lock:
+            if self.dirty:
+                return await self.rebuild(db)
+        return True
+
+    async def top(self, db: AsyncSession, period: str = "all", limit: int = 100, offset: int = 0) -> List[Tuple[int, int]]:
+        """[(user_id, score)] od najwyższego wyniku"""
+        if await self._ready(db):
+            try:
+                entries = await self.redis.zrevrange(period_key(period), offset, offset + limit - 1, withscores=True)
+                return [(int(member), decode_score(score)) for member, score in entries]
+            except Exception as e:
+                self.dirty = True
+                logger.error(f"Leaderboard read failed, using SQL fallback: {e}")
+        return await self._top_from_db(db, period, limit, offset)
+
+    async def rank_of(self, db: AsyncSession, user: models.User, period: str = "all") -> Optional[Tuple[int, int]]:
+        """(pozycja od 1, wynik) użytkownika lub None, jeśli nie ma go w rankingu"""
+        if user.hide_activity:
+            return None
+        if await self._ready(db):
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.zrevrank(period_key(period), str(user.id))
+                pipe.zscore(period_key(period), str(user.id))
+                rank, score = await pipe.execute()
+                return (rank + 1, decode_score(score)) if rank is not None else None
+            except Exception as e:
+                self.dirty = True
+                logger.error(f"Leaderboard read failed, using SQL fallback: {e}")
+        return await self._rank_from_db(db, user, period)
+
+    async def around(self, db: AsyncSession, user: models.User, period: str = "all", radius: int = 5) -> Tuple[Optional[int], List[Tuple[int, int, int]]]:
+        """Pozycja użytkownika i sąsiedzi [(pozycja, user_id, wynik)] w promieniu radius"""
+        ranked = await self.rank_of(db, user, period)
+        if ranked is None:
+            return None, []
+        position = ranked[0]
+        offset = max(0, position - 1 - radius)
+        entries = await self.top(db, period, limit=2 * radius + 1, offset=offset)
+        return position, [(offset + idx + 1, user_id, score) for idx, (user_id, score) in enumerate(entries)]
+
+    async def _scores_from_db(self, db: AsyncSession, period: str) -> List[Tuple[int, int]]:
+        return await self._top_from_db(db, period, limit=None, offset=0)
+
+    def _period_query(self, period: str):
+        """(kolumna wyniku, zapytanie) dla danego okresu - tylko widoczni użytkownicy.
+
+        Ranking ogólny obejmuje wszystkich (także 0 XP), okresowe - tylko z XP zdobytym w okresie.
+        """
+        if period == "all":
+            score = func.coalesce(models.User.xp, 0)
+            query = select(models.User.id, score.label("score")).where(models.User.hide_activity == False)
+            return score, query
+
+        score = func.sum(models.XpAward.xp_amount)
+        query = (
+            select(models.XpAward.user_id, score.label("score"))
+            .join(models.User, models.User.id == models.XpAward.user_id)
+            .where(
+                models.User.hide_activity == False,
+                models.XpAward.created_at >= period_start(period)
+            )
+            .group_by(models.XpAward.user_id)
+            .having(score > 0)
+        )
+        return score, query
+
+    async def _top_from_db(self, db: AsyncSession, period: str, limit: Optional[int], offset: int) -> List[Tuple[int, int]]:
+        score, query = self._period_query(period)
+        id_column = models.User.id if period == "all" else models.XpAward.user_id
+        query = query.order_by(desc(score), id_column).offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await db.execute(query)
+        return [(row[0], int(row[1])) for row in result.all()]
+
+    async def _rank_from_db(self, db: AsyncSession, user: models.User, period: str) -> Optional[Tuple[int, int]]:
+        if period == "all":
+            xp = user.xp or 0
+            # Indeks ix_users_leaderboard (xp DESC, id) - liczenie wyprzedzających użytkowników
+            ahead = await db.scalar(
+                select(func.count(models.User.id)).where(
+                    models.User.hide_activity == False,
+                    or_(
+                        models.User.xp > xp,
+                        and_(func.coalesce(models.User.xp, 0) == xp, models.User.id < user.id)
+                    )
+                )
+            )
+            return (ahead or 0) + 1, xp
+
+        _, query = self._period_query(period)
+        scores = query.subquery()
+        own = await db.scalar(select(scores.c.score).where(scores.c.user_id == user.id))
+        if not own:
+            return None
+        ahead = await db.scalar(
+            select(func.count()).select_from(scores).where(
+                or_(scores.c.score > own, and_(scores.c.score == own, scores.c.user_id < user.id))
+            )
+        )
+        return (ahead or 0) + 1, int(own)
+
+leaderboard = Leaderboard(config.settings.redis_url)
@@ -0,0 +1,222 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Tuple
+import json
+import logging
+
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .ingestion import ACCEPTED_STATUSES, APPROVABLE_FROM
+from .leaderboard import leaderboard
+from .suggestion_queue import SUGGESTION_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Górny limit identyfikatorów w jednym żądaniu moderacji
+MAX_BULK_IDS = 500
+
+def issue_xp_reward(issue_type: str) -> int:
+    """XP za zaakceptowane zgłoszenie (jak w pojedynczym approve_issue)"""
+    return 50 if issue_type == "BUG" else 75
+
+# Statusy, z których wolno przejść do docelowego (akceptacja uruchamia przetwarzanie - services/ingestion.py)
+SUGGESTION_TRANSITIONS = {
+    "APPROVED": APPROVABLE_FROM,
+    "REJECTED": tuple(status for status in SUGGESTION_STATUSES if status != "REJECTED"),
+}
+
+# Zmiana statusu jednym poleceniem: target blokuje wiersze i pamięta poprzedni status,
+# changed aktualizuje tylko te, których status faktycznie się zmienia i pozwala na przejście
+_SUGGESTIONS_SQL = text("""
+    WITH target AS (
+        SELECT id, status FROM suggestions WHERE id = ANY(:ids) FOR UPDATE
+    ), changed AS (
+        UPDATE suggestions s SET status = :status, updated_at = now()
+        FROM target
+        WHERE s.id = target.id AND target.status IS DISTINCT FROM :status
+          AND target.status = ANY(:allowed_from)
+        RETURNING s.id, s.user_id
+    )
+    SELECT target.id, target.status AS previous_status, changed.user_id, changed.id IS NOT NULL AS updated
+    FROM target LEFT JOIN changed ON changed.id = target.id
+""")
+
+_ISSUES_SQL = text("""
+    WITH target AS (
+        SELECT id, status FROM issue_reports WHERE id = ANY(:ids) FOR UPDATE
+    ), changed AS (
+        UPDATE issue_reports i SET status = :status,
+            approved_at = CASE WHEN :approve THEN now() ELSE i.approved_at END
+        FROM target
+        WHERE i.id = target.id AND target.status IS DISTINCT FROM :status
+        RETURNING i.id, i.user_id, i.issue_type
+    )
+    SELECT target.id, target.status AS previous_status, changed.user_id, changed.issue_type, changed.id IS NOT NULL AS updated
+    FROM target LEFT JOIN changed ON changed.id = target.id
+""")
+
+_ADD_XP_SQL = text("""
+    UPDATE users SET xp = COALESCE(users.xp, 0) + v.amount
+    FROM unnest(CAST(:user_ids AS integer[]), CAST(:amounts AS integer[])) AS v(user_id, amount)
+    WHERE users.id = v.user_id
+""")
+
+def _unique(ids: Iterable[int]) -> List[int]:
+    return list(dict.fromkeys(ids))
+
+def _badge_config(badge: models.Badge) -> dict:
+    try:
+        return json.loads(badge.auto_award_config) if badge.auto_award_config else {}
+    except ValueError:
+        return {}
+
+async def _approved_counts(db: AsyncSession, badge_type: str, user_ids: List[int]) -> Dict[int, int]:
+    """Liczniki z warunków odznak PLAYLIST_CONTRIBUTOR / BUG_REPORTS / FEATURE_REQUESTS, jedno zapytanie GROUP BY"""
+    if badge_type == "PLAYLIST_CONTRIBUTOR":
+        query = (
+            select(models.Suggestion.user_id, func.count(models.Suggestion.id))
+            .where(models.Suggestion.user_id.in_(user_ids), models.Suggestion.status.in_(ACCEPTED_STATUSES))
+            .group_by(models.Suggestion.user_id)
+        )
+    else:
+        issue_type = "BUG" if badge_type == "BUG_REPORTS" else "FEATURE"
+        query = (
+            select(models.IssueReport.user_id, func.count(models.IssueReport.id))
+            .where(
+                models.IssueReport.user_id.in_(user_ids),
+                models.IssueReport.issue_type == issue_type,
+                models.IssueReport.status == "APPROVED"
+            )
+            .group_by(models.IssueReport.user_id)
+        )
+    result = await db.execute(query)
+    return {user_id: count for user_id, count in result.all()}
+
+async def _award_count_badges(db: AsyncSession, badge_type: str, user_ids: List[int]) -> List[Tuple[int, models.Badge]]:
+    """Zbiorcza wersja _check_and_award_badges_internal dla odznak liczonych z zatwierdzeń.
+
+    Dodaje UserBadge (bez commita) i zwraca [(user_id, badge)] nowo przyznanych odznak.
+    """
+    if not user_ids:
+        return []
+    result = await db.execute(select(models.Badge).where(models.Badge.auto_award_type == badge_type))
+    badges = result.scalars().all()
+    if not badges:
+        return []
+
+    owned = await db.execute(
+        select(models.UserBadge.user_id, models.UserBadge.badge_id).where(
+            models.UserBadge.user_id.in_(user_ids),
+            models.UserBadge.badge_id.in_([badge.id for badge in badges])
+        )
+    )
+    owned = set(owned.all())
+    counts = await _approved_counts(db, badge_type, user_ids)
+
+    awarded = []
+    for badge in badges:
+        # PLAYLIST_CONTRIBUTOR: pierwsza zaakceptowana propozycja; pozostałe: próg "count" z konfiguracji
+        required = 1 if badge_type == "PLAYLIST_CONTRIBUTOR" else max(_badge_config(badge).get("count", 0), 1)
+        for user_id in user_ids:
+            if (user_id, badge.id) in owned or counts.get(user_id, 0) < required:
+                continue
+            db.add(models.UserBadge(user_id=user_id, badge_id=badge.id, awarded_by=None))
+            awarded.append((user_id, badge))
+    return awarded
+
+async def _apply_rewards(db: AsyncSession, awards: List[Tuple[int, int, str]]) -> Dict[int, int]:
+    """Nagrody XP [(user_id, xp, award_type)]: wpisy xp_awards i jeden UPDATE users. Zwraca XP per użytkownik"""
+    totals: Dict[int, int] = defaultdict(int)
+    for user_id, amount, award_type in awards:
+        if amount and amount > 0:
+            db.add(models.XpAward(user_id=user_id, song_id=None, xp_amount=amount, award_type=award_type))
+            totals[user_id] += amount
+    if totals:
+        await db.execute(_ADD_XP_SQL, {"user_ids": list(totals), "amounts": list(totals.values())})
+    return dict(totals)
+
+async def _sync_leaderboard(db: AsyncSession, totals: Dict[int, int]):
+    if not totals:
+        return
+    # XP zmienione UPDATE-em z pominięciem ORM - odświeżamy obiekty już obecne w sesji
+    result = await db.execute(
+        select(models.User).where(models.User.id.in_(list(totals))).execution_options(populate_existing=True)
+    )
+    for user in result.scalars().all():
+        await leaderboard.record_xp(user, totals[user.id])
+
+def _result(item_id: int, row, status: str) -> Dict[str, Any]:
+    if row is None:
+        return {"id": item_id, "result": "not_found"}
+    if row.updated:
+        result = "updated"
+    elif row.previous_status == status:
+        result = "unchanged"
+    else:
+        # Przejście niedozwolone z bieżącego statusu (np. akceptacja propozycji już przetworzonej)
+        result = "skipped"
+    return {
+        "id": item_id,
+        "result": result,
+        "previous_status": row.previous_status,
+        "status": status,
+    }
+
+def _badge_summary(awarded: List[Tuple[int, models.Badge]]) -> List[Dict[str, Any]]:
+    return [{"user_id": user_id, "badge_id": badge.id, "badge_name": badge.name} for user_id, badge in awarded]
+
+async def moderate_suggestions(db: AsyncSession, ids: Iterable[int], status: str) -> Dict[str, Any]:
+    """Zmiana statusu wielu propozycji w jednej transakcji + odznaki PLAYLIST_CONTRIBUTOR dla autorów"""
+    ids = _unique(ids)
+    result = await db.execute(_SUGGESTIONS_SQL, {
+        "ids": ids,
+        "status": status,
+        "allowed_from": list(SUGGESTION_TRANSITIONS[status]),
+    })
+    rows = {row.id: row for row in result.all()}
+
+    authors = _unique(row.user_id for row in rows.values() if row.updated and row.user_id)
+    awarded = await _award_count_badges(db, "PLAYLIST_CONTRIBUTOR", authors) if status == "APPROVED" else []
+    totals = await _apply_rewards(db, [(user_id, badge.xp_reward, "BADGE") for user_id, badge in awarded])
+    await db.commit()
+    await _sync_leaderboard(db, totals)
+
+    results = [_result(item_id, rows.get(item_id), status) for item_id in ids]
+    return {
+        "updated": sum(1 for item in results if item["result"] == "updated"),
+        "skipped": sum(1 for item in results if item["result"] == "skipped"),
+        "results": results,
+        "badges_awarded": _badge_summary(awarded),
+    }
+
+async def moderate_issues(db: AsyncSession, ids: Iterable[int], status: str) -> Dict[str, Any]:
+    """Zmiana statusu wielu zgłoszeń; przy akceptacji XP za zgłoszenie i odznaki BUG_REPORTS / FEATURE_REQUESTS"""
+    ids = _unique(ids)
+    approve = status == "APPROVED"
+    result = await db.execute(_ISSUES_SQL, {"ids": ids, "status": status, "approve": approve})
+    rows = {row.id: row for row in result.all()}
+
+    # Nagradzane tylko przejścia do APPROVED (updated gwarantuje inny poprzedni status)
+    approved = [row for row in rows.values() if approve and row.updated and row.user_id]
+    rewards = [(row.user_id, issue_xp_reward(row.issue_type), "ISSUE_REPORT") for row in approved]
+    awarded = []
+    for badge_type, is_bug in (("BUG_REPORTS", True), ("FEATURE_REQUESTS", False)):
+        reporters = _unique(row.user_id for row in approved if (row.issue_type == "BUG") == is_bug)
+        awarded += await _award_count_badges(db, badge_type, reporters)
+    totals = await _apply_rewards(db, rewards + [(user_id, badge.xp_reward, "BADGE") for user_id, badge in awarded])
+    await db.commit()
+    await _sync_leaderboard(db, totals)
+
+    rewarded = {row.id: issue_xp_reward(row.issue_type) for row in approved}
+    results = []
+    for item_id in ids:
+        item = _result(item_id, rows.get(item_id), status)
+        if item_id in rewarded:
+            item["xp_awarded"] = rewarded[item_id]
+        results.append(item)
+    return {
+        "updated": sum(1 for item in results if item["result"] == "updated"),
+        "results": results,
+        "badges_awarded": _badge_summary(awarded),
+    }
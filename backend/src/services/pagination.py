@@ -0,0 +1,27 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional
+
+def encode_cursor(*parts: Any) -> str:
+    """Koduje klucz paginacji (np. created_at, id) do nieprzezroczystego tokena"""
+    values = [part.isoformat() if isinstance(part, datetime) else part for part in parts]
+    raw = json.dumps(values, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Dekoduje token z encode_cursor. Zwraca None dla pustego lub uszkodzonego tokena"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return values if isinstance(values, list) else None
+    except (ValueError, TypeError):
+        return None
+
+def parse_datetime(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if isinstance(value, str) else None
+    except ValueError:
+        return None
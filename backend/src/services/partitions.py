@@ -0,0 +1,144 @@
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+import logging
+
+from sqlalchemy import text
+
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+# Tabele dzielone miesięcznie po created_at -> ile miesięcy trzymać (0 = bez archiwizacji)
+PARTITIONED_TABLES = {
+    "votes": lambda: config.settings.votes_retention_months,
+    "xp_awards": lambda: config.settings.xp_awards_retention_months,
+}
+
+# Odłączone partycje trafiają do osobnego schematu (można je zrzucić pg_dump i usunąć)
+ARCHIVE_SCHEMA = "archive"
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def _add_months(value: date, months: int) -> date:
+    month_index = value.year * 12 + value.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+def _partition_month(table: str, name: str) -> Optional[date]:
+    """Miesiąc partycji z nazwy {table}_pYYYYMM (None dla partycji domyślnej)"""
+    suffix = name[len(table) + 2:]
+    if not name.startswith(f"{table}_p") or len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return date(int(suffix[:4]), int(suffix[4:]), 1)
+
+async def is_partitioned(conn, table: str) -> bool:
+    result = await conn.execute(text("""
+        SELECT c.relkind = 'p' FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :table AND n.nspname = current_schema()
+    """), {"table": table})
+    return bool(result.scalar())
+
+async def list_partitions(conn, table: str) -> List[str]:
+    result = await conn.execute(text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        WHERE parent.relname = :table AND n.nspname = current_schema()
+        ORDER BY child.relname
+    """), {"table": table})
+    return [row[0] for row in result.all()]
+
+async def ensure_partitions(conn, table: str, months_ahead: Optional[int] = None, since: Optional[date] = None) -> int:
+    """Tworzy brakujące partycje miesięczne od since (domyślnie bieżący miesiąc) do months_ahead do przodu"""
+    months_ahead = months_ahead if months_ahead is not None else config.settings.partition_months_ahead
+    today = datetime.now(timezone.utc).date()
+    month = _month_start(since or today)
+    last = _add_months(_month_start(today), months_ahead)
+
+    existing = set(await list_partitions(conn, table))
+    created = 0
+    while month <= last:
+        name = partition_name(table, month)
+        if name not in existing:
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00+00')"
+            ))
+            created += 1
+        month = _add_months(month, 1)
+
+    if f"{table}_default" not in existing:
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+
+    if created:
+        logger.info(f"Created {created} monthly partitions for {table}")
+    return created
+
+async def convert_to_partitioned(conn, table: str):
+    """Jednorazowa migracja zwykłej tabeli na tabelę partycjonowaną miesięcznie po created_at.
+
+    PK staje się (id, created_at) - Postgres wymaga klucza partycjonowania w PK.
+    Sekwencja id zostaje ta sama, więc identyfikatory w ORM się nie zmieniają.
+    """
+    legacy = f"{table}_legacy"
+    sequence = (await conn.execute(text(f"SELECT pg_get_serial_sequence('{table}', 'id')"))).scalar()
+
+    await conn.execute(text(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL"))
+    await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    if sequence:
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+    await conn.execute(text(f"""
+        CREATE TABLE {table} (
+            LIKE {legacy} INCLUDING DEFAULTS EXCLUDING INDEXES,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        ) PARTITION BY RANGE (created_at)
+    """))
+    if sequence:
+        await conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+
+    oldest = (await conn.execute(text(f"SELECT MIN(created_at) FROM {legacy}"))).scalar()
+    await ensure_partitions(conn, table, since=oldest.date() if oldest else None)
+
+    await conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+    await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_id ON {table}(id)"))
+    logger.info(f"Converted {table} to monthly range partitions")
+
+async def detach_old_partitions(conn, table: str, keep_months: int) -> List[str]:
+    """Odłącza partycje starsze niż keep_months i przenosi je do schematu archiwum"""
+    if not keep_months or keep_months <= 0:
+        return []
+
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -keep_months)
+    detached = []
+    for name in await list_partitions(conn, table):
+        month = _partition_month(table, name)
+        if month is None or _add_months(month, 1) > cutoff:
+            continue
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        detached.append(name)
+
+    if detached:
+        logger.info(f"Archived {len(detached)} partitions of {table}: {', '.join(detached)}")
+    return detached
+
+async def maintain_partitions(conn) -> Dict[str, Dict[str, object]]:
+    """Partycje na kolejne miesiące + archiwizacja starych (wywoływane z Celery beat)"""
+    report = {}
+    for table, retention in PARTITIONED_TABLES.items():
+        if not await is_partitioned(conn, table):
+            continue
+        report[table] = {
+            "created": await ensure_partitions(conn, table),
+            "archived": await detach_old_partitions(conn, table, retention()),
+        }
+    return report
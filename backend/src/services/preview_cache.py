@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from .. import config
+from .youtube import is_youtube_url, is_spotify_url, is_playlist_url, extract_youtube_id
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "preview:v1"
+
+def cache_key(input_str: str) -> Tuple[str, str]:
+    """(rodzaj, klucz) dla wejścia podglądu: id filmu, id playlisty albo znormalizowane zapytanie"""
+    value = input_str.strip()
+    if is_youtube_url(value):
+        if is_playlist_url(value):
+            match = re.search(r'[?&]list=([^&#]+)', value)
+            return "playlist", f"playlist:{match.group(1) if match else value}"
+        video_id = extract_youtube_id(value)
+        return "video", f"video:{video_id or value}"
+    if is_spotify_url(value):
+        match = re.search(r'spotify\.com/(?:intl-[a-z]+/)?(track|album|playlist)/([A-Za-z0-9]+)', value, re.IGNORECASE)
+        return "search", f"spotify:{match.group(1).lower()}:{match.group(2)}" if match else f"spotify:{value}"
+    return "search", "search:" + " ".join(value.lower().split())
+
+class PreviewCache:
+    """Cache wyników podglądu: LRU w procesie przed Redisem (współdzielonym przez instancje).
+
+    Błędy ekstrakcji (type == "error") trafiają do cache z krótkim TTL, żeby popularny
+    zły link nie uruchamiał yt-dlp przy każdym wklejeniu. Równoległe żądania o ten sam
+    klucz czekają na jedną ekstrakcję.
+    """
+
+    def __init__(self, redis_url: str, size: int, ttls: Dict[str, float], negative_ttl: float):
+        self.redis_url = redis_url
+        self.size = size
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self._redis = None
+        self._local: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = {"local": 0, "redis": 0}
+        self.misses = 0
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    def _ttl(self, kind: str, result: Dict) -> float:
+        return self.negative_ttl if result.get("type") == "error" else self.ttls.get(kind, self.negative_ttl)
+
+    def _local_get(self, key: str) -> Optional[Dict]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return result
+
+    def _local_set(self, key: str, result: Dict, ttl: float):
+        self._local[key] = (time.monotonic() + ttl, result)
+        self._local.move_to_end(key)
+        while len(self._local) > self.size:
+            self._local.popitem(last=False)
+
+    async def _redis_get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.get(f"{KEY_PREFIX}:{key}")
+            pipe.ttl(f"{KEY_PREFIX}:{key}")
+            raw, ttl = await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Preview cache read failed: {e}")
+            return None
+        if not raw:
+            return None
+        return json.loads(raw), max(ttl or 0, 1)
+
+    async def _redis_set(self, key: str, result: Dict, ttl: float):
+        try:
+            await self.redis.set(f"{KEY_PREFIX}:{key}", json.dumps(result), ex=max(int(ttl), 1))
+        except Exception as e:
+            logger.warning(f"Preview cache write failed: {e}")
+
+    async def _cached(self, key: str) -> Optional[Dict]:
+        result = self._local_get(key)
+        if result is not None:
+            self.hits["local"] += 1
+            return result
+        cached = await self._redis_get(key)
+        if cached is None:
+            return None
+        result, ttl = cached
+        self.hits["redis"] += 1
+        self._local_set(key, result, ttl)
+        return result
+
+    async def _store(self, kind: str, key: str, result: Dict):
+        ttl = self._ttl(kind, result)
+        self._local_set(key, result, ttl)
+        await self._redis_set(key, result, ttl)
+
+    async def _load(self, kind: str, key: str, loader: Callable[[], Awaitable[Dict]]) -> Dict:
+        result = await self._cached(key)
+        if result is not None:
+            return result
+        self.misses += 1
+        result = await loader()
+        await self._store(kind, key, result)
+        return result
+
+    async def lookup(self, input_str: str) -> Optional[Dict]:
+        """Sam odczyt z cache (bez ekstrakcji) - np. dla podglądu strumieniowego"""
+        _, key = cache_key(input_str)
+        result = await self._cached(key)
+        if result is None:
+            self.misses += 1
+        return result
+
+    async def store(self, input_str: str, result: Dict):
+        kind, key = cache_key(input_str)
+        await self._store(kind, key, result)
+
+    async def get_or_load(self, input_str: str, loader: Callable[[], Awaitable[Dict]]) -> Dict:
+        kind, key = cache_key(input_str)
+        result = self._local_get(key)
+        if result is not None:
+            self.hits["local"] += 1
+            return result
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._load(kind, key, loader))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Oznacza wyjątek jako odebrany, gdy wszyscy oczekujący zrezygnowali
+        if not task.cancelled():
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "local_entries": len(self._local),
+            "local_hits": self.hits["local"],
+            "redis_hits": self.hits["redis"],
+            "misses": self.misses,
+        }
+
+preview_cache = PreviewCache(
+    config.settings.redis_url,
+    size=config.settings.preview_cache_size,
+    ttls={
+        "video": config.settings.preview_cache_ttl,
+        "search": config.settings.preview_cache_ttl,
+        "playlist": config.settings.preview_playlist_cache_ttl,
+    },
+    negative_ttl=config.settings.preview_negative_cache_ttl,
+)
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from .. import config
+from .preview_cache import preview_cache
+from .youtube import preview_content
+
+logger = logging.getLogger(__name__)
+
+# Znacznik końca strumienia z wątku puli
+_END = object()
+
+class PreviewPoolBusy(Exception):
+    """Kolejka podglądów pełna - żądanie odrzucone od razu"""
+
+class PreviewTimeout(Exception):
+    """Podgląd nie zmieścił się w limicie czasu (oczekiwanie w kolejce + ekstrakcja)"""
+
+class PreviewPool:
+    """Pula wątków dla yt-dlp (blokujące I/O sieciowe), poza pętlą zdarzeń.
+
+    Semafor ogranicza liczbę równoległych ekstrakcji, a slot zwalnia się dopiero po faktycznym
+    zakończeniu wątku - przekroczony timeout nie zwiększa więc realnej współbieżności.
+    Oczekujących w kolejce jest najwyżej max_queue, kolejni dostają od razu PreviewPoolBusy.
+    """
+
+    def __init__(self, workers: int, max_queue: int, timeout: float):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preview")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+        self._stats = {"completed": 0, "failed": 0, "timed_out": 0, "rejected": 0}
+        self._wait_total = 0.0
+        self._run_total = 0.0
+        self._started = 0
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        # Semafor tworzony w działającej pętli (moduł importowany przed jej startem)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    def _finished(self, future: asyncio.Future, started_at: float):
+        self._running -= 1
+        self.slots.release()
+        self._run_total += time.monotonic() - started_at
+        if future.cancelled() or future.exception() is not None:
+            self._stats["failed"] += 1
+        else:
+            self._stats["completed"] += 1
+
+    async def _acquire(self, loop: asyncio.AbstractEventLoop, deadline: float):
+        if self._waiting >= self.max_queue and self.slots.locked():
+            self._stats["rejected"] += 1
+            raise PreviewPoolBusy()
+
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self.slots.acquire(), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self._stats["timed_out"] += 1
+            raise PreviewTimeout()
+        finally:
+            self._waiting -= 1
+        self._wait_total += time.monotonic() - queued_at
+
+    def _submit(self, loop: asyncio.AbstractEventLoop, func: Callable[..., Any], *args) -> asyncio.Future:
+        started_at = time.monotonic()
+        self._started += 1
+        self._running += 1
+        future = loop.run_in_executor(self._executor, func, *args)
+        future.add_done_callback(lambda done: self._finished(done, started_at))
+        return future
+
+    async def run(self, func: Callable[..., Any], *args, timeout: Optional[float] = None) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+        await self._acquire(loop, deadline)
+        future = self._submit(loop, func, *args)
+        try:
+            # shield: anulowanie żądania (timeout, rozłączony klient) nie przerywa wątku, tylko przestaje czekać
+            return await asyncio.wait_for(asyncio.shield(future), max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            self._stats["timed_out"] += 1
+            raise PreviewTimeout()
+
+    async def stream(self, func: Callable[..., Iterator[Any]], *args, max_batch: int = 25, timeout: Optional[float] = None) -> AsyncIterator[List[Any]]:
+        """Wyniki generatora func(*args) z wątku puli, paczkami tego, co zdążyło spłynąć.
+
+        Pierwsza paczka wychodzi od razu po pierwszym elemencie. timeout liczy się między
+        kolejnymi elementami. Zamknięcie iteratora (np. rozłączony klient) zatrzymuje wątek
+        przy następnym elemencie.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = timeout or self.timeout
+        await self._acquire(loop, loop.time() + timeout)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+
+        def put(message):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                stopped.set()  # pętla zamknięta
+
+        def produce():
+            try:
+                for item in func(*args):
+                    if stopped.is_set():
+                        return
+                    put((item, None))
+            except Exception as e:
+                put((_END, e))
+                raise
+            put((_END, None))
+
+        self._submit(loop, produce)
+        try:
+            while True:
+                try:
+                    item, error = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    self._stats["timed_out"] += 1
+                    raise PreviewTimeout()
+                batch = []
+                while item is not _END:
+                    batch.append(item)
+                    if len(batch) >= max_batch or queue.empty():
+                        break
+                    item, error = queue.get_nowait()
+                if batch:
+                    yield batch
+                if item is _END:
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            stopped.set()
+
+    def metrics(self) -> Dict[str, Any]:
+        finished = self._stats["completed"] + self._stats["failed"]
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "queued": self._waiting,
+            "max_queue": self.max_queue,
+            "timeout_seconds": self.timeout,
+            **self._stats,
+            "avg_wait_ms": round(self._wait_total / self._started * 1000, 1) if self._started else 0.0,
+            "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+preview_pool = PreviewPool(
+    workers=config.settings.preview_workers,
+    max_queue=config.settings.preview_queue_size,
+    timeout=config.settings.preview_timeout,
+)
+
+async def run_preview(input_str: str) -> Dict:
+    """Asynchroniczny odpowiednik youtube.preview_content: cache, a przy chybieniu ekstrakcja w puli"""
+    return await preview_cache.get_or_load(input_str, lambda: preview_pool.run(preview_content, input_str))
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import text, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+# Okno, w którym ta sama propozycja użytkownika liczy się jako duplikat
+DUPLICATE_WINDOW_DAYS = 30
+
+# Jedno zapytanie na całą listę: gałąź youtube_id (indeks ix_suggestions_user_youtube)
+# i gałąź raw_input dla pozycji bez youtube_id; DISTINCT ON zostawia najnowszą propozycję dla klucza
+_DUPLICATES_SQL = text("""
+    SELECT DISTINCT ON (kind, match_key) kind, match_key, id, status, created_at
+    FROM (
+        SELECT 'youtube' AS kind, youtube_id AS match_key, id, status, created_at
+        FROM suggestions
+        WHERE user_id = :user_id AND created_at >= :cutoff AND youtube_id = ANY(:youtube_ids)
+        UNION ALL
+        SELECT 'input' AS kind, raw_input AS match_key, id, status, created_at
+        FROM suggestions
+        WHERE user_id = :user_id AND created_at >= :cutoff AND raw_input = ANY(:raw_inputs)
+    ) matches
+    ORDER BY kind, match_key, created_at DESC, id DESC
+""")
+
+def duplicate_key(youtube_id: Optional[str], raw_input: Optional[str]) -> Optional[str]:
+    """Klucz pozycji w wyniku find_duplicates: youtube_id, a bez niego raw_input"""
+    return youtube_id or raw_input or None
+
+async def find_duplicates(db: AsyncSession, user_id: int, items: Iterable[Tuple[Optional[str], Optional[str]]]) -> Dict[str, Dict[str, Any]]:
+    """Istniejące propozycje użytkownika dla par (youtube_id, raw_input) z ostatnich DUPLICATE_WINDOW_DAYS dni.
+
+    Zwraca {duplicate_key: {"id", "status", "created_at"}} tylko dla znalezionych pozycji.
+    """
+    youtube_ids, raw_inputs = set(), set()
+    for youtube_id, raw_input in items:
+        if youtube_id:
+            youtube_ids.add(youtube_id)
+        elif raw_input:
+            raw_inputs.add(raw_input)
+    if not youtube_ids and not raw_inputs:
+        return {}
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=DUPLICATE_WINDOW_DAYS)
+    result = await db.execute(_DUPLICATES_SQL, {
+        "user_id": user_id,
+        "cutoff": cutoff,
+        "youtube_ids": list(youtube_ids),
+        "raw_inputs": list(raw_inputs),
+    })
+    return {
+        row.match_key: {"id": row.id, "status": row.status, "created_at": row.created_at.isoformat()}
+        for row in result.all()
+    }
+
+async def insert_suggestions(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Tuple[int, datetime]]:
+    """Wstawia propozycje jednym wielowierszowym INSERT ... RETURNING (bez commita).
+
+    executemany z RETURNING SQLAlchemy składa w jedno polecenie VALUES (...), (...) ("insertmanyvalues");
+    sort_by_parameter_order gwarantuje wynik w kolejności rows. Wiersze muszą mieć te same klucze.
+    """
+    if not rows:
+        return []
+    result = await db.execute(
+        insert(models.Suggestion).returning(models.Suggestion.id, models.Suggestion.created_at, sort_by_parameter_order=True),
+        rows
+    )
+    return [(row.id, row.created_at) for row in result.all()]
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import select, desc, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+from .pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+SUGGESTION_STATUSES = ("PENDING", "APPROVED", "REJECTED", "PROCESSED", "QUEUED", "DOWNLOADING", "ANALYZING", "TRANSCODING", "UPLOADING", "FAILED", "DUPLICATE")
+
+# Token delty nie wyprzedza now() o mniej niż tyle sekund: transakcje zatwierdzone z opóźnieniem
+# (updated_at = początek transakcji) trafią do kolejnej delty, kosztem kilku powtórzonych wierszy
+DELTA_SETTLE_SECONDS = 5
+
+def serialize_suggestion(suggestion: models.Suggestion) -> Dict[str, Any]:
+    return {
+        "id": suggestion.id,
+        "user_id": suggestion.user_id,
+        "raw_input": suggestion.raw_input,
+        "source_type": suggestion.source_type,
+        "title": suggestion.title,
+        "artist": suggestion.artist,
+        "thumbnail_url": suggestion.thumbnail_url,
+        "youtube_id": suggestion.youtube_id,
+        "status": suggestion.status,
+        "ingest_progress": suggestion.ingest_progress,
+        "ingest_error": suggestion.ingest_error,
+        "loudness_lufs": suggestion.loudness_lufs,
+        "true_peak_dbtp": suggestion.true_peak_dbtp,
+        "created_at": suggestion.created_at.isoformat() if suggestion.created_at else None,
+        "updated_at": suggestion.updated_at.isoformat() if suggestion.updated_at else None,
+    }
+
+def _groups(statuses: Optional[Sequence[str]], pending_first: bool) -> List[Any]:
+    """Kolejne segmenty kolejki (warunki SQL). PENDING jako pierwszy segment, reszta po nim"""
+    status = models.Suggestion.status
+    if not pending_first:
+        return [status.in_(statuses) if statuses else None]
+
+    groups = []
+    if not statuses or "PENDING" in statuses:
+        groups.append(status == "PENDING")
+    rest = [value for value in statuses or () if value != "PENDING"]
+    if rest:
+        groups.append(status.in_(rest))
+    elif not statuses:
+        groups.append(or_(status.is_(None), status != "PENDING"))
+    return groups
+
+async def fetch_queue(
+    db: AsyncSession,
+    user_id: Optional[int] = None,
+    statuses: Optional[Sequence[str]] = None,
+    pending_first: bool = True,
+    limit: int = 50,
+    before: Optional[Tuple[int, datetime, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Strona kolejki propozycji: segmenty statusów, w każdym (created_at, id) malejąco.
+
+    Każdy segment czyta osobnym zapytaniem po indeksie (status, created_at, id) lub
+    (user_id, created_at, id), zamiast sortować całą tabelę po CASE. Kursor: (segment, created_at, id).
+    """
+    groups = _groups(statuses, pending_first)
+    start_group = before[0] if before else 0
+    items: List[Dict[str, Any]] = []
+
+    for index in range(start_group, len(groups)):
+        remaining = limit - len(items)
+        if remaining <= 0:
+            break
+        filters = [condition for condition in (groups[index],) if condition is not None]
+        if user_id is not None:
+            filters.append(models.Suggestion.user_id == user_id)
+        if before and index == start_group:
+            _, before_at, before_id = before
+            filters.append(or_(
+                models.Suggestion.created_at < before_at,
+                and_(models.Suggestion.created_at == before_at, models.Suggestion.id < before_id)
+            ))
+
+        result = await db.execute(
+            select(models.Suggestion)
+            .where(*filters)
+            .order_by(desc(models.Suggestion.created_at), desc(models.Suggestion.id))
+            .limit(remaining)
+        )
+        for suggestion in result.scalars().all():
+            item = serialize_suggestion(suggestion)
+            item["cursor"] = encode_cursor(index, suggestion.created_at, suggestion.id)
+            items.append(item)
+
+    next_cursor = items[-1]["cursor"] if len(items) == limit else None
+    return items, next_cursor
+
+def _settled_key(updated_at: datetime, suggestion_id: int) -> Tuple[datetime, int]:
+    settled = datetime.now(timezone.utc) - timedelta(seconds=DELTA_SETTLE_SECONDS)
+    if updated_at > settled:
+        return settled, 0
+    return updated_at, suggestion_id
+
+async def delta_cursor(db: AsyncSession, user_id: Optional[int] = None) -> str:
+    """Token "zmiany od teraz" wydawany razem z pełną stroną (indeks ix_suggestions_updated)"""
+    query = select(models.Suggestion.updated_at, models.Suggestion.id)
+    if user_id is not None:
+        query = query.where(models.Suggestion.user_id == user_id)
+    row = (await db.execute(
+        query.order_by(desc(models.Suggestion.updated_at), desc(models.Suggestion.id)).limit(1)
+    )).first()
+    if not row or not row.updated_at:
+        return encode_cursor(*_settled_key(datetime.now(timezone.utc), 0))
+    return encode_cursor(*_settled_key(row.updated_at, row.id))
+
+async def fetch_changes(
+    db: AsyncSession,
+    since: Tuple[datetime, int],
+    user_id: Optional[int] = None,
+    limit: int = 200,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Wiersze dodane lub zmienione po tokenie (updated_at, id), rosnąco. Zwraca (items, nowy token).
+
+    Bez filtra statusu - klient musi zobaczyć też propozycje, które z jego widoku wypadły.
+    """
+    since_at, since_id = since
+    filters = [or_(
+        models.Suggestion.updated_at > since_at,
+        and_(models.Suggestion.updated_at == since_at, models.Suggestion.id > since_id)
+    )]
+    if user_id is not None:
+        filters.append(models.Suggestion.user_id == user_id)
+
+    result = await db.execute(
+        select(models.Suggestion)
+        .where(*filters)
+        .order_by(models.Suggestion.updated_at, models.Suggestion.id)
+        .limit(limit)
+    )
+    suggestions = result.scalars().all()
+    if not suggestions:
+        return [], encode_cursor(since_at, since_id)
+
+    # Token nie cofa się względem tego, z którym przyszedł klient
+    key = max(_settled_key(suggestions[-1].updated_at, suggestions[-1].id), (since_at, since_id))
+    return [serialize_suggestion(suggestion) for suggestion in suggestions], encode_cursor(*key)
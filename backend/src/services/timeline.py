@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .azuracast import azuracast_client
+from .pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Nagrody XP widoczne w osi czasu. VOTE dubluje głosy, a LISTENING ma osobny widok (xp-history)
+TIMELINE_AWARD_DESCRIPTIONS = {
+    "BADGE": "Nagroda za odznakę",
+    "ISSUE_REPORT": "Zaakceptowane zgłoszenie",
+}
+
+# Każda gałąź ma stały "kind"; klucz sortowania całej osi to (created_at, kind, id) malejąco
+_BRANCHES = {
+    "suggestion": """
+        SELECT 'suggestion'::varchar AS kind, id, created_at, title, artist, status, thumbnail_url,
+               NULL::varchar AS song_id, NULL::varchar AS vote_type,
+               NULL::integer AS xp_amount, NULL::varchar AS award_type
+        FROM suggestions
+        WHERE user_id = :user_id {cursor}
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    """,
+    "vote": """
+        SELECT 'vote'::varchar AS kind, id, created_at, NULL::varchar, NULL::varchar, NULL::varchar, NULL::varchar,
+               song_id, vote_type, NULL::integer, NULL::varchar
+        FROM votes
+        WHERE user_id = :user_id {cursor}
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    """,
+    "xp": """
+        SELECT 'xp'::varchar AS kind, id, created_at, NULL::varchar, NULL::varchar, NULL::varchar, NULL::varchar,
+               song_id, NULL::varchar, xp_amount, award_type
+        FROM xp_awards
+        WHERE user_id = :user_id AND award_type IN :award_types {cursor}
+        ORDER BY created_at DESC, id DESC
+        LIMIT :limit
+    """,
+}
+
+def _branch_cursor(kind: str, before: Optional[Tuple[datetime, str, int]]) -> str:
+    """Warunek keyset dla gałęzi o stałym kind - dokładny odpowiednik (created_at, kind, id) < kursor"""
+    if before is None:
+        return ""
+    _, before_kind, _ = before
+    if kind < before_kind:
+        return "AND created_at <= :before_at"
+    if kind == before_kind:
+        return "AND (created_at, id) < (:before_at, :before_id)"
+    return "AND created_at < :before_at"
+
+async def fetch_user_timeline(db: AsyncSession, user_id: int, limit: int = 20, before: Optional[Tuple[datetime, str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Jedna strona osi czasu użytkownika (propozycje, głosy, nagrody XP). Zwraca (items, next_cursor)"""
+    branches = [
+        f"({sql.format(cursor=_branch_cursor(kind, before))})"
+        for kind, sql in _BRANCHES.items()
+    ]
+    query = text(
+        "SELECT * FROM (" + " UNION ALL ".join(branches) + ") AS timeline "
+        "ORDER BY created_at DESC, kind DESC, id DESC LIMIT :limit"
+    ).bindparams(bindparam("award_types", expanding=True))
+
+    params = {
+        "user_id": user_id,
+        "limit": limit,
+        "award_types": list(TIMELINE_AWARD_DESCRIPTIONS.keys()),
+    }
+    if before is not None:
+        params["before_at"] = before[0]
+        params["before_id"] = before[2]
+
+    result = await db.execute(query, params)
+    rows = result.mappings().all()
+
+    song_ids = [row["song_id"] for row in rows if row["kind"] == "vote" and row["song_id"]]
+    songs_info = await azuracast_client.get_songs_info_batch(song_ids) if song_ids else {}
+
+    items = []
+    for row in rows:
+        created_at = row["created_at"]
+        item = {
+            "id": row["id"],
+            "type": row["kind"],
+            "created_at": created_at.isoformat(),
+            "cursor": encode_cursor(created_at, row["kind"], row["id"]),
+        }
+
+        if row["kind"] == "suggestion":
+            item.update({
+                "title": row["title"] or "Unknown",
+                "artist": row["artist"] or "Unknown",
+                "status": row["status"],
+                "thumbnail": row["thumbnail_url"],
+            })
+        elif row["kind"] == "vote":
+            song_info = songs_info.get(str(row["song_id"]))
+            item.update({
+                "title": song_info.get("title", f"Song {row['song_id']}") if song_info else f"Song {row['song_id']}",
+                "artist": song_info.get("artist", "Unknown") if song_info else "Unknown",
+                "thumbnail": song_info.get("thumbnail") if song_info else None,
+                "vote_type": row["vote_type"],
+            })
+        else:
+            item.update({
+                "title": TIMELINE_AWARD_DESCRIPTIONS.get(row["award_type"], row["award_type"]),
+                "artist": f"+{row['xp_amount']} XP",
+                "xp": row["xp_amount"],
+                "award_type": row["award_type"],
+            })
+
+        items.append(item)
+
+    next_cursor = items[-1]["cursor"] if len(items) == limit else None
+    return items, next_cursor
@@ -0,0 +1,127 @@
+import heapq
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, config
+from .azuracast import azuracast_client
+
+logger = logging.getLogger(__name__)
+
+VOTE_WEIGHTS = {
+    "LIKE": 1.0,
+    "DISLIKE": -1.0,
+}
+
+# Wyniki poniżej progu są usuwane przy rebase (utwór "wypadł" z trendów)
+PRUNE_THRESHOLD = 0.01
+
+class TrendingEngine:
+    """Wykładniczo wygaszany wynik trendu per song_id, aktualizowany w O(1) na głos.
+
+    Wyniki są trzymane względem wspólnej chwili odniesienia (epoch): dodanie głosu
+    w chwili t to += w * exp(λ(t - epoch)). Wygaszenie mnoży wszystkie wyniki przez
+    ten sam czynnik, więc kolejność (top-K) nie zależy od bieżącego czasu.
+    Rebase przesuwa epoch, żeby wartości nie rosły bez końca.
+    """
+
+    def __init__(self, half_life_hours: float):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.epoch = time.time()
+        self._scores: Dict[str, float] = {}
+        self.last_top: List[str] = []
+
+    def _growth(self, now: float) -> float:
+        return math.exp(self.decay * (now - self.epoch))
+
+    def add(self, song_id: str, weight: float, now: Optional[float] = None):
+        if not song_id or not weight:
+            return
+        now = now or time.time()
+        self._scores[song_id] = self._scores.get(song_id, 0.0) + weight * self._growth(now)
+
+    def record_vote(self, song_id: str, old_type: Optional[str], new_type: Optional[str], cast_at: Optional[datetime] = None):
+        """Nowy głos, zmiana głosu (old -> new) lub usunięcie (new = None).
+
+        Wkład głosu jest zawsze liczony w chwili jego oddania (cast_at = votes.created_at, None = teraz),
+        tak jak w rollupie list przebojów - zmiana i usunięcie odejmują dokładnie to, co głos kiedyś dodał.
+        """
+        weight = VOTE_WEIGHTS.get(new_type, 0.0) - VOTE_WEIGHTS.get(old_type, 0.0)
+        if cast_at is not None and cast_at.tzinfo is None:
+            cast_at = cast_at.replace(tzinfo=timezone.utc)
+        self.add(song_id, weight, cast_at.timestamp() if cast_at else None)
+
+    def rebase(self, now: Optional[float] = None):
+        now = now or time.time()
+        factor = 1 / self._growth(now)
+        self._scores = {
+            song_id: score * factor
+            for song_id, score in self._scores.items()
+            if abs(score * factor) >= PRUNE_THRESHOLD
+        }
+        self.epoch = now
+
+    def top(self, limit: int = 10, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Top-K utworów z wynikiem > 0, wynik wygaszony do chwili now"""
+        now = now or time.time()
+        factor = 1 / self._growth(now)
+        best = heapq.nlargest(limit, self._scores.items(), key=lambda item: item[1])
+        return [(song_id, score * factor) for song_id, score in best if score * factor > 0]
+
+    async def load(self, db: AsyncSession):
+        """Wczytuje ostatni checkpoint z Postgresa"""
+        result = await db.execute(select(models.TrendingScore))
+        now = time.time()
+        self.epoch = now
+        self._scores = {}
+        for row in result.scalars().all():
+            updated_at = row.updated_at
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            age = now - updated_at.timestamp()
+            self._scores[row.song_id] = row.score * math.exp(-self.decay * max(age, 0))
+        logger.info(f"Trending scores loaded: {len(self._scores)} songs")
+
+    async def checkpoint(self, db: AsyncSession):
+        """Zapisuje wygaszone wyniki do Postgresa (pełna podmiana - tabela ma rozmiar liczby utworów)"""
+        self.rebase()
+        updated_at = datetime.fromtimestamp(self.epoch, timezone.utc)
+        await db.execute(delete(models.TrendingScore))
+        if self._scores:
+            db.add_all([
+                models.TrendingScore(song_id=song_id, score=score, updated_at=updated_at)
+                for song_id, score in self._scores.items()
+            ])
+        await db.commit()
+
+    def top_changed(self, limit: int = 10) -> bool:
+        """Czy kolejność top-K zmieniła się od ostatniego wywołania"""
+        current = [song_id for song_id, _ in self.top(limit)]
+        if current == self.last_top:
+            return False
+        self.last_top = current
+        return True
+
+trending_engine = TrendingEngine(half_life_hours=config.settings.trending_half_life_hours)
+
+async def get_trending(limit: int = 10) -> List[Dict]:
+    """Top-K trendujących utworów z metadanymi z katalogu AzuraCast"""
+    entries = trending_engine.top(max(1, min(limit, 100)))
+    songs_info = await azuracast_client.get_songs_info_batch([song_id for song_id, _ in entries])
+
+    return [
+        {
+            "position": idx + 1,
+            "song_id": song_id,
+            "title": songs_info.get(str(song_id), {}).get("title", ""),
+            "artist": songs_info.get(str(song_id), {}).get("artist", ""),
+            "thumbnail": songs_info.get(str(song_id), {}).get("thumbnail"),
+            "score": round(score, 3)
+        }
+        for idx, (song_id, score) in enumerate(entries)
+    ]
@@ -0,0 +1,82 @@
+from typing import Dict, Iterable, Optional
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+class BadgeCache:
+    """Cała tabela badges w pamięci procesu (kilkadziesiąt wierszy).
+
+    Odświeżana po TTL lub po invalidate() przy zmianach odznak.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._badges: Dict[int, dict] = {}
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    async def ensure(self, db: AsyncSession):
+        if time.monotonic() - self._loaded_at < self.ttl:
+            return
+        result = await db.execute(select(models.Badge))
+        self._badges = {
+            badge.id: {
+                "id": badge.id,
+                "name": badge.name,
+                "description": badge.description,
+                "icon": badge.icon,
+                "color": badge.color
+            }
+            for badge in result.scalars().all()
+        }
+        self._loaded_at = time.monotonic()
+
+    def featured(self, badge_id: Optional[int]) -> Optional[dict]:
+        """Dane wyróżnionej odznaki (wymaga wcześniejszego ensure)"""
+        if not badge_id:
+            return None
+        badge = self._badges.get(badge_id)
+        return dict(badge) if badge else None
+
+badge_cache = BadgeCache()
+
+def user_card(user: models.User) -> dict:
+    """Karta użytkownika do list (wymaga wcześniejszego badge_cache.ensure)"""
+    return {
+        "user_id": user.id,
+        "username": user.username,
+        "avatar_url": user.avatar_url,
+        "featured_badge": badge_cache.featured(user.featured_badge_id),
+    }
+
+async def featured_badge_of(db: AsyncSession, user: models.User) -> Optional[dict]:
+    await badge_cache.ensure(db)
+    return badge_cache.featured(user.featured_badge_id)
+
+async def resolve_user_cards(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, dict]:
+    """Karty dla zbioru użytkowników - jedno zapytanie do users, odznaki z cache"""
+    ids = {user_id for user_id in user_ids if user_id is not None}
+    if not ids:
+        return {}
+    await badge_cache.ensure(db)
+    result = await db.execute(
+        select(models.User.id, models.User.username, models.User.avatar_url, models.User.featured_badge_id)
+        .where(models.User.id.in_(ids))
+    )
+    return {
+        row.id: {
+            "user_id": row.id,
+            "username": row.username,
+            "avatar_url": row.avatar_url,
+            "featured_badge": badge_cache.featured(row.featured_badge_id),
+        }
+        for row in result.all()
+    }
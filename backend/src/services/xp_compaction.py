@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import config
+from .xp_history import SESSION_GAP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Jedna partia: kolejne niezwinięte wiersze LISTENING (started_at IS NULL) w kolejności (user_id, created_at, id).
+# Sesje (ta sama reguła przerwy co w xp-history) zwijane są do jednego wiersza z sumą XP, created_at końca
+# i started_at początku sesji - sumy XP i granice sesji się nie zmieniają. Zwijana jest tylko sesja zakończona:
+# koniec dalej niż przerwa od cutoff i nie ostatnia sesja pełnej partii (ta może mieć ciąg dalszy w kolejnej).
+# Wiersz z ustawionym started_at jest ostateczny, więc kolejne uruchomienia go nie skanują (indeks częściowy).
+_COMPACT_BATCH_SQL = """
+    WITH scan AS (
+        SELECT id, user_id, created_at, xp_amount
+        FROM xp_awards
+        WHERE award_type = 'LISTENING' AND started_at IS NULL AND created_at < :cutoff {cursor}
+        ORDER BY user_id, created_at, id
+        LIMIT :batch_size
+    ), flagged AS (
+        SELECT *,
+            CASE
+                WHEN created_at - LAG(created_at) OVER w <= make_interval(secs => :gap) THEN 0
+                ELSE 1
+            END AS starts_island
+        FROM scan
+        WINDOW w AS (PARTITION BY user_id ORDER BY created_at, id)
+    ), islands AS (
+        SELECT *, SUM(starts_island) OVER (PARTITION BY user_id ORDER BY created_at, id) AS island
+        FROM flagged
+    ), sessions AS (
+        SELECT
+            user_id, island, MIN(id) AS keep_id,
+            (ARRAY_AGG(id ORDER BY created_at, id))[1] AS first_id,
+            MIN(created_at) AS start_at, MAX(created_at) AS end_at,
+            SUM(xp_amount) AS xp, COUNT(*) AS row_count
+        FROM islands
+        GROUP BY user_id, island
+    ), last_row AS (
+        SELECT user_id, created_at, id FROM scan ORDER BY user_id DESC, created_at DESC, id DESC LIMIT 1
+    ), open_tail AS (
+        SELECT s.* FROM sessions AS s JOIN last_row AS l ON s.user_id = l.user_id
+        WHERE (SELECT COUNT(*) FROM scan) >= :batch_size
+        ORDER BY s.island DESC
+        LIMIT 1
+    ), complete AS (
+        SELECT * FROM sessions
+        WHERE end_at + make_interval(secs => :gap) < :cutoff
+          AND (user_id, island) NOT IN (SELECT user_id, island FROM open_tail)
+    ), kept AS (
+        UPDATE xp_awards AS a
+        SET xp_amount = c.xp, created_at = c.end_at, started_at = c.start_at
+        FROM complete AS c
+        WHERE a.id = c.keep_id
+        RETURNING a.id
+    ), removed AS (
+        DELETE FROM xp_awards AS a
+        USING islands AS i, complete AS c
+        WHERE a.id = i.id AND i.user_id = c.user_id AND i.island = c.island AND a.id <> c.keep_id
+        RETURNING a.id
+    )
+    SELECT
+        (SELECT COUNT(*) FROM scan) AS scanned,
+        (SELECT COUNT(*) FROM complete WHERE row_count > 1) AS sessions,
+        (SELECT COUNT(*) FROM kept) AS settled,
+        (SELECT COUNT(*) FROM removed) AS reclaimed,
+        COALESCE(t.user_id, l.user_id) AS resume_user,
+        COALESCE(t.start_at, l.created_at) AS resume_at,
+        COALESCE(t.first_id, l.id + 1) AS resume_id,
+        COALESCE(t.row_count >= (SELECT COUNT(*) FROM scan), FALSE) AS stalled
+    FROM last_row AS l
+    LEFT JOIN open_tail AS t ON TRUE
+"""
+
+async def compact_listening_awards(db: AsyncSession, older_than_hours: Optional[float] = None, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> Dict[str, int]:
+    """Zwija minutowe nagrody LISTENING starsze niż older_than_hours do jednego wiersza na sesję.
+
+    Każda partia to osobna transakcja. Sesje jeszcze trwające (blisko cutoff) czekają na kolejne uruchomienie.
+    Zwraca statystyki (przeskanowane wiersze, sesje, odzyskane wiersze).
+    """
+    older_than_hours = older_than_hours if older_than_hours is not None else config.settings.xp_compaction_age_hours
+    batch_size = batch_size or config.settings.xp_compaction_batch_size
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=older_than_hours)
+
+    stats = {"batches": 0, "scanned": 0, "sessions": 0, "reclaimed": 0}
+    resume = None
+    current_batch = batch_size
+
+    while max_batches is None or stats["batches"] < max_batches:
+        params = {"cutoff": cutoff, "batch_size": current_batch, "gap": SESSION_GAP_SECONDS}
+        cursor_sql = ""
+        if resume is not None:
+            cursor_sql = "AND (user_id, created_at, id) >= (:resume_user, :resume_at, :resume_id)"
+            params["resume_user"], params["resume_at"], params["resume_id"] = resume
+
+        result = await db.execute(text(_COMPACT_BATCH_SQL.format(cursor=cursor_sql)), params)
+        row = result.mappings().first()
+        await db.commit()
+
+        if row is None:
+            break
+
+        stats["batches"] += 1
+        stats["scanned"] += row["scanned"]
+        stats["sessions"] += row["sessions"]
+        stats["reclaimed"] += row["reclaimed"]
+
+        if row["scanned"] < current_batch:
+            break
+
+        # Jedna sesja wypełnia całą partię - powiększamy partię, aż zmieści się w całości
+        if row["stalled"]:
+            current_batch *= 2
+            continue
+
+        # Kolejna partia zaczyna się od odłożonej ostatniej sesji albo tuż za ostatnim wierszem
+        resume = (row["resume_user"], row["resume_at"], row["resume_id"])
+        current_batch = batch_size
+
+    logger.info(
+        f"LISTENING compaction: {stats['reclaimed']} rows reclaimed "
+        f"({stats['sessions']} sessions, {stats['scanned']} rows scanned in {stats['batches']} batches)"
+    )
+    return stats
@@ -0,0 +1,184 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .azuracast import azuracast_client
+from .pagination import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Nagrody LISTENING oddalone o więcej niż tyle sekund zaczynają nową sesję słuchania
+SESSION_GAP_SECONDS = 300
+
+# Maksymalna liczba wierszy xp_awards czytana na stronę (ogranicza koszt zapytania)
+SCAN_LIMIT = 5000
+
+# Ile razy jedna strona może ponowić skan, pomijając ogon sesji pokazanej na poprzedniej stronie
+MAX_RESCANS = 3
+
+# Gaps-and-islands: LAG wykrywa przerwę > SESSION_GAP_SECONDS, suma bieżąca numeruje sesje.
+# Każda nagroda VOTE jest osobną "wyspą". Kotwicą elementu jest jego najnowszy wiersz.
+# Sesja zwinięta przez kompakcję to jeden wiersz: created_at = koniec, started_at = początek.
+# after_at/after_id - pierwszy wiersz skanu nowszy niż koniec wyspy (kursor wyłączny tuż nad nią).
+_ISLANDS_SQL = """
+    WITH scan AS (
+        SELECT id, created_at, COALESCE(started_at, created_at) AS started_at, xp_amount, award_type, song_id
+        FROM xp_awards
+        WHERE user_id = :user_id
+          AND (award_type = 'LISTENING' OR (award_type = 'VOTE' AND song_id IS NOT NULL))
+          {cursor}
+        ORDER BY created_at DESC, id DESC
+        LIMIT :scan_limit
+    ), flagged AS (
+        SELECT *,
+            CASE
+                WHEN award_type <> 'LISTENING' THEN 1
+                WHEN started_at - LAG(created_at) OVER w <= make_interval(secs => :gap) THEN 0
+                ELSE 1
+            END AS starts_island,
+            LEAD(created_at) OVER scan_order AS after_at,
+            LEAD(id) OVER scan_order AS after_id
+        FROM scan
+        WINDOW w AS (PARTITION BY award_type ORDER BY created_at, id),
+               scan_order AS (ORDER BY created_at, id)
+    ), islands AS (
+        SELECT *, SUM(starts_island) OVER (PARTITION BY award_type ORDER BY created_at, id) AS island
+        FROM flagged
+    )
+    SELECT
+        award_type,
+        MAX(created_at) AS end_at,
+        (ARRAY_AGG(id ORDER BY created_at DESC, id DESC))[1] AS end_id,
+        (ARRAY_AGG(after_at ORDER BY created_at DESC, id DESC))[1] AS after_at,
+        (ARRAY_AGG(after_id ORDER BY created_at DESC, id DESC))[1] AS after_id,
+        MIN(started_at) AS start_at,
+        MIN(created_at) AS first_at,
+        (ARRAY_AGG(id ORDER BY created_at, id))[1] AS first_id,
+        SUM(xp_amount) AS xp,
+        MAX(song_id) AS song_id,
+        MIN(created_at) = (SELECT MIN(created_at) FROM scan) AS touches_scan_end,
+        (SELECT COUNT(*) FROM scan) AS scanned
+    FROM islands
+    GROUP BY award_type, island
+    ORDER BY end_at DESC, end_id DESC
+    LIMIT :page_limit
+"""
+
+def _key(row, prefix: str = "end") -> Tuple[datetime, int]:
+    return row[f"{prefix}_at"], row[f"{prefix}_id"]
+
+async def _scan_islands(db: AsyncSession, params: Dict[str, Any], before: Optional[Tuple[datetime, int]]) -> List:
+    cursor_sql = ""
+    if before is not None:
+        cursor_sql = "AND (created_at, id) < (:before_at, :before_id)"
+        params = {**params, "before_at": before[0], "before_id": before[1]}
+    result = await db.execute(text(_ISLANDS_SQL.format(cursor=cursor_sql)), params)
+    return list(result.mappings().all())
+
+async def _continuing_tail(db: AsyncSession, user_id: int, rows: List):
+    """Najnowsza sesja skanu, jeśli ciągnie się za kursorem (jej koniec był już na poprzedniej stronie)"""
+    newest_listening = next((row for row in rows if row["award_type"] == "LISTENING"), None)
+    if newest_listening is None:
+        return None
+    result = await db.execute(text("""
+        SELECT 1 FROM xp_awards
+        WHERE user_id = :user_id AND award_type = 'LISTENING'
+          AND (created_at, id) > (:end_at, :end_id)
+          AND created_at <= :end_at + make_interval(secs => :gap)
+        LIMIT 1
+    """), {
+        "user_id": user_id,
+        "end_at": newest_listening["end_at"],
+        "end_id": newest_listening["end_id"],
+        "gap": SESSION_GAP_SECONDS,
+    })
+    return newest_listening if result.scalar() is not None else None
+
+async def fetch_xp_history(db: AsyncSession, user_id: int, limit: int = 50, before: Optional[Tuple[datetime, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Strona historii XP: głosy i sesje słuchania pogrupowane w Postgresie. Zwraca (items, next_cursor)"""
+    params = {
+        "user_id": user_id,
+        "scan_limit": SCAN_LIMIT,
+        "gap": SESSION_GAP_SECONDS,
+        "page_limit": limit + 2,
+    }
+
+    # Ogon sesji z poprzedniej strony pomijamy. Jeśli zajął część uciętego skanu, skanujemy ponownie
+    # od jego początku (najwyżej MAX_RESCANS razy); głosy z czasu trwania ogona są kompletne i zostają.
+    carried: List = []
+    resume: Optional[Tuple[datetime, int]] = None
+    for rescan in range(MAX_RESCANS + 1):
+        rows = await _scan_islands(db, params, before)
+        scan_truncated = bool(rows) and rows[0]["scanned"] >= SCAN_LIMIT
+        tail = await _continuing_tail(db, user_id, rows) if before is not None else None
+        if tail is None:
+            break
+        rows.remove(tail)
+        if not scan_truncated:
+            break
+        before = _key(tail, "first")
+        carried += [row for row in rows if _key(row) > before]
+        if rescan == MAX_RESCANS:
+            # Limit ponowień - kolejna strona zacznie od początku ogona
+            resume, rows = before, []
+    rows = carried + rows
+    if not rows:
+        return [], encode_cursor(*resume) if resume else None
+
+    # Najstarsza sesja mogła zostać ucięta przez SCAN_LIMIT - pokażemy ją w całości na kolejnej stronie.
+    # Razem z nią odkładamy wszystko, co kończy się wcześniej (kolejna strona zaczyna się tuż nad jej końcem).
+    deferred = None
+    newer: List = []
+    if scan_truncated:
+        truncated = next((row for row in rows if row["award_type"] == "LISTENING" and row["touches_scan_end"]), None)
+        if truncated:
+            newer = [row for row in rows if _key(row) > _key(truncated)]
+            # Bez nowszych elementów strona byłaby pusta - wtedy pokazujemy sesję mimo ucięcia
+            if newer:
+                deferred, rows = truncated, newer
+
+    page_full = len(rows) > limit
+    has_more = page_full or scan_truncated
+    rows = rows[:limit]
+
+    song_ids = [row["song_id"] for row in rows if row["award_type"] == "VOTE"]
+    songs_info = await azuracast_client.get_songs_info_batch(song_ids) if song_ids else {}
+
+    items = []
+    for row in rows:
+        if row["award_type"] == "VOTE":
+            song_info = songs_info.get(str(row["song_id"]))
+            items.append({
+                "id": f"award_{row['end_id']}",
+                "type": "vote",
+                "xp": row["xp"],
+                "description": "Głosowanie na utwór",
+                "title": song_info.get("title", f"Song {row['song_id']}") if song_info else f"Song {row['song_id']}",
+                "artist": song_info.get("artist", "Unknown") if song_info else "Unknown",
+                "created_at": row["end_at"].isoformat(),
+                "cursor": encode_cursor(row["end_at"], row["end_id"]),
+            })
+        else:
+            items.append({
+                "id": f"session_{row['end_id']}",
+                "type": "listening",
+                "xp": row["xp"],
+                "description": f"Czas słuchania ({row['xp']} min)",
+                "title": None,
+                "artist": None,
+                "created_at": row["end_at"].isoformat(),
+                "started_at": row["start_at"].isoformat(),
+                "cursor": encode_cursor(row["end_at"], row["end_id"]),
+            })
+
+    next_cursor = items[-1]["cursor"] if has_more and items else None
+    if deferred is not None and len(rows) == len(newer):
+        # Kursor ostatniego elementu mógłby wypaść w środku odłożonej sesji - bierzemy pierwszy wiersz nad jej końcem,
+        # a gdy w skanie go nie ma (nowsze elementy przeniesione z wcześniejszego skanu) - górną granicę skanu
+        next_cursor = encode_cursor(*(_key(deferred, "after") if deferred["after_id"] is not None else before))
+    elif resume is not None and not page_full:
+        next_cursor = encode_cursor(*resume)
+    return items, next_cursor
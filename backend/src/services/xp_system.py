@@ -1,3 +1,14 @@
+from bisect import bisect_right
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
 RANKS = [
     {"name": "Szumofon", "min_xp": 0},
     {"name": "Koneser Bitów", "min_xp": 500},
@@ -11,37 +22,102 @@ RANKS = [
     {"name": "Legenda Radia", "min_xp": 500000},
 ]
 
-def get_rank(xp: int) -> dict:
-    current_rank = RANKS[0]
-    next_rank = None
-    
-    for i, rank in enumerate(RANKS):
-        if xp >= rank["min_xp"]:
-            current_rank = rank
-            if i + 1 < len(RANKS):
-                next_rank = RANKS[i + 1]
+class Tier(NamedTuple):
+    """Prekomputowane dane progu: nazwa, próg, następna ranga i różnica XP do niej"""
+    name: str
+    min_xp: int
+    next_name: Optional[str]
+    next_min_xp: Optional[int]
+    needed_xp: int
+
+class RankTable:
+    """Niezmienna tabela rang - progi posortowane rosnąco, wyszukiwanie bisect w O(log n)"""
+
+    __slots__ = ("tiers", "thresholds")
+
+    def __init__(self, ranks: Sequence[dict]):
+        ordered = sorted(ranks, key=lambda rank: rank["min_xp"])
+        if not ordered:
+            raise ValueError("Rank table cannot be empty")
+        tiers = []
+        for i, rank in enumerate(ordered):
+            next_rank = ordered[i + 1] if i + 1 < len(ordered) else None
+            tiers.append(Tier(
+                name=rank["name"],
+                min_xp=rank["min_xp"],
+                next_name=next_rank["name"] if next_rank else None,
+                next_min_xp=next_rank["min_xp"] if next_rank else None,
+                needed_xp=next_rank["min_xp"] - rank["min_xp"] if next_rank else 0,
+            ))
+        self.tiers: Tuple[Tier, ...] = tuple(tiers)
+        self.thresholds: Tuple[int, ...] = tuple(tier.min_xp for tier in tiers)
+
+    def tier(self, xp: int) -> Tier:
+        return self.tiers[max(0, bisect_right(self.thresholds, xp) - 1)]
+
+    def info(self, xp: int) -> dict:
+        return self.tier_info(self.tier(xp), xp)
+
+    @staticmethod
+    def tier_info(tier: Tier, xp: int) -> dict:
+        current_xp = xp - tier.min_xp
+        if tier.next_name is not None:
+            progress = min(100, int((current_xp / tier.needed_xp) * 100)) if tier.needed_xp > 0 else 100
         else:
-            if next_rank is None:
-                next_rank = rank
-            break
-    
-    current_xp = xp - current_rank["min_xp"]
-    if next_rank:
-        needed_xp = next_rank["min_xp"] - current_rank["min_xp"]
-        progress = min(100, int((current_xp / needed_xp) * 100)) if needed_xp > 0 else 100
-    else:
-        needed_xp = 0
-        progress = 100
-    
-    return {
-        "name": current_rank["name"],
-        "xp": xp,
-        "current_xp": current_xp,
-        "next_rank": next_rank["name"] if next_rank else None,
-        "next_rank_xp": next_rank["min_xp"] if next_rank else None,
-        "needed_xp": needed_xp,
-        "progress": progress,
-    }
+            progress = 100
+
+        return {
+            "name": tier.name,
+            "xp": xp,
+            "current_xp": current_xp,
+            "next_rank": tier.next_name,
+            "next_rank_xp": tier.next_min_xp,
+            "needed_xp": tier.needed_xp,
+            "progress": progress,
+        }
+
+    def as_list(self) -> List[dict]:
+        return [{"name": tier.name, "min_xp": tier.min_xp} for tier in self.tiers]
+
+_rank_table = RankTable(RANKS)
+
+def set_rank_table(ranks: Sequence[dict]):
+    """Podmienia tabelę rang (np. po wczytaniu z tabeli rank_tiers) - podmiana referencji jest atomowa"""
+    global _rank_table
+    _rank_table = RankTable(ranks)
+
+def get_rank_table() -> RankTable:
+    return _rank_table
+
+async def load_rank_table(db: AsyncSession):
+    """Wczytuje progi z tabeli rank_tiers (przy pustej tabeli zapisuje domyślne RANKS)"""
+    result = await db.execute(select(models.RankTier).order_by(models.RankTier.min_xp))
+    tiers = result.scalars().all()
+    if not tiers:
+        db.add_all([models.RankTier(name=rank["name"], min_xp=rank["min_xp"]) for rank in RANKS])
+        await db.commit()
+        set_rank_table(RANKS)
+        return
+    set_rank_table([{"name": tier.name, "min_xp": tier.min_xp} for tier in tiers])
+    logger.info(f"Rank table loaded: {len(tiers)} tiers")
+
+def get_rank(xp: int) -> dict:
+    return _rank_table.info(xp or 0)
+
+def get_ranks(xps: Iterable[int]) -> List[dict]:
+    """Wersja wsadowa get_rank dla list (ranking, panele): wartości XP sortowane raz, a progi
+    przechodzone jednym scaleniem zamiast bisect dla każdej wartości. Ranking jest już posortowany,
+    więc sortowanie (timsort) jest tam liniowe."""
+    table = _rank_table
+    values = [xp or 0 for xp in xps]
+    infos: List[Optional[dict]] = [None] * len(values)
+
+    tier_idx = 0
+    for idx in sorted(range(len(values)), key=values.__getitem__):
+        while tier_idx + 1 < len(table.thresholds) and table.thresholds[tier_idx + 1] <= values[idx]:
+            tier_idx += 1
+        infos[idx] = table.tier_info(table.tiers[tier_idx], values[idx])
+    return infos
 
 XP_PER_VOTE = 10
 XP_PER_MINUTE_LISTENING = 1
@@ -1,10 +1,13 @@
 import yt_dlp
 import re
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Limit pojedynczej operacji sieciowej yt-dlp - wątek puli podglądów nie wisi w nieskończoność
+SOCKET_TIMEOUT = 10
+
 def is_youtube_url(url: str) -> bool:
     patterns = [
         r'youtube\.com/watch\?v=',
@@ -45,6 +48,7 @@ def get_video_info(url: str) -> Optional[Dict]:
         'no_warnings': True,
         'extract_flat': False,
         'skip_download': True,
+        'socket_timeout': SOCKET_TIMEOUT,
     }
     
     try:
@@ -81,65 +85,79 @@ def get_video_info(url: str) -> Optional[Dict]:
         logger.error(f"Error extracting video info: {e}")
         return None
 
-def get_playlist_info(url: str, max_items: int = 50) -> Optional[List[Dict]]:
+def _playlist_item(entry: Dict) -> Optional[Dict]:
+    """Pozycja podglądu z płaskiego wpisu playlisty (extract_flat)"""
+    entry_id = entry.get('id')
+    if not entry_id:
+        return None
+    
+    entry_url = f"https://www.youtube.com/watch?v={entry_id}"
+    title = entry.get('title', 'Unknown')
+    artist = entry.get('channel', entry.get('uploader', 'Unknown'))
+    duration = entry.get('duration') or entry.get('duration_string', 0)
+    
+    if isinstance(duration, str):
+        try:
+            parts = duration.split(':')
+            if len(parts) == 2:
+                duration = int(parts[0]) * 60 + int(parts[1])
+            elif len(parts) == 3:
+                duration = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+            else:
+                duration = 0
+        except:
+            duration = 0
+    
+    thumbnail = entry.get('thumbnail') or f"https://img.youtube.com/vi/{entry_id}/default.jpg"
+    
+    return {
+        'title': title,
+        'artist': artist,
+        'duration_seconds': duration or 0,
+        'thumbnail': thumbnail,
+        'youtube_id': entry_id,
+        'source_type': 'YOUTUBE',
+        'url': entry_url
+    }
+
+def iter_playlist_items(url: str, max_items: int = 50) -> Iterator[Dict]:
+    """Pozycje playlisty w miarę pobierania kolejnych stron przez yt-dlp (process=False - wpisy leniwie).
+    
+    Błędy ekstrakcji są propagowane do wywołującego.
+    """
     ydl_opts = {
         'quiet': True,
         'no_warnings': True,
         'extract_flat': 'in_playlist',
         'skip_download': True,
+        'socket_timeout': SOCKET_TIMEOUT,
         'playlistend': max_items,
     }
     
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        # watch?v=...&list=... zwraca najpierw odnośnik do playlisty
+        for _ in range(2):
+            if not info or info.get('_type') not in ('url', 'url_transparent'):
+                break
+            info = ydl.extract_info(info['url'], download=False, process=False)
+        
+        if not info or 'entries' not in info:
+            return
+        
+        count = 0
+        for entry in info.get('entries') or []:
+            if count >= max_items:
+                break
+            item = _playlist_item(entry) if entry else None
+            if item:
+                count += 1
+                yield item
+
+def get_playlist_info(url: str, max_items: int = 50) -> Optional[List[Dict]]:
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            if not info or 'entries' not in info:
-                return None
-            
-            entries = info.get('entries', [])
-            if not entries:
-                return None
-            
-            results = []
-            for entry in entries:
-                if not entry:
-                    continue
-                
-                entry_id = entry.get('id')
-                if not entry_id:
-                    continue
-                
-                entry_url = f"https://www.youtube.com/watch?v={entry_id}"
-                title = entry.get('title', 'Unknown')
-                artist = entry.get('channel', entry.get('uploader', 'Unknown'))
-                duration = entry.get('duration') or entry.get('duration_string', 0)
-                
-                if isinstance(duration, str):
-                    try:
-                        parts = duration.split(':')
-                        if len(parts) == 2:
-                            duration = int(parts[0]) * 60 + int(parts[1])
-                        elif len(parts) == 3:
-                            duration = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-                        else:
-                            duration = 0
-                    except:
-                        duration = 0
-                
-                thumbnail = entry.get('thumbnail') or f"https://img.youtube.com/vi/{entry_id}/default.jpg"
-                
-                results.append({
-                    'title': title,
-                    'artist': artist,
-                    'duration_seconds': duration or 0,
-                    'thumbnail': thumbnail,
-                    'youtube_id': entry_id,
-                    'source_type': 'YOUTUBE',
-                    'url': entry_url
-                })
-            
-            return results if results else None
+        results = list(iter_playlist_items(url, max_items))
+        return results if results else None
     except Exception as e:
         logger.error(f"Error extracting playlist info: {e}")
         return None
@@ -150,6 +168,7 @@ def search_youtube(query: str, max_results: int = 1) -> Optional[Dict]:
         'no_warnings': True,
         'extract_flat': False,
         'skip_download': True,
+        'socket_timeout': SOCKET_TIMEOUT,
         'default_search': 'ytsearch',
     }
     
@@ -239,3 +258,39 @@ def preview_content(input_str: str) -> Dict:
                 'message': 'Nie znaleziono utworu'
             }
 
+
+def download_audio(source: str, directory: str, max_duration: Optional[int] = None) -> Dict:
+    """Pobiera najlepszą ścieżkę audio (bez konwersji) do directory/source.<ext>.
+    
+    source: URL filmu albo zapytanie "ytsearch1:...". Niedokończony plik .part jest wznawiany
+    przy kolejnej próbie. Błędy yt-dlp są propagowane do wywołującego.
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'format': 'bestaudio/best',
+        'outtmpl': f"{directory}/source.%(ext)s",
+        'noplaylist': True,
+        'continuedl': True,
+        'socket_timeout': SOCKET_TIMEOUT,
+        'retries': 3,
+    }
+    if max_duration:
+        # Filtr przed pobraniem - zbyt długie materiały (miksy, transmisje) są pomijane
+        ydl_opts['match_filter'] = yt_dlp.utils.match_filter_func(f"duration <= {max_duration}")
+    
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(source, download=True)
+        if info and 'entries' in info:
+            info = next((entry for entry in info['entries'] if entry), None)
+        downloads = (info or {}).get('requested_downloads') or []
+        if not downloads:
+            raise ValueError("Nie pobrano żadnego pliku audio")
+        
+        return {
+            'path': downloads[0].get('filepath') or ydl.prepare_filename(info),
+            'youtube_id': info.get('id'),
+            'title': info.get('track') or info.get('title'),
+            'artist': info.get('artist') or info.get('uploader'),
+            'duration_seconds': info.get('duration') or 0,
+        }
@@ -1,6 +1,11 @@
 import os
+import asyncio
 from celery import Celery
 from celery.schedules import crontab
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from .database import DATABASE_URL_ASYNC
 
 # Pobranie adresu Redisa ze zmiennych środowiskowych (zdefiniowanych w docker-compose)
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
@@ -22,10 +27,52 @@ celery_app.conf.beat_schedule = {
         'task': 'src.tasks.health_check_task',
         'schedule': 60.0, # co 60 sekund
     },
+    # Zamrażanie notowań list przebojów (idempotentne - dogania brakujące tygodnie/miesiące)
+    'freeze-chart-snapshots-daily': {
+        'task': 'src.tasks.freeze_chart_snapshots',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    # Zwijanie minutowych nagród LISTENING do jednego wiersza na sesję
+    'compact-listening-awards-daily': {
+        'task': 'src.tasks.compact_listening_awards',
+        'schedule': crontab(hour=3, minute=40),
+    },
+    # Partycje votes/xp_awards na kolejne miesiące + archiwizacja starych
+    'maintain-partitions-daily': {
+        'task': 'src.tasks.maintain_partitions',
+        'schedule': crontab(hour=4, minute=10),
+    },
+    # Przetwarzanie zaakceptowanych propozycji: pobranie, transkodowanie, wysyłka do AzuraCast
+    'dispatch-ingestion-every-minute': {
+        'task': 'src.tasks.dispatch_ingestion',
+        'schedule': 60.0,
+    },
+    # Odciski audio plików stacji spoza propozycji (wykrywanie duplikatów przed wysyłką)
+    'fingerprint-library-hourly': {
+        'task': 'src.tasks.fingerprint_library',
+        'schedule': crontab(minute=25),
+    },
     # Tu później dodamy:
     # 'generate-news-at-12': { ... schedule: crontab(hour=11, minute=50) ... }
 }
 
+def run_with_session(handler):
+    """Uruchamia async handler(db) w zadaniu Celery.
+
+    Każde zadanie ma własną pętlę zdarzeń, więc używamy osobnego silnika bez puli
+    (połączenia asyncpg nie mogą przechodzić między pętlami).
+    """
+    async def runner():
+        engine = create_async_engine(DATABASE_URL_ASYNC, poolclass=NullPool)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                return await handler(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(runner())
+
 # --- DEFINICJE ZADAŃ (TASKS) ---
 
 @celery_app.task(name="src.tasks.health_check_task")
@@ -34,9 +81,67 @@ def health_check_task():
     print(" [x] Worker heartbeat: System operacyjny AI jest gotowy do pracy.")
     return "OK"
 
-@celery_app.task(name="src.tasks.process_suggestion")
-def process_suggestion(url: str):
-    """Zadanie placeholder pod przyszłe pobieranie z YT"""
-    print(f" [x] Otrzymano zadanie przetworzenia linku: {url}")
-    # Tu w przyszłości będzie logika yt-dlp
-    return {"status": "processed", "url": url}
\ No newline at end of file
+@celery_app.task(bind=True, name="src.tasks.process_suggestion", acks_late=True)
+def process_suggestion(self, suggestion_id: int):
+    """Pobiera, transkoduje i wgrywa do AzuraCast zaakceptowaną propozycję (services/ingestion.py).
+
+    Liczba prób jest w bazie (ingest_attempts), więc ponowienie nie ma własnego limitu w Celery.
+    """
+    from .services import ingestion
+
+    result = run_with_session(lambda db: ingestion.ingest_suggestion(db, suggestion_id))
+    print(f" [x] Suggestion {suggestion_id} ingestion: {result['status']}")
+    if result["status"] == "retry":
+        raise self.retry(countdown=result["delay"], max_retries=None)
+    return result
+
+@celery_app.task(name="src.tasks.dispatch_ingestion")
+def dispatch_ingestion():
+    """Przydziela zaakceptowane (i zawieszone) propozycje do przetworzenia w limicie INGEST_CONCURRENCY"""
+    from .services import ingestion
+
+    suggestion_ids = run_with_session(ingestion.claim_batch)
+    for suggestion_id in suggestion_ids:
+        process_suggestion.delay(suggestion_id)
+    return {"dispatched": suggestion_ids}
+
+@celery_app.task(name="src.tasks.fingerprint_library")
+def fingerprint_library():
+    """Uzupełnia indeks odcisków o pliki stacji, których w nim jeszcze nie ma (paczkami)"""
+    from .services.fingerprint import backfill_library
+
+    report = run_with_session(backfill_library)
+    print(f" [x] Library fingerprints: {report}")
+    return report
+
+@celery_app.task(name="src.tasks.freeze_chart_snapshots")
+def freeze_chart_snapshots():
+    """Zamraża brakujące notowania zakończonych tygodni i miesięcy do tabeli chart_snapshots"""
+    from .services import charts
+
+    created = run_with_session(charts.freeze_snapshots)
+    print(f" [x] Chart snapshots frozen: {created}")
+    return {"created": created}
+
+@celery_app.task(name="src.tasks.compact_listening_awards")
+def compact_listening_awards():
+    """Zwija stare nagrody LISTENING do jednego wiersza na sesję (sumy XP bez zmian)"""
+    from .services.xp_compaction import compact_listening_awards as compact
+
+    stats = run_with_session(compact)
+    print(f" [x] LISTENING awards compacted: {stats['reclaimed']} rows reclaimed")
+    return stats
+
+@celery_app.task(name="src.tasks.maintain_partitions")
+def maintain_partitions():
+    """Tworzy partycje miesięczne z wyprzedzeniem i odłącza te poza retencją"""
+    from .services import partitions
+
+    async def handler(db):
+        report = await partitions.maintain_partitions(db)
+        await db.commit()
+        return report
+
+    report = run_with_session(handler)
+    print(f" [x] Partitions maintained: {report}")
+    return report
@@ -0,0 +1,185 @@
+import os
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src import config, models
+from src.services import ingestion
+from src.services.azuracast import AzuraCastClient
+
+class FakeAzuraCast:
+    """Atrapa AzuraCast: listowanie katalogu mediów i uploader Flow.js (kawałki składane w plik po ostatnim)"""
+
+    def __init__(self):
+        self.files: Dict[str, bytes] = {}
+        self.chunks: Dict[str, Dict[int, bytes]] = {}
+        # Pola formularza każdego żądania /files/upload (bez treści kawałka)
+        self.uploads: List[Dict[str, str]] = []
+        self.listings: List[str] = []
+        # Tyle kolejnych żądań /files/upload kończy się błędem 500
+        self.fail_uploads = 0
+        # Wywoływane po przyjęciu kawałka (numer kawałka) - np. zmiana statusu przez moderatora w trakcie wysyłki
+        self.on_chunk: Optional[Callable[[int], Awaitable[None]]] = None
+
+        self.app = FastAPI()
+        self.app.add_api_route("/api/station/{station_id}/files/list", self.list_directory, methods=["GET"])
+        self.app.add_api_route("/api/station/{station_id}/files/upload", self.upload, methods=["POST"])
+
+    async def list_directory(self, station_id: str, currentDirectory: str = ""):
+        self.listings.append(currentDirectory)
+        prefix = f"{currentDirectory.strip('/')}/" if currentDirectory.strip("/") else ""
+        return [
+            {"path": path, "size": len(data)}
+            for path, data in self.files.items()
+            if path.startswith(prefix) and "/" not in path[len(prefix):]
+        ]
+
+    async def upload(self, station_id: str, request: Request):
+        form = await request.form()
+        fields = {key: value for key, value in form.items() if key != "file"}
+        self.uploads.append(fields)
+        if self.fail_uploads > 0:
+            self.fail_uploads -= 1
+            return JSONResponse({"success": False, "message": "Upload failed"}, status_code=500)
+
+        data = await form["file"].read()
+        if len(data) != int(fields["flowCurrentChunkSize"]):
+            return JSONResponse({"success": False, "message": "Chunk size mismatch"}, status_code=400)
+
+        number = int(fields["flowChunkNumber"])
+        parts = self.chunks.setdefault(fields["flowIdentifier"], {})
+        parts[number] = data
+        if len(parts) == int(fields["flowTotalChunks"]):
+            path = "/".join(part for part in (fields["currentDirectory"].strip("/"), fields["flowRelativePath"]) if part)
+            self.files[path] = b"".join(parts[index] for index in sorted(parts))
+            del self.chunks[fields["flowIdentifier"]]
+
+        if self.on_chunk:
+            await self.on_chunk(number)
+        return {"success": True}
+
+class FakePipeline:
+    """Zastępuje yt-dlp, ffmpeg i indeks odcisków - testy sprawdzają maszynę stanów i wysyłkę"""
+
+    AUDIO = bytes(range(256)) * 10 + b"tail"
+
+    def __init__(self):
+        self.downloads: List[str] = []
+        self.stored: List[str] = []
+
+    def download_audio(self, source: str, directory: str, max_duration: Optional[int] = None) -> Dict:
+        self.downloads.append(source)
+        path = os.path.join(directory, "source.webm")
+        with open(path, "wb") as target:
+            target.write(b"source audio")
+        return {"path": path}
+
+    @staticmethod
+    def analyze_file(path: str, noise_db: float = -50.0, min_silence: float = 0.5) -> Dict:
+        return {
+            "integrated_lufs": -14.0,
+            "loudness_range": 6.0,
+            "true_peak_dbtp": -1.5,
+            "duration": 180.0,
+            "leading_silence": 0.0,
+            "trailing_silence": 0.0,
+            "elapsed_ms": 12,
+            "realtime_factor": 150.0,
+        }
+
+    @staticmethod
+    def fingerprint_file(path: str):
+        return np.arange(256, dtype=np.uint32), 46.4
+
+    def transcode(self, source: str, target: str, tags: Dict[str, str], bitrate: str, filters: Optional[List[str]] = None):
+        with open(target, "wb") as output:
+            output.write(self.AUDIO)
+
+    async def match(self, db: AsyncSession, words: np.ndarray, exclude_suggestion_id: Optional[int] = None):
+        return None
+
+    async def store_fingerprint(self, db: AsyncSession, words: np.ndarray, seconds: float, azuracast_path: str, **values):
+        self.stored.append(azuracast_path)
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def settings(monkeypatch, tmp_path):
+    for name, value in {
+        "audio_temp_dir": str(tmp_path / "audio_temp"),
+        "azuracast_upload_dir": "suggestions",
+        "ingest_upload_chunk_size": 1024,
+        "ingest_upload_timeout": 5.0,
+        "ingest_max_attempts": 3,
+        "ingest_retry_delay": 10,
+    }.items():
+        monkeypatch.setattr(config.settings, name, value)
+    return config.settings
+
+@pytest.fixture
+async def sessionmaker(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ingestion.db'}")
+    tables = [model.__table__ for model in (models.User, models.Badge, models.UserBadge, models.Suggestion)]
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: models.Base.metadata.create_all(sync_conn, tables=tables))
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
+
+@pytest.fixture
+async def pg_engine():
+    """Postgres z TEST_DATABASE_URL (postgresql+asyncpg://...) - każdy test na własnym, usuwanym schemacie.
+
+    Dla zapytań, których SQLite nie wykona (funkcje okna z make_interval, CTE modyfikujące dane, partycje).
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_async_engine(url)
+    async with admin.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    engine = create_async_engine(url, connect_args={"server_settings": {"search_path": schema}})
+    yield engine
+    await engine.dispose()
+    async with admin.begin() as conn:
+        await conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+    await admin.dispose()
+
+@pytest.fixture
+def pg_sessionmaker(pg_engine):
+    return async_sessionmaker(pg_engine, class_=AsyncSession, expire_on_commit=False)
+
+@pytest.fixture
+async def db(sessionmaker):
+    async with sessionmaker() as session:
+        yield session
+
+@pytest.fixture
+def azuracast(monkeypatch):
+    fake = FakeAzuraCast()
+    client = AzuraCastClient()
+    client.base_url = "http://azuracast.test"
+    client.station_id = "1"
+    client.transport = httpx.ASGITransport(app=fake.app)
+    monkeypatch.setattr(ingestion, "azuracast_client", client)
+    return fake
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(ingestion, "download_audio", fake.download_audio)
+    monkeypatch.setattr(ingestion, "analyze_file", fake.analyze_file)
+    monkeypatch.setattr(ingestion, "fingerprint_file", fake.fingerprint_file)
+    monkeypatch.setattr(ingestion, "transcode", fake.transcode)
+    monkeypatch.setattr(ingestion.fingerprint_index, "match", fake.match)
+    monkeypatch.setattr(ingestion, "store_fingerprint", fake.store_fingerprint)
+    return fake
@@ -0,0 +1,64 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.services.azuracast import AzuraCastClient
+
+pytestmark = pytest.mark.anyio
+
+def _station(title: str) -> dict:
+    return {"now_playing": {"song": {"title": title, "artist": "Artist"}}, "song_history": [], "playing_next": None}
+
+@pytest.fixture
+def station():
+    """Klient z atrapą /api/nowplaying; songs[-1] to bieżący utwór, requests - liczba pobrań"""
+    state = {"songs": ["First"], "requests": 0, "gate": None}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["requests"] += 1
+        title = state["songs"][-1]
+        if state["gate"] is not None:
+            await state["gate"].wait()
+        return httpx.Response(200, json=_station(title))
+
+    client = AzuraCastClient()
+    client.base_url = "http://azuracast.test"
+    client.station_id = "1"
+    client._nowplaying_ttl = 60
+    client.transport = httpx.MockTransport(handler)
+    state["client"] = client
+    return state
+
+async def test_snapshot_cached_within_ttl(station):
+    client = station["client"]
+
+    assert (await client.get_now_playing())["title"] == "First"
+    station["songs"].append("Second")
+    assert (await client.get_now_playing())["title"] == "First"
+    assert station["requests"] == 1
+
+async def test_invalidate_fetches_current_song(station):
+    client = station["client"]
+    await client.get_now_playing()
+    station["songs"].append("Second")
+
+    client.invalidate_now_playing()
+
+    assert (await client.get_now_playing())["title"] == "Second"
+    assert station["requests"] == 2
+
+async def test_invalidate_during_fetch_discards_stale_snapshot(station):
+    client = station["client"]
+    station["gate"] = asyncio.Event()
+    # Pobranie rozpoczęte przed zmianą utworu, webhook przychodzi w jego trakcie
+    polling = asyncio.create_task(client.get_now_playing())
+    while station["requests"] == 0:
+        await asyncio.sleep(0)
+    station["songs"].append("Second")
+    client.invalidate_now_playing()
+    webhook = asyncio.create_task(client.get_now_playing())
+    station["gate"].set()
+
+    assert (await polling)["title"] == "First"
+    assert (await webhook)["title"] == "Second"
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+from sqlalchemy import update
+
+from src import models
+from src.services import ingestion
+
+pytestmark = pytest.mark.anyio
+
+async def _queued(db, **values) -> models.Suggestion:
+    suggestion = models.Suggestion(
+        raw_input="https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        source_type="YOUTUBE",
+        title="Rick Astley - Never Gonna Give You Up",
+        youtube_id="dQw4w9WgXcQ",
+        status="QUEUED",
+        **values,
+    )
+    db.add(suggestion)
+    await db.commit()
+    return suggestion
+
+def _remote_path(suggestion: models.Suggestion) -> str:
+    return f"suggestions/{ingestion._file_name(suggestion.id, ingestion._tags(suggestion))}"
+
+async def _ingest(sessionmaker, suggestion_id: int):
+    # Każde uruchomienie zadania Celery ma własną sesję (tasks.run_with_session)
+    async with sessionmaker() as session:
+        return await ingestion.ingest_suggestion(session, suggestion_id)
+
+async def _reload(sessionmaker, suggestion_id: int) -> models.Suggestion:
+    async with sessionmaker() as session:
+        return await session.get(models.Suggestion, suggestion_id)
+
+def _work_dir(settings, suggestion_id: int) -> str:
+    return os.path.join(settings.audio_temp_dir, "suggestions", str(suggestion_id))
+
+async def test_chunked_flow_upload(db, sessionmaker, settings, azuracast, pipeline):
+    suggestion = await _queued(db)
+    remote_path = _remote_path(suggestion)
+
+    result = await _ingest(sessionmaker, suggestion.id)
+
+    assert result == {"status": "processed", "id": suggestion.id, "path": remote_path}
+    assert azuracast.files[remote_path] == pipeline.AUDIO
+
+    # 2564 B w kawałkach po 1024 B -> 3 żądania Flow.js z tym samym identyfikatorem
+    assert [fields["flowChunkNumber"] for fields in azuracast.uploads] == ["1", "2", "3"]
+    assert [fields["flowCurrentChunkSize"] for fields in azuracast.uploads] == ["1024", "1024", "516"]
+    assert {fields["flowTotalChunks"] for fields in azuracast.uploads} == {"3"}
+    assert {fields["flowTotalSize"] for fields in azuracast.uploads} == {str(len(pipeline.AUDIO))}
+    identifiers = {fields["flowIdentifier"] for fields in azuracast.uploads}
+    assert len(identifiers) == 1 and identifiers.pop().startswith(f"suggestion-{suggestion.id}-")
+    assert {fields["currentDirectory"] for fields in azuracast.uploads} == {"suggestions"}
+
+    stored = await _reload(sessionmaker, suggestion.id)
+    assert stored.status == "PROCESSED"
+    assert stored.ingest_progress == 100
+    assert stored.ingest_attempts == 1
+    assert stored.azuracast_path == remote_path
+    assert stored.loudness_lufs == -14.0
+    assert pipeline.stored == [remote_path]
+    assert not os.path.exists(_work_dir(settings, suggestion.id))
+
+async def test_existing_file_skips_upload(db, sessionmaker, settings, azuracast, pipeline):
+    suggestion = await _queued(db)
+    remote_path = _remote_path(suggestion)
+    azuracast.files[remote_path] = b"uploaded by a previous attempt"
+
+    result = await _ingest(sessionmaker, suggestion.id)
+
+    assert result["status"] == "processed"
+    assert azuracast.listings == ["suggestions"]
+    assert azuracast.uploads == []
+    assert azuracast.files[remote_path] == b"uploaded by a previous attempt"
+    stored = await _reload(sessionmaker, suggestion.id)
+    assert stored.status == "PROCESSED"
+    assert stored.azuracast_path == remote_path
+
+async def test_retry_backoff_until_failed(db, sessionmaker, settings, azuracast, pipeline):
+    suggestion = await _queued(db)
+    azuracast.fail_uploads = 100
+
+    results = [await _ingest(sessionmaker, suggestion.id) for _ in range(settings.ingest_max_attempts)]
+
+    assert [result["status"] for result in results] == ["retry", "retry", "failed"]
+    assert [result.get("delay") for result in results[:2]] == [10, 20]
+
+    stored = await _reload(sessionmaker, suggestion.id)
+    assert stored.status == "FAILED"
+    assert stored.ingest_attempts == 3
+    assert "500" in stored.ingest_error
+    # Ponowienia zaczynają od gotowego pliku - pobranie tylko w pierwszej próbie
+    assert len(pipeline.downloads) == 1
+    assert azuracast.files == {}
+    assert not os.path.exists(_work_dir(settings, suggestion.id))
+
+    # Po FAILED kolejne wywołanie nic nie robi
+    assert (await _ingest(sessionmaker, suggestion.id))["status"] == "skipped"
+
+async def test_retry_resumes_upload_with_same_identifier(db, sessionmaker, settings, azuracast, pipeline):
+    suggestion = await _queued(db)
+    azuracast.fail_uploads = 1
+
+    first = await _ingest(sessionmaker, suggestion.id)
+    second = await _ingest(sessionmaker, suggestion.id)
+
+    assert first["status"] == "retry"
+    assert second["status"] == "processed"
+    assert len({fields["flowIdentifier"] for fields in azuracast.uploads}) == 1
+    assert azuracast.files[_remote_path(suggestion)] == pipeline.AUDIO
+    assert (await _reload(sessionmaker, suggestion.id)).ingest_attempts == 2
+
+async def test_moderator_cancel_during_upload(db, sessionmaker, settings, azuracast, pipeline):
+    suggestion = await _queued(db)
+
+    async def reject(chunk_number: int):
+        if chunk_number == 1:
+            async with sessionmaker() as moderator:
+                await moderator.execute(
+                    update(models.Suggestion).where(models.Suggestion.id == suggestion.id).values(status="REJECTED")
+                )
+                await moderator.commit()
+
+    azuracast.on_chunk = reject
+
+    result = await _ingest(sessionmaker, suggestion.id)
+
+    assert result == {"status": "cancelled", "id": suggestion.id}
+    # Przerwane przy aktualizacji postępu po pierwszym kawałku - reszta pliku nie wychodzi
+    assert len(azuracast.uploads) == 1
+    assert azuracast.files == {}
+    stored = await _reload(sessionmaker, suggestion.id)
+    assert stored.status == "REJECTED"
+    assert stored.azuracast_path is None
+    assert pipeline.stored == []
+    assert not os.path.exists(_work_dir(settings, suggestion.id))
+
+async def test_transition_raises_cancelled_after_status_change(db, sessionmaker):
+    suggestion = await _queued(db)
+    async with sessionmaker() as moderator:
+        await moderator.execute(
+            update(models.Suggestion).where(models.Suggestion.id == suggestion.id).values(status="REJECTED")
+        )
+        await moderator.commit()
+
+    with pytest.raises(ingestion.IngestCancelled):
+        await ingestion._transition(db, suggestion.id, ("QUEUED",), "DOWNLOADING")
+    assert (await _reload(sessionmaker, suggestion.id)).status == "REJECTED"
@@ -0,0 +1,46 @@
+import pytest
+
+from src import models
+from src.services.leaderboard import Leaderboard
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def board(monkeypatch, sessionmaker):
+    """Ranking na fallbacku SQL (bez Redisa) z użytkownikami także z 0 / NULL XP"""
+    async with sessionmaker() as db:
+        db.add_all([
+            models.User(id=1, username="top", xp=50),
+            models.User(id=2, username="zero", xp=0),
+            models.User(id=3, username="unset", xp=None),
+            models.User(id=4, username="hidden", xp=10, hide_activity=True),
+            models.User(id=5, username="mid", xp=10),
+        ])
+        await db.commit()
+
+    board = Leaderboard("redis://unused")
+
+    async def no_redis(db):
+        return False
+
+    monkeypatch.setattr(board, "_ready", no_redis)
+    async with sessionmaker() as db:
+        yield board, db
+
+async def test_all_time_board_includes_users_without_xp(board):
+    board, db = board
+
+    assert await board.top(db, "all") == [(1, 50), (5, 10), (2, 0), (3, 0)]
+
+async def test_rank_of_user_without_xp(board):
+    board, db = board
+    users = {user_id: await db.get(models.User, user_id) for user_id in (1, 2, 3, 4)}
+
+    assert await board.rank_of(db, users[1]) == (1, 50)
+    assert await board.rank_of(db, users[2]) == (3, 0)
+    assert await board.rank_of(db, users[3]) == (4, 0)
+    assert await board.rank_of(db, users[4]) is None
+
+    position, neighbours = await board.around(db, users[3], radius=1)
+    assert position == 4
+    assert neighbours == [(3, 2, 0), (4, 3, 0)]
@@ -0,0 +1,66 @@
+import httpx
+import pytest
+
+from src import auth, models
+from src.database import get_db
+from src.main import app
+
+pytestmark = pytest.mark.anyio
+
+AUTHOR_ID = 2
+
+@pytest.fixture
+async def api(monkeypatch, sessionmaker):
+    admin = models.User(id=1, username="admin", is_admin=True)
+
+    async def current_user(request, db):
+        return admin
+
+    async def session():
+        async with sessionmaker() as db:
+            yield db
+
+    async with sessionmaker() as db:
+        db.add(models.User(id=AUTHOR_ID, username="author"))
+        await db.commit()
+
+    monkeypatch.setattr(auth, "get_current_user", current_user)
+    app.dependency_overrides[get_db] = session
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+    app.dependency_overrides.pop(get_db, None)
+
+async def _suggestion(sessionmaker, status: str) -> int:
+    async with sessionmaker() as db:
+        suggestion = models.Suggestion(user_id=AUTHOR_ID, raw_input="Artist - Title", source_type="TEXT", title="Title", status=status)
+        db.add(suggestion)
+        await db.commit()
+        return suggestion.id
+
+async def _status(sessionmaker, suggestion_id: int) -> str:
+    async with sessionmaker() as db:
+        return (await db.get(models.Suggestion, suggestion_id)).status
+
+@pytest.mark.parametrize("status", ["PENDING", "REJECTED", "FAILED", "APPROVED"])
+async def test_approve_allowed(api, sessionmaker, status):
+    suggestion_id = await _suggestion(sessionmaker, status)
+
+    response = await api.post(f"/api/suggestions/{suggestion_id}/approve")
+
+    assert response.status_code == 200
+    assert await _status(sessionmaker, suggestion_id) == "APPROVED"
+
+@pytest.mark.parametrize("status", ["QUEUED", "UPLOADING", "PROCESSED", "DUPLICATE"])
+async def test_approve_conflict_keeps_status(api, sessionmaker, status):
+    # Akceptacja w toku lub po przetwarzaniu uruchomiłaby pobieranie i wysyłkę drugi raz
+    suggestion_id = await _suggestion(sessionmaker, status)
+
+    response = await api.post(f"/api/suggestions/{suggestion_id}/approve")
+
+    assert response.status_code == 409
+    assert await _status(sessionmaker, suggestion_id) == status
+
+async def test_approve_missing(api):
+    response = await api.post("/api/suggestions/999/approve")
+
+    assert response.status_code == 404
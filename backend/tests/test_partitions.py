@@ -0,0 +1,120 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from src import models
+from src.services import partitions
+
+pytestmark = pytest.mark.anyio
+
+TODAY = datetime.now(timezone.utc).date()
+THIS_MONTH = date(TODAY.year, TODAY.month, 1)
+
+def _months_back(months: int) -> date:
+    return partitions._add_months(THIS_MONTH, -months)
+
+@pytest.fixture
+async def legacy_votes(pg_engine):
+    """Zwykła (niepartycjonowana) tabela votes z głosami z kilku miesięcy - stan sprzed migracji"""
+    async with pg_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE users (id serial PRIMARY KEY)"))
+        await conn.execute(text("INSERT INTO users (id) VALUES (1), (2)"))
+        await conn.run_sync(lambda sync_conn: models.Vote.__table__.create(sync_conn))
+
+        rows = []
+        for months in (14, 3, 1, 0):
+            month = _months_back(months)
+            for day in (1, 15):
+                rows.append({
+                    "user_id": 1 + day % 2, "song_id": f"s{months}-{day}", "vote_type": "LIKE",
+                    "created_at": datetime(month.year, month.month, day, 12, tzinfo=timezone.utc),
+                })
+        # Ostatni dzień miesiąca tuż przed północą UTC - granica partycji
+        rows.append({
+            "user_id": 1, "song_id": "edge", "vote_type": "DISLIKE",
+            "created_at": datetime.combine(THIS_MONTH, datetime.min.time(), tzinfo=timezone.utc) - timedelta(microseconds=1),
+        })
+        await conn.execute(models.Vote.__table__.insert(), rows)
+        await conn.execute(text("INSERT INTO votes (user_id, song_id, vote_type, created_at) VALUES (2, 'no-date', 'LIKE', NULL)"))
+    return pg_engine
+
+async def _rows(conn):
+    result = await conn.execute(text("""
+        SELECT id, user_id, song_id, vote_type, created_at, tableoid::regclass::text AS partition
+        FROM votes ORDER BY id
+    """))
+    return result.mappings().all()
+
+async def test_convert_moves_rows_into_monthly_partitions(legacy_votes):
+    async with legacy_votes.begin() as conn:
+        before = (await conn.execute(text("SELECT id, user_id, song_id, vote_type, created_at FROM votes ORDER BY id"))).all()
+
+        await partitions.convert_to_partitioned(conn, "votes")
+
+        assert await partitions.is_partitioned(conn, "votes")
+        rows = await _rows(conn)
+
+    # Te same wiersze i identyfikatory; created_at NULL uzupełniony bieżącym czasem
+    assert [(row["id"], row["user_id"], row["song_id"], row["vote_type"]) for row in rows] == [tuple(row[:4]) for row in before]
+    assert [row["created_at"] for row in rows[:-1]] == [row[4] for row in before[:-1]]
+    assert rows[-1]["created_at"] is not None
+
+    for row in rows:
+        expected = partitions.partition_name("votes", row["created_at"].astimezone(timezone.utc).date().replace(day=1))
+        assert row["partition"] == expected, row["song_id"]
+
+async def test_convert_creates_partitions_from_oldest_month(legacy_votes):
+    async with legacy_votes.begin() as conn:
+        await partitions.convert_to_partitioned(conn, "votes")
+        names = await partitions.list_partitions(conn, "votes")
+        legacy_left = (await conn.execute(text("SELECT to_regclass('votes_legacy')"))).scalar()
+
+    months_ahead = partitions.config.settings.partition_months_ahead
+    expected = [
+        partitions.partition_name("votes", _months_back(months))
+        for months in range(14, -months_ahead - 1, -1)
+    ]
+    assert names == sorted(expected + ["votes_default"])
+    assert legacy_left is None
+
+async def test_sequence_and_keys_survive_conversion(legacy_votes):
+    async with legacy_votes.begin() as conn:
+        max_id = (await conn.execute(text("SELECT MAX(id) FROM votes"))).scalar()
+        await partitions.convert_to_partitioned(conn, "votes")
+
+        new_id = (await conn.execute(text(
+            "INSERT INTO votes (user_id, song_id, vote_type, created_at) VALUES (1, 'new', 'LIKE', now()) RETURNING id"
+        ))).scalar()
+        primary_key = (await conn.execute(text("""
+            SELECT string_agg(a.attname, ',' ORDER BY array_position(i.indkey, a.attnum))
+            FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = 'votes'::regclass AND i.indisprimary
+        """))).scalar()
+        # Klucz obcy do users przeniesiony na nową tabelę
+        with pytest.raises(IntegrityError):
+            async with conn.begin_nested():
+                await conn.execute(text("INSERT INTO votes (user_id, song_id, vote_type, created_at) VALUES (99, 'x', 'LIKE', now())"))
+
+    assert new_id > max_id
+    assert primary_key == "id,created_at"
+
+async def test_ensure_partitions_is_idempotent_and_fills_ahead(legacy_votes):
+    async with legacy_votes.begin() as conn:
+        await partitions.convert_to_partitioned(conn, "votes")
+
+        assert await partitions.ensure_partitions(conn, "votes") == 0
+        created = await partitions.ensure_partitions(conn, "votes", months_ahead=partitions.config.settings.partition_months_ahead + 2)
+        names = await partitions.list_partitions(conn, "votes")
+
+        # Wiersz spoza zakresu partycji miesięcznych trafia do partycji domyślnej
+        far = await conn.execute(text(
+            "INSERT INTO votes (user_id, song_id, vote_type, created_at) VALUES (1, 'far', 'LIKE', now() + interval '10 years') "
+            "RETURNING tableoid::regclass::text"
+        ))
+        far_partition = far.scalar()
+
+    assert created == 2
+    assert partitions.partition_name("votes", partitions._add_months(THIS_MONTH, partitions.config.settings.partition_months_ahead + 2)) in names
+    assert far_partition == "votes_default"
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src import models
+from src.services.xp_compaction import compact_listening_awards
+from src.services.xp_history import SESSION_GAP_SECONDS
+
+pytestmark = pytest.mark.anyio
+
+# Wiersze starsze niż cutoff (now - 24 h) o kilka dni
+BASE = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=3)
+
+@pytest.fixture
+async def db(pg_engine, pg_sessionmaker):
+    async with pg_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE users (id integer PRIMARY KEY)"))
+        await conn.execute(text("INSERT INTO users (id) VALUES (1), (2)"))
+        await conn.run_sync(lambda sync_conn: models.XpAward.__table__.create(sync_conn))
+    async with pg_sessionmaker() as session:
+        yield session
+
+def _session(user_id: int, start: datetime, minutes: int, xp: int = 1):
+    return [
+        {"user_id": user_id, "award_type": "LISTENING", "xp_amount": xp, "song_id": None, "created_at": start + timedelta(minutes=offset)}
+        for offset in range(minutes)
+    ]
+
+async def _insert(db, rows):
+    await db.execute(models.XpAward.__table__.insert(), rows)
+    await db.commit()
+
+async def _listening(db, user_id: int):
+    result = await db.execute(text("""
+        SELECT COALESCE(started_at, created_at) AS started_at, created_at, xp_amount FROM xp_awards
+        WHERE user_id = :user_id AND award_type = 'LISTENING'
+        ORDER BY created_at, id
+    """), {"user_id": user_id})
+    return [tuple(row) for row in result.all()]
+
+async def _xp_totals(db):
+    result = await db.execute(text("SELECT user_id, award_type, SUM(xp_amount) FROM xp_awards GROUP BY 1, 2 ORDER BY 1, 2"))
+    return result.all()
+
+def _compacted(start: datetime, minutes: int, xp: int = 1):
+    return (start, start + timedelta(minutes=minutes - 1), minutes * xp)
+
+async def test_open_tail_held_back_until_next_batch(db):
+    first, second = BASE, BASE + timedelta(hours=2)
+    await _insert(db, _session(1, first, 5) + _session(1, second, 5))
+
+    # Partia 8 wierszy: sesja 1 w całości, z sesji 2 tylko 3 wiersze - może mieć ciąg dalszy, czeka
+    stats = await compact_listening_awards(db, older_than_hours=24, batch_size=8, max_batches=1)
+
+    assert stats["reclaimed"] == 4
+    rows = await _listening(db, 1)
+    assert rows[0] == _compacted(first, 5)
+    assert len(rows) == 6 and all(row[0] == row[1] for row in rows[1:])
+
+    stats = await compact_listening_awards(db, older_than_hours=24, batch_size=8)
+
+    assert stats["reclaimed"] == 4
+    assert await _listening(db, 1) == [_compacted(first, 5), _compacted(second, 5)]
+
+async def test_session_filling_whole_batch_grows_batch(db):
+    await _insert(db, _session(1, BASE, 20, xp=2) + _session(2, BASE, 3))
+
+    stats = await compact_listening_awards(db, older_than_hours=24, batch_size=8)
+
+    assert await _listening(db, 1) == [_compacted(BASE, 20, xp=2)]
+    assert await _listening(db, 2) == [_compacted(BASE, 3)]
+    assert stats["reclaimed"] == 19 + 2
+
+async def test_session_ending_near_cutoff_stays_raw(db):
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
+    # Koniec bliżej cutoff niż przerwa sesji - kolejna minuta (już po cutoff) może ją jeszcze przedłużyć
+    recent_start = cutoff - timedelta(seconds=SESSION_GAP_SECONDS // 2) - timedelta(minutes=3)
+    await _insert(db, _session(1, BASE, 4) + _session(1, recent_start, 4))
+
+    await compact_listening_awards(db, older_than_hours=24, batch_size=100)
+
+    rows = await _listening(db, 1)
+    assert rows[0] == _compacted(BASE, 4)
+    assert len(rows) == 5 and all(row[0] == row[1] for row in rows[1:])
+
+async def test_xp_totals_unchanged_and_second_run_is_noop(db):
+    rows = []
+    for user_id in (1, 2):
+        for index, minutes in enumerate((1, 7, 12, 3, 30)):
+            rows += _session(user_id, BASE + timedelta(hours=index * 3), minutes, xp=user_id)
+        # Przerwa równa SESSION_GAP_SECONDS nie rozdziela sesji
+        rows += _session(user_id, BASE + timedelta(hours=20), 2)
+        rows += _session(user_id, BASE + timedelta(hours=20, minutes=1, seconds=SESSION_GAP_SECONDS), 2)
+    rows.append({"user_id": 1, "award_type": "VOTE", "xp_amount": 10, "song_id": "s1", "created_at": BASE + timedelta(minutes=3)})
+    await _insert(db, rows)
+    totals = await _xp_totals(db)
+
+    stats = await compact_listening_awards(db, older_than_hours=24, batch_size=16)
+
+    assert await _xp_totals(db) == totals
+    assert stats["sessions"] == 2 * 5
+    for user_id in (1, 2):
+        listening = await _listening(db, user_id)
+        assert len(listening) == 6
+        assert listening[-1] == (BASE + timedelta(hours=20), BASE + timedelta(hours=20, minutes=2, seconds=SESSION_GAP_SECONDS), 4)
+
+    again = await compact_listening_awards(db, older_than_hours=24, batch_size=16)
+    assert again["reclaimed"] == 0 and again["scanned"] == 0
@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+
+from src import models
+from src.services import xp_history
+from src.services.pagination import decode_cursor, parse_datetime
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = 1
+T0 = datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+async def history(monkeypatch, pg_engine, pg_sessionmaker):
+    async with pg_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE users (id integer PRIMARY KEY)"))
+        await conn.execute(text("INSERT INTO users (id) VALUES (:id)"), {"id": USER_ID})
+        await conn.run_sync(lambda sync_conn: models.XpAward.__table__.create(sync_conn))
+
+    async def no_song_info(song_ids):
+        return {}
+
+    monkeypatch.setattr(xp_history.azuracast_client, "get_songs_info_batch", no_song_info)
+    monkeypatch.setattr(xp_history, "SCAN_LIMIT", 10)
+    async with pg_sessionmaker() as db:
+        yield db
+
+async def _insert(db, rows):
+    await db.execute(models.XpAward.__table__.insert(), [
+        {"user_id": USER_ID, "award_type": award_type, "xp_amount": xp, "song_id": song_id, "created_at": T0 + timedelta(minutes=minute)}
+        for award_type, minute, xp, song_id in rows
+    ])
+    await db.commit()
+
+def _listening(first_minute: int, count: int):
+    return [("LISTENING", first_minute + offset, 1, None) for offset in range(count)]
+
+def _vote(minute: float, song_id: str):
+    return [("VOTE", minute, 10, song_id)]
+
+async def _pages(db, limit: int):
+    """Wszystkie strony historii po kolejnych kursorach"""
+    pages, before = [], None
+    for _ in range(50):
+        items, cursor = await xp_history.fetch_xp_history(db, USER_ID, limit, before)
+        pages.append(items)
+        if not cursor:
+            return pages
+        at, award_id = decode_cursor(cursor)
+        before = (parse_datetime(at), int(award_id))
+    raise AssertionError("pagination did not terminate")
+
+def _summary(items):
+    return [
+        (item["type"], item["xp"], item.get("started_at"), item["created_at"])
+        for item in items
+    ]
+
+def _session(first_minute: int, count: int):
+    return ("listening", count, (T0 + timedelta(minutes=first_minute)).isoformat(), (T0 + timedelta(minutes=first_minute + count - 1)).isoformat())
+
+def _vote_item(minute: float):
+    return ("vote", 10, None, (T0 + timedelta(minutes=minute)).isoformat())
+
+async def test_session_straddling_scan_limit_moves_to_next_page(history):
+    # Skan 10 najnowszych wierszy: głos + 8 wierszy sesji B + 1 wiersz sesji A - A ucięta przez SCAN_LIMIT
+    await _insert(history, _listening(0, 6) + _listening(30, 8) + _vote(60, "s1"))
+
+    pages = await _pages(history, limit=20)
+
+    assert [_summary(page) for page in pages] == [
+        [_vote_item(60), _session(30, 8)],
+        [_session(0, 6)],
+    ]
+
+async def test_paging_across_deferred_session(history):
+    await _insert(history, _listening(0, 6) + _listening(30, 8) + _vote(60, "s1"))
+
+    pages = await _pages(history, limit=1)
+
+    # Strona 2: B i odłożona A; kolejny kursor to pierwszy wiersz nad końcem A, nie kursor elementu B
+    assert [_summary(page) for page in pages] == [
+        [_vote_item(60)],
+        [_session(30, 8)],
+        [_session(0, 6)],
+    ]
+
+async def test_session_longer_than_scan_limit_keeps_paging(history):
+    # Sesja dłuższa niż SCAN_LIMIT z głosami w trakcie, pod nią krótsza sesja i głos
+    await _insert(
+        history,
+        _vote(-30, "s0") + _listening(-20, 5) + _listening(0, 25)
+        + _vote(3.5, "s1") + _vote(12.5, "s2") + _vote(20.5, "s3") + _vote(40, "s4")
+    )
+
+    pages = await _pages(history, limit=20)
+    items = [item for page in pages for item in page]
+
+    votes = sorted(item["created_at"] for item in items if item["type"] == "vote")
+    assert votes == sorted(_vote_item(minute)[3] for minute in (-30, 3.5, 12.5, 20.5, 40))
+    assert len({item["id"] for item in items}) == len(items)
+    # Długa sesja pokazana raz (ucięta do SCAN_LIMIT), krótsza pod nią w całości
+    sessions = [item for item in items if item["type"] == "listening"]
+    assert len(sessions) == 2
+    assert _summary([sessions[-1]]) == [_session(-20, 5)]
+
+async def test_rescan_limit_resumes_on_next_page(history, monkeypatch):
+    monkeypatch.setattr(xp_history, "MAX_RESCANS", 0)
+    await _insert(history, _listening(-20, 5) + _listening(0, 25) + _vote(12.5, "s1") + _vote(40, "s2"))
+
+    pages = await _pages(history, limit=20)
+    items = [item for page in pages for item in page]
+
+    assert sorted(item["created_at"] for item in items if item["type"] == "vote") == [
+        _vote_item(12.5)[3], _vote_item(40)[3]
+    ]
+    assert _summary([items[-1]]) == [_session(-20, 5)]
+    assert len({item["id"] for item in items}) == len(items)
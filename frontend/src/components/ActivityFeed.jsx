@@ -1,6 +1,7 @@
 import { useState, useEffect } from "react";
 import { Music, Heart, UserPlus, Radio, Activity, ThumbsUp, ThumbsDown } from "lucide-react";
 import api from "../api";
+import { useRadioEvents } from "../contexts/RadioEventsContext";
 import UserTooltip from "./UserTooltip";
 import Card from "./Card";
 import SectionHeader from "./SectionHeader";
@@ -82,37 +83,45 @@ const formatTimeAgo = (minutesAgo) => {
   return `${monthsAgo} miesięcy temu`;
 };
 
+const FEED_LIMIT = 10;
+
+const timeAgo = (timestamp) =>
+  formatTimeAgo(Math.floor((Date.now() - timestamp.getTime()) / 60000));
+
+const toFeedItem = (item) => {
+  const timestamp = item.timestamp ? new Date(item.timestamp) : new Date();
+
+  return {
+    id: item.id || item.timestamp || Date.now(),
+    text: item.text,
+    username: item.username,
+    user_id: item.user_id,
+    avatar_url: item.avatar_url,
+    type: item.type,
+    vote_type: item.vote_type,
+    timestamp,
+    featured_badge: item.featured_badge,
+  };
+};
+
 export default function ActivityFeed() {
   const [feed, setFeed] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [, setTick] = useState(0);
+  const { subscribeActivity, isConnected } = useRadioEvents();
+
+  // Odświeżanie względnych czasów ("5 min temu") bez zapytań do API
+  useEffect(() => {
+    const interval = setInterval(() => setTick((tick) => tick + 1), 60000);
+    return () => clearInterval(interval);
+  }, []);
 
+  // Pełna lista przy starcie i po ponownym połączeniu SSE, dalej tylko zdarzenia "activity"
   useEffect(() => {
     const loadActivity = async () => {
       try {
-        const res = await api.get("/activity?limit=10");
-        const activities = res.data.map((item) => {
-          const Icon = iconMap[item.icon] || Music;
-          const timestamp = item.timestamp
-            ? new Date(item.timestamp)
-            : new Date();
-          const minutesAgo = Math.floor(
-            (Date.now() - timestamp.getTime()) / 60000
-          );
-          const timeText = formatTimeAgo(minutesAgo);
-
-          return {
-            id: item.timestamp || Date.now(),
-            text: item.text,
-            username: item.username,
-            user_id: item.user_id,
-            avatar_url: item.avatar_url,
-            type: item.type,
-            vote_type: item.vote_type,
-            time: timeText,
-            featured_badge: item.featured_badge,
-          };
-        });
-        setFeed(activities);
+        const res = await api.get(`/activity?limit=${FEED_LIMIT}`);
+        setFeed(res.data.map(toFeedItem));
       } catch (error) {
         console.error("Load activity error:", error);
       } finally {
@@ -121,9 +130,20 @@ export default function ActivityFeed() {
     };
 
     loadActivity();
-    const interval = setInterval(loadActivity, 30000);
-    return () => clearInterval(interval);
-  }, []);
+  }, [isConnected]);
+
+  // Każde zdarzenie osobną aktualizacją - kilka zdarzeń naraz (np. paczka propozycji) nie nadpisuje się
+  useEffect(
+    () =>
+      subscribeActivity(({ type, data }) => {
+        setFeed((prev) => {
+          const rest = prev.filter((item) => item.id !== data.id);
+          if (type === "activity_removed") return rest;
+          return [toFeedItem(data), ...rest].slice(0, FEED_LIMIT);
+        });
+      }),
+    [subscribeActivity]
+  );
 
   const renderActivityText = (item) => {
     if (!item.username || !item.user_id) return item.text;
@@ -239,7 +259,7 @@ export default function ActivityFeed() {
                   </div>
                 </div>
                 <div className="font-mono text-[10px] text-text-secondary shrink-0">
-                  {item.time}
+                  {timeAgo(item.timestamp)}
                 </div>
               </div>
             );
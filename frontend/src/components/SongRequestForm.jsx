@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useUser } from "../contexts/UserContext";
 import { useToast } from "./ToastContainer";
 import api from "../api";
@@ -17,6 +17,11 @@ export default function SongRequestForm() {
   const [selectedItems, setSelectedItems] = useState(new Set());
   const [error, setError] = useState(null);
   const [submittedItems, setSubmittedItems] = useState(new Map());
+  const [streaming, setStreaming] = useState(false);
+  const streamRef = useRef(null);
+
+  // Przerwanie strumienia podglądu przy odmontowaniu - backend zatrzymuje wtedy ekstrakcję
+  useEffect(() => () => streamRef.current?.abort(), []);
 
   if (!user) {
     return (
@@ -40,15 +45,104 @@ export default function SongRequestForm() {
     return item.youtube_id || item.url || item.title || "";
   };
 
+  const isPlaylistInput = (value) =>
+    /(youtube\.com|youtu\.be)/i.test(value) && /(playlist|list=)/i.test(value);
+
+  const appendPlaylistItems = (items, offset) => {
+    setPreview((prev) => {
+      const merged = [...(prev?.items || []), ...items];
+      return { type: "playlist", items: merged, count: merged.length };
+    });
+    setSelectedItems((prev) => {
+      const next = new Set(prev);
+      items.forEach((_, idx) => next.add(offset + idx));
+      return next;
+    });
+    setSubmittedItems((prev) => {
+      const next = new Map(prev);
+      items.forEach((item) => {
+        if (item.existing) {
+          next.set(getItemKey(item), {
+            status: "duplicate",
+            title: item.title,
+            existing_status: item.existing.status,
+          });
+        }
+      });
+      return next;
+    });
+  };
+
+  // Podgląd playlisty jako NDJSON - pozycje pojawiają się w miarę pobierania
+  const streamPlaylistPreview = async (value) => {
+    const controller = new AbortController();
+    streamRef.current = controller;
+    setStreaming(true);
+
+    try {
+      const res = await fetch("/api/suggestions/preview/stream", {
+        method: "POST",
+        credentials: "include",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ input: value }),
+        signal: controller.signal,
+      });
+      if (!res.ok) {
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.detail || "Błąd podczas pobierania podglądu");
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let received = 0;
+      for (;;) {
+        const { value: chunk, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(chunk, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const message = JSON.parse(line);
+          if (message.type === "items") {
+            appendPlaylistItems(message.items, received);
+            received += message.items.length;
+            setLoading(false);
+          } else if (message.type === "error") {
+            throw new Error(message.message);
+          }
+        }
+      }
+    } catch (error) {
+      if (error.name === "AbortError") return;
+      const message = error.message || "Błąd podczas pobierania podglądu";
+      setError(message);
+      showToast(message, "error");
+    } finally {
+      if (streamRef.current === controller) {
+        streamRef.current = null;
+        setStreaming(false);
+        setLoading(false);
+      }
+    }
+  };
+
   const handlePreview = async () => {
     if (!input.trim()) return;
 
+    streamRef.current?.abort();
     setLoading(true);
     setError(null);
     setPreview(null);
     setSelectedItems(new Set());
     setSubmittedItems(new Map());
 
+    if (isPlaylistInput(input)) {
+      await streamPlaylistPreview(input.trim());
+      return;
+    }
+
     try {
       const res = await api.post("/suggestions/preview", { input });
       setPreview(res.data);
@@ -247,11 +341,35 @@ export default function SongRequestForm() {
         return "ODRZUCONA";
       case "PROCESSED":
         return "PRZETWORZONA";
+      case "QUEUED":
+        return "W KOLEJCE";
+      case "DOWNLOADING":
+        return "POBIERANIE";
+      case "ANALYZING":
+        return "ANALIZA";
+      case "TRANSCODING":
+        return "KONWERSJA";
+      case "UPLOADING":
+        return "WYSYŁANIE";
+      case "FAILED":
+        return "BŁĄD PRZETWARZANIA";
+      case "DUPLICATE":
+        return "JUŻ W BIBLIOTECE";
       default:
         return status;
     }
   };
 
+  const getCatalogLabel = (catalog) => {
+    if (!catalog) return null;
+    if (catalog.kind === "library") {
+      return catalog.match === "similar" ? "≈ PODOBNY W BIBLIOTECE" : "♪ W BIBLIOTECE";
+    }
+    return catalog.match === "similar"
+      ? "≈ PODOBNY JUŻ ZAPROPONOWANY"
+      : `⚠ JUŻ ZAPROPONOWANE (${getStatusLabel(catalog.status)})`;
+  };
+
   return (
     <Card className="space-y-4 relative">
       <div className="flex items-center gap-2">
@@ -438,7 +556,7 @@ export default function SongRequestForm() {
                 <>
                   <div className="flex items-center justify-between">
                     <div className="font-header text-sm text-primary">
-                      PLAYLIST ({preview.count} utworów)
+                      PLAYLIST ({preview.count} utworów{streaming ? ", wczytywanie…" : ""})
                     </div>
                     <div className="flex gap-2">
                       <button
@@ -525,6 +643,11 @@ export default function SongRequestForm() {
                                       {submitted.status === "sent" ? "✓ WYSŁANO" : `⚠ JUŻ ISTNIEJE (${getStatusLabel(submitted.existing_status)})`}
                                     </div>
                                   )}
+                                  {!submitted && item.catalog && (
+                                    <div className="font-mono text-[9px] text-yellow-400">
+                                      {getCatalogLabel(item.catalog)}
+                                    </div>
+                                  )}
                                 </div>
                               </div>
                             </div>
@@ -540,7 +663,7 @@ export default function SongRequestForm() {
                     </div>
                     <Button
                       onClick={handleSubmit}
-                      disabled={submitting || selectedItems.size === 0}
+                      disabled={submitting || streaming || selectedItems.size === 0}
                       variant="primary"
                       size="md"
                       className="whitespace-nowrap"
@@ -576,6 +699,11 @@ export default function SongRequestForm() {
                       <div className="font-mono text-[10px] text-text-secondary">
                         {preview.source_type} • {formatDuration(preview.duration_seconds)}
                       </div>
+                      {!submittedItems.get(getItemKey(preview)) && preview.catalog && (
+                        <div className="font-mono text-[10px] mt-1 text-yellow-400">
+                          {getCatalogLabel(preview.catalog)}
+                        </div>
+                      )}
                       {(() => {
                         const key = getItemKey(preview);
                         const submitted = submittedItems.get(key);
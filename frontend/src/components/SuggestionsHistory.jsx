@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { useUser } from "../contexts/UserContext";
 import api from "../api";
 import Card from "./Card";
+import Button from "./Button";
 import { motion } from "framer-motion";
 import { Loader2, Clock, CheckCircle2, XCircle, Hourglass } from "lucide-react";
 
@@ -9,6 +10,8 @@ export default function SuggestionsHistory() {
   const { user } = useUser();
   const [suggestions, setSuggestions] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (!user) {
@@ -16,23 +19,67 @@ export default function SuggestionsHistory() {
       return;
     }
 
+    let deltaCursor = null;
+
     const loadHistory = async () => {
       try {
-        const res = await api.get("/suggestions");
+        const res = await api.get("/suggestions", { params: { limit: 50 } });
         setSuggestions(res.data || []);
+        setNextCursor(res.headers["x-next-cursor"] || null);
+        deltaCursor = res.headers["x-delta-cursor"] || null;
       } catch (error) {
         console.error("Load suggestions error:", error);
         setSuggestions([]);
+        setNextCursor(null);
       } finally {
         setLoading(false);
       }
     };
 
+    // Odpytywanie pobiera tylko nowe lub zmienione propozycje od ostatniego tokena
+    const loadChanges = async () => {
+      if (!deltaCursor) return loadHistory();
+      try {
+        const res = await api.get("/suggestions", { params: { since: deltaCursor } });
+        deltaCursor = res.headers["x-delta-cursor"] || deltaCursor;
+        const changed = res.data || [];
+        if (changed.length === 0) return;
+        setSuggestions((prev) => {
+          const byId = new Map(prev.map((s) => [s.id, s]));
+          changed.forEach((s) => byId.set(s.id, { ...byId.get(s.id), ...s }));
+          return [...byId.values()].sort(
+            (a, b) => new Date(b.created_at) - new Date(a.created_at) || b.id - a.id
+          );
+        });
+      } catch (error) {
+        console.error("Load suggestion changes error:", error);
+      }
+    };
+
     loadHistory();
-    const interval = setInterval(loadHistory, 30000);
+    const interval = setInterval(loadChanges, 30000);
     return () => clearInterval(interval);
   }, [user]);
 
+  // Starsze propozycje kolejnymi stronami keyset (X-Next-Cursor)
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const res = await api.get("/suggestions", { params: { limit: 50, cursor: nextCursor } });
+      // Delta mogła już dodać zmienioną starszą propozycję - bez duplikatów
+      setSuggestions((prev) => {
+        const known = new Set(prev.map((s) => s.id));
+        return [...prev, ...(res.data || []).filter((s) => !known.has(s.id))];
+      });
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (error) {
+      console.error("Load more suggestions error:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const getStatusIcon = (status) => {
     switch (status) {
       case "PENDING":
@@ -43,6 +90,8 @@ export default function SuggestionsHistory() {
         return <XCircle className="w-3 h-3 text-red-400" />;
       case "PROCESSED":
         return <CheckCircle2 className="w-3 h-3 text-primary" />;
+      case "FAILED":
+        return <XCircle className="w-3 h-3 text-yellow-400" />;
       default:
         return <Clock className="w-3 h-3 text-text-secondary" />;
     }
@@ -58,6 +107,20 @@ export default function SuggestionsHistory() {
         return "ODRZUCONA";
       case "PROCESSED":
         return "PRZETWORZONA";
+      case "QUEUED":
+        return "W KOLEJCE";
+      case "DOWNLOADING":
+        return "POBIERANIE";
+      case "ANALYZING":
+        return "ANALIZA";
+      case "TRANSCODING":
+        return "KONWERSJA";
+      case "UPLOADING":
+        return "WYSYŁANIE";
+      case "FAILED":
+        return "BŁĄD PRZETWARZANIA";
+      case "DUPLICATE":
+        return "JUŻ W BIBLIOTECE";
       default:
         return status;
     }
@@ -208,6 +271,17 @@ export default function SuggestionsHistory() {
               </Card>
             </motion.div>
           ))}
+          {nextCursor && (
+            <Button
+              onClick={loadMore}
+              variant="default"
+              size="sm"
+              className="w-full"
+              disabled={loadingMore}
+            >
+              {loadingMore ? <Loader2 className="w-3 h-3 animate-spin mx-auto" /> : "WCZYTAJ WIĘCEJ"}
+            </Button>
+          )}
         </div>
       )}
     </Card>
@@ -1,4 +1,4 @@
-import { createContext, useContext, useEffect, useState, useCallback } from "react";
+import { createContext, useContext, useEffect, useState, useCallback, useRef } from "react";
 import api from "../api";
 
 const RadioEventsContext = createContext();
@@ -17,6 +17,16 @@ export const RadioEventsProvider = ({ children }) => {
   const [nextSong, setNextSong] = useState(null);
   const [isConnected, setIsConnected] = useState(false);
   const [listenerId, setListenerId] = useState(null);
+  // Subskrybenci zdarzeń "activity" - każde zdarzenie trafia do nich osobno
+  // (stan z jednym zdarzeniem gubiłby kolejne przy zdarzeniach wysłanych jedno po drugim)
+  const activityListeners = useRef(new Set());
+
+  const subscribeActivity = useCallback((listener) => {
+    activityListeners.current.add(listener);
+    return () => {
+      activityListeners.current.delete(listener);
+    };
+  }, []);
 
   const handleEvent = useCallback((event) => {
     try {
@@ -36,6 +46,13 @@ export const RadioEventsProvider = ({ children }) => {
         setRecentSongs(data.data.songs || []);
       } else if (data.type === "next_song" && data.data) {
         setNextSong(data.data);
+      } else if (
+        (data.type === "activity" || data.type === "activity_removed") &&
+        data.data
+      ) {
+        activityListeners.current.forEach((listener) =>
+          listener({ type: data.type, data: data.data })
+        );
       } else if (data.type === "connected") {
         setIsConnected(true);
         if (data.listener_id) {
@@ -116,6 +133,7 @@ export const RadioEventsProvider = ({ children }) => {
         nextSong,
         isConnected,
         listenerId,
+        subscribeActivity,
       }}
     >
       {children}
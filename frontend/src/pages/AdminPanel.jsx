@@ -26,8 +26,15 @@ export default function AdminPanel() {
   const navigate = useNavigate();
   const [activeTab, setActiveTab] = useState("users");
   const [users, setUsers] = useState([]);
+  const [usersQuery, setUsersQuery] = useState("");
+  const [usersSort, setUsersSort] = useState("created_at");
+  const [usersCursor, setUsersCursor] = useState(null);
+  const [usersTotal, setUsersTotal] = useState(0);
   const [votes, setVotes] = useState([]);
   const [suggestions, setSuggestions] = useState([]);
+  const [suggestionsStatus, setSuggestionsStatus] = useState("");
+  const [suggestionsCursor, setSuggestionsCursor] = useState(null);
+  const [selectedSuggestions, setSelectedSuggestions] = useState([]);
   const [issues, setIssues] = useState([]);
   const [radioInfo, setRadioInfo] = useState(null);
   const [badges, setBadges] = useState([]);
@@ -50,20 +57,56 @@ export default function AdminPanel() {
       return;
     }
     loadData();
-  }, [user, activeTab]);
+  }, [user, activeTab, usersSort, suggestionsStatus]);
+
+  const loadUsers = async (cursor = null) => {
+    const params = { limit: 50, sort: usersSort };
+    if (usersQuery.trim()) params.q = usersQuery.trim();
+    if (cursor) params.cursor = cursor;
+    const res = await api.get("/admin/users", { params });
+    setUsers((prev) => (cursor ? [...prev, ...res.data] : res.data));
+    setUsersCursor(res.headers["x-next-cursor"] || null);
+    setUsersTotal(parseInt(res.headers["x-total-count"] || "0", 10));
+  };
+
+  const loadMoreUsers = async () => {
+    if (!usersCursor) return;
+    try {
+      await loadUsers(usersCursor);
+    } catch (error) {
+      console.error("Error loading users:", error);
+    }
+  };
+
+  const loadSuggestions = async (cursor = null) => {
+    const params = { limit: 50 };
+    if (suggestionsStatus) params.status = suggestionsStatus;
+    if (cursor) params.cursor = cursor;
+    const res = await api.get("/admin/suggestions", { params });
+    setSuggestions((prev) => (cursor ? [...prev, ...res.data] : res.data));
+    if (!cursor) setSelectedSuggestions([]);
+    setSuggestionsCursor(res.headers["x-next-cursor"] || null);
+  };
+
+  const loadMoreSuggestions = async () => {
+    if (!suggestionsCursor) return;
+    try {
+      await loadSuggestions(suggestionsCursor);
+    } catch (error) {
+      console.error("Error loading suggestions:", error);
+    }
+  };
 
   const loadData = async () => {
     setLoading(true);
     try {
       if (activeTab === "users") {
-        const res = await api.get("/admin/users");
-        setUsers(res.data);
+        await loadUsers();
       } else if (activeTab === "votes") {
         const res = await api.get("/admin/votes");
         setVotes(res.data);
       } else if (activeTab === "suggestions") {
-        const res = await api.get("/suggestions");
-        setSuggestions(res.data);
+        await loadSuggestions();
       } else if (activeTab === "issues") {
         const res = await api.get("/admin/issues");
         setIssues(res.data);
@@ -90,10 +133,16 @@ export default function AdminPanel() {
     return null;
   }
 
+  const setSuggestionStatus = (id, status) => {
+    setSuggestions((prev) =>
+      prev.map((s) => (s.id === id ? { ...s, status } : s))
+    );
+  };
+
   const handleApprove = async (id) => {
     try {
       await api.post(`/suggestions/${id}/approve`);
-      loadData();
+      setSuggestionStatus(id, "APPROVED");
     } catch (error) {
       console.error("Approve error:", error);
     }
@@ -102,12 +151,43 @@ export default function AdminPanel() {
   const handleReject = async (id) => {
     try {
       await api.post(`/suggestions/${id}/reject`);
-      loadData();
+      setSuggestionStatus(id, "REJECTED");
     } catch (error) {
       console.error("Reject error:", error);
     }
   };
 
+  const toggleSuggestion = (id) => {
+    setSelectedSuggestions((prev) =>
+      prev.includes(id) ? prev.filter((x) => x !== id) : [...prev, id]
+    );
+  };
+
+  const selectPendingSuggestions = () => {
+    setSelectedSuggestions(
+      suggestions.filter((s) => s.status === "PENDING").map((s) => s.id)
+    );
+  };
+
+  const handleBulkSuggestions = async (action) => {
+    if (selectedSuggestions.length === 0) return;
+    try {
+      const res = await api.post("/admin/suggestions/bulk", {
+        ids: selectedSuggestions,
+        action,
+      });
+      res.data.results
+        .filter((item) => item.result === "updated")
+        .forEach((item) => setSuggestionStatus(item.id, item.status));
+      if (res.data.skipped) {
+        alert(`Pominięto ${res.data.skipped} propozycji - ich status nie pozwala na tę zmianę`);
+      }
+      setSelectedSuggestions([]);
+    } catch (error) {
+      console.error("Bulk moderation error:", error);
+    }
+  };
+
   const handleApproveIssue = async (id) => {
     try {
       await api.post(`/admin/issues/${id}/approve`);
@@ -259,8 +339,35 @@ export default function AdminPanel() {
               as={motion.div}
               className=""
             >
+              <form
+                className="mb-4 flex gap-2"
+                onSubmit={(e) => {
+                  e.preventDefault();
+                  loadData();
+                }}
+              >
+                <input
+                  type="text"
+                  placeholder="Szukaj (nazwa, email)"
+                  value={usersQuery}
+                  onChange={(e) => setUsersQuery(e.target.value)}
+                  className="flex-1 bg-white/5 border border-white/10 px-3 py-2 font-mono text-xs text-text-primary focus:border-primary focus:outline-none"
+                />
+                <select
+                  value={usersSort}
+                  onChange={(e) => setUsersSort(e.target.value)}
+                  className="bg-white/5 border border-white/10 px-3 py-2 font-mono text-xs text-text-primary focus:border-primary focus:outline-none"
+                >
+                  <option value="created_at">Najnowsi</option>
+                  <option value="xp">XP</option>
+                  <option value="votes">Głosy</option>
+                </select>
+                <Button type="submit" variant="primary" size="sm">
+                  SZUKAJ
+                </Button>
+              </form>
               <div className="mb-4 font-mono text-xs text-text-secondary">
-                ŁĄCZNIE: {users.length} użytkowników
+                ŁĄCZNIE: {usersTotal} użytkowników
               </div>
               <div className="space-y-2 max-h-[600px] overflow-y-auto">
                 {users.map((u) => (
@@ -292,12 +399,23 @@ export default function AdminPanel() {
                       <div className="font-mono text-[10px] text-text-secondary space-x-3">
                         <span>ID: {u.id}</span>
                         <span>Reputacja: {u.reputation_score}</span>
+                        <span>XP: {u.xp}</span>
                         <span>Głosy: {u.votes_count}</span>
                         <span>Propozycje: {u.suggestions_count}</span>
                       </div>
                     </div>
                   </Card>
                 ))}
+                {usersCursor && (
+                  <Button
+                    onClick={loadMoreUsers}
+                    variant="default"
+                    size="sm"
+                    className="w-full"
+                  >
+                    WCZYTAJ WIĘCEJ
+                  </Button>
+                )}
               </div>
             </motion.div>
           )}
@@ -362,8 +480,47 @@ export default function AdminPanel() {
               as={motion.div}
               className=""
             >
-              <div className="mb-4 font-mono text-xs text-text-secondary">
-                ŁĄCZNIE: {suggestions.length} propozycji
+              <div className="mb-4 flex flex-wrap items-center gap-2">
+                <select
+                  value={suggestionsStatus}
+                  onChange={(e) => setSuggestionsStatus(e.target.value)}
+                  className="bg-white/5 border border-white/10 px-3 py-2 font-mono text-xs text-text-primary focus:border-primary focus:outline-none"
+                >
+                  <option value="">Wszystkie (oczekujące najpierw)</option>
+                  <option value="PENDING">Oczekujące</option>
+                  <option value="APPROVED">Zatwierdzone</option>
+                  <option value="REJECTED">Odrzucone</option>
+                  <option value="QUEUED,DOWNLOADING,ANALYZING,TRANSCODING,UPLOADING">W przetwarzaniu</option>
+                  <option value="FAILED">Błąd przetwarzania</option>
+                  <option value="DUPLICATE">Duplikaty nagrań</option>
+                  <option value="PROCESSED">Przetworzone</option>
+                </select>
+                <div className="font-mono text-xs text-text-secondary">
+                  WCZYTANO: {suggestions.length} propozycji
+                </div>
+                <Button onClick={selectPendingSuggestions} variant="default" size="sm">
+                  ZAZNACZ OCZEKUJĄCE
+                </Button>
+                {selectedSuggestions.length > 0 && (
+                  <>
+                    <Button
+                      onClick={() => handleBulkSuggestions("approve")}
+                      variant="primary"
+                      size="sm"
+                      className="bg-primary text-black"
+                    >
+                      ZATWIERDŹ ({selectedSuggestions.length})
+                    </Button>
+                    <Button
+                      onClick={() => handleBulkSuggestions("reject")}
+                      variant="default"
+                      size="sm"
+                      className="bg-secondary text-white"
+                    >
+                      ODRZUĆ ({selectedSuggestions.length})
+                    </Button>
+                  </>
+                )}
               </div>
               {suggestions.length === 0 ? (
                 <p className="font-mono text-sm text-text-secondary">
@@ -374,6 +531,14 @@ export default function AdminPanel() {
                   {suggestions.map((suggestion) => (
                     <Card key={suggestion.id}>
                       <div className="flex justify-between items-start mb-2">
+                        {suggestion.status === "PENDING" && (
+                          <input
+                            type="checkbox"
+                            checked={selectedSuggestions.includes(suggestion.id)}
+                            onChange={() => toggleSuggestion(suggestion.id)}
+                            className="mt-1 mr-3 accent-primary shrink-0"
+                          />
+                        )}
                         <div className="flex-1 min-w-0">
                           <div className="font-header text-sm text-text-primary mb-1">
                             {suggestion.title || "Brak tytułu"}
@@ -384,6 +549,24 @@ export default function AdminPanel() {
                           <div className="font-mono text-xs text-text-secondary">
                             {suggestion.source_type} • {suggestion.raw_input}
                           </div>
+                          {suggestion.loudness_lufs != null && (
+                            <div className="font-mono text-[10px] text-text-secondary mt-1">
+                              {suggestion.loudness_lufs} LUFS • PEAK {suggestion.true_peak_dbtp} dBTP
+                            </div>
+                          )}
+                          {(suggestion.status === "FAILED" || suggestion.status === "DUPLICATE") && suggestion.ingest_error && (
+                            <div className="font-mono text-[10px] text-secondary mt-1 break-all">
+                              {suggestion.ingest_error}
+                            </div>
+                          )}
+                          {suggestion.catalog && (
+                            <div className="font-mono text-[10px] text-yellow-500 mt-1">
+                              {suggestion.catalog.kind === "library"
+                                ? `W BIBLIOTECE: ${suggestion.catalog.artist} - ${suggestion.catalog.title}`
+                                : `JUŻ ZAPROPONOWANE #${suggestion.catalog.suggestion_id} (${suggestion.catalog.status})`}
+                              {suggestion.catalog.match === "similar" && ` • PODOBIEŃSTWO ${Math.round(suggestion.catalog.score * 100)}%`}
+                            </div>
+                          )}
                           <div className="font-mono text-[10px] text-text-secondary mt-2">
                             {new Date(suggestion.created_at).toLocaleString(
                               "pl-PL"
@@ -400,6 +583,9 @@ export default function AdminPanel() {
                           }`}
                         >
                           {suggestion.status}
+                          {suggestion.ingest_progress != null &&
+                            suggestion.status !== "PROCESSED" &&
+                            ` ${suggestion.ingest_progress}%`}
                         </span>
                       </div>
 
@@ -425,6 +611,16 @@ export default function AdminPanel() {
                       )}
                     </Card>
                   ))}
+                  {suggestionsCursor && (
+                    <Button
+                      onClick={loadMoreSuggestions}
+                      variant="default"
+                      size="sm"
+                      className="w-full"
+                    >
+                      WCZYTAJ WIĘCEJ
+                    </Button>
+                  )}
                 </div>
               )}
             </motion.div>